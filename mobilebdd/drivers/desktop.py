@@ -1,7 +1,7 @@
 import logging
-import time
 
 from selenium import webdriver
+from selenium.common.exceptions import NoSuchWindowException, WebDriverException
 
 from mobilebdd.hacks.webdriver import HackedWebDriver
 
@@ -20,6 +20,43 @@ DesktopElementSearchOrder = [
     u'find_element_by_class_name'
 ]
 
+def _window_search_order(driver, ref):
+    """
+    orders the window handles so the window the ref was last found in comes
+    first, then the window that currently has focus, then the rest
+
+    :param driver: the webdriver to use for finding
+    :param ref: thing to find
+    :rtype: list[str]
+    """
+    handles = driver.window_handles
+    try:
+        current_handle = driver.current_window_handle
+    except WebDriverException:
+        # the focused window was closed, the rest can still be searched
+        current_handle = None
+    preferred = [driver.ref_window_handles.get(ref, None), current_handle]
+
+    ordered = []
+    for handle in preferred + handles:
+        if handle in handles and handle not in ordered:
+            ordered.append(handle)
+    return ordered
+
+
+def _switch_to_window(driver, handle):
+    """
+    :return: False if the window was closed before it could be switched to
+    :rtype: bool
+    """
+    try:
+        driver.switch_to.window(handle)
+        return True
+    except NoSuchWindowException:
+        log.debug(u'window {} was closed. moving on...'.format(handle))
+        return False
+
+
 def desktop_simple_find(driver, ref):
     """
     simple_find override that uses window_handles and switch_to.window
@@ -30,30 +67,97 @@ def desktop_simple_find(driver, ref):
     :param ref: thing to find
     :rtype: WebElement
     """
+    def sweep():
+        for handle in _window_search_order(driver, ref):
+            log.debug(u'switching to window_handle {}'.format(handle))
+            if not _switch_to_window(driver, handle):
+                continue
+            element, method = driver._find_strategy(ref, driver.ElementSearchOrder, web=True)
+            if element:
+                log.debug(u'found {} with {}'.format(ref, method))
+                driver.ref_window_handles[ref] = handle
+                return element
+
+        # a window may have opened or closed on its own, eg. from a timer in
+        # the page, so get a fresh list of windows for the next sweep
+        driver.forget_window_handles()
+
+    element = driver.cached_element(ref)
+    if element:
+        return element
+
+    alias = driver.locator_aliases.get(ref)
+    if alias:
+        return driver._alias_find(ref, alias)
+
     try:
-        timeout = time.time() + driver.MaxSmartSearchTime_sec
-        while time.time() < timeout:
-            for handle in driver.window_handles:
-                log.debug(u'switching to window_handle {}'.format(handle))
-                driver.switch_to.window(handle)
-                for method in driver.ElementSearchOrder:
-                    try:
-                        log.debug(u'calling {}'.format(method))
-                        element = getattr(driver, method)(ref)
-                        if element:
-                            return element
-                        else:
-                            log.debug(u'couldnt {}. moving on...'.format(method))
-                    except Exception:
-                        log.debug(u'couldnt {}. moving on...'.format(method))
-            log.debug(u'exhausted all search permutations, looping '
-                          u'until we timeout here')
-    except:
-        pass  # let the below assert occur
+        element = driver._poll_search(ref, sweep)
+        if element:
+            driver.cache_element(ref, element)
+            return element
+    except NoSuchWindowException as e:
+        # eg. every window closed while searching
+        log.debug(u'lost the windows while looking for {}. {}'.format(ref, e))
 
     assert False, u'couldnt find {}!'.format(ref)
 
 
+def desktop_alias_search(driver, ref, alias):
+    """
+    _alias_search override that looks through the windows rather than the
+    contexts, the same way desktop_simple_find does
+
+    :param driver: the webdriver to use for finding
+    :param ref: the friendly name that was searched for
+    :param alias: the (find method, value, context) the ref is aliased to
+    :rtype: WebElement
+    """
+    method, locator, _ = alias
+    for handle in _window_search_order(driver, ref):
+        if not _switch_to_window(driver, handle):
+            continue
+        try:
+            element = getattr(driver, method)(locator)
+            if element:
+                driver.ref_window_handles[ref] = handle
+                return element
+        except WebDriverException:
+            log.debug(u'couldnt find {} in window {}. moving on...'.format(ref, handle))
+
+    # a window may have opened or closed on its own
+    driver.forget_window_handles()
+    return None
+
+
+def desktop_alias_displayed(driver, alias):
+    """
+    aliased absence check override that only looks in the window that has
+    focus
+
+    :param driver: the webdriver to use for finding
+    :param alias: the (find method, value, context) a ref is aliased to
+    :rtype: bool
+    """
+    method, locator, _ = alias
+    try:
+        elements = getattr(driver, method.replace(u'find_element_', u'find_elements_', 1))(locator)
+    except WebDriverException:
+        return False
+    return driver._displayed(elements)
+
+
+def desktop_any_displayed(driver, ref):
+    """
+    absence check override that only looks in the window that has focus,
+    because that is the only one that can be seen
+
+    :param driver: the webdriver to use for finding
+    :param ref: thing to find
+    :rtype: bool
+    """
+    return driver._any_displayed_here(ref, driver.ElementSearchOrder)
+
+
 class DesktopChromeWebDriver(HackedWebDriver):
     """For chrome on desktop."""
 
@@ -95,6 +199,35 @@ class DesktopChromeWebDriver(HackedWebDriver):
         """
         return desktop_simple_find(self, ref)
 
+    def _any_displayed(self, ref):
+        """
+        absence check override that only looks in the window that has focus
+
+        :param ref: thing to find
+        :rtype: bool
+        """
+        return desktop_any_displayed(self, ref)
+
+    def _alias_search(self, ref, alias):
+        """
+        aliased find override that looks through the windows
+
+        :param ref: the friendly name that was searched for
+        :param alias: the (find method, value, context) the ref is aliased to
+        :rtype: WebElement
+        """
+        return desktop_alias_search(self, ref, alias)
+
+    def _alias_displayed(self, alias):
+        """
+        aliased absence check override that only looks in the window that has
+        focus
+
+        :param alias: the (find method, value, context) a ref is aliased to
+        :rtype: bool
+        """
+        return desktop_alias_displayed(self, alias)
+
 
 class DesktopFirefoxWebDriver(HackedWebDriver):
     """For firefox on desktop."""
@@ -125,6 +258,35 @@ class DesktopFirefoxWebDriver(HackedWebDriver):
         """
         return desktop_simple_find(self, ref)
 
+    def _any_displayed(self, ref):
+        """
+        absence check override that only looks in the window that has focus
+
+        :param ref: thing to find
+        :rtype: bool
+        """
+        return desktop_any_displayed(self, ref)
+
+    def _alias_search(self, ref, alias):
+        """
+        aliased find override that looks through the windows
+
+        :param ref: the friendly name that was searched for
+        :param alias: the (find method, value, context) the ref is aliased to
+        :rtype: WebElement
+        """
+        return desktop_alias_search(self, ref, alias)
+
+    def _alias_displayed(self, alias):
+        """
+        aliased absence check override that only looks in the window that has
+        focus
+
+        :param alias: the (find method, value, context) a ref is aliased to
+        :rtype: bool
+        """
+        return desktop_alias_displayed(self, alias)
+
 
 class DesktopInternetExplorerWebDriver(HackedWebDriver):
     """For internet explorer on desktop."""
@@ -158,3 +320,32 @@ class DesktopInternetExplorerWebDriver(HackedWebDriver):
         :rtype: WebElement
         """
         return desktop_simple_find(self, ref)
+
+    def _any_displayed(self, ref):
+        """
+        absence check override that only looks in the window that has focus
+
+        :param ref: thing to find
+        :rtype: bool
+        """
+        return desktop_any_displayed(self, ref)
+
+    def _alias_search(self, ref, alias):
+        """
+        aliased find override that looks through the windows
+
+        :param ref: the friendly name that was searched for
+        :param alias: the (find method, value, context) the ref is aliased to
+        :rtype: WebElement
+        """
+        return desktop_alias_search(self, ref, alias)
+
+    def _alias_displayed(self, alias):
+        """
+        aliased absence check override that only looks in the window that has
+        focus
+
+        :param alias: the (find method, value, context) a ref is aliased to
+        :rtype: bool
+        """
+        return desktop_alias_displayed(self, alias)
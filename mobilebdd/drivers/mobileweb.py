@@ -1,6 +1,6 @@
 import logging
-import time
 
+from mobilebdd.drivers.desktop import desktop_alias_displayed, desktop_alias_search, desktop_any_displayed, desktop_simple_find
 from mobilebdd.hacks.webdriver import HackedWebDriver
 from mobilebdd.steps.input import switch_to
 
@@ -37,28 +37,36 @@ class ChromeWebDriver(HackedWebDriver):
         @param ref: thing to find
         @rtype: WebElement
         """
-        try:
-            timeout = time.time() + self.MaxSmartSearchTime_sec
-            while time.time() < timeout:
-                for handle in self.window_handles:
-                    log.debug(u'switching to window_handle {}'.format(handle))
-                    self.switch_to.window(handle)
-                    for method in self.ElementSearchOrder:
-                        try:
-                            log.debug(u'calling {}'.format(method))
-                            element = getattr(self, method)(ref)
-                            if element:
-                                return element
-                            else:
-                                log.debug(u'couldnt {}. moving on...'.format(method))
-                        except Exception:
-                            log.debug(u'couldnt {}. moving on...'.format(method))
-                log.debug(u'exhausted all search permutations, looping '
-                              u'until we timeout here')
-        except:
-            pass  # let the below assert occur
-
-        assert False, u'couldnt find {}!'.format(ref)
+        return desktop_simple_find(self, ref)
+
+    def _any_displayed(self, ref):
+        """
+        absence check override that only looks in the window that has focus
+
+        :param ref: thing to find
+        :rtype: bool
+        """
+        return desktop_any_displayed(self, ref)
+
+    def _alias_search(self, ref, alias):
+        """
+        aliased find override that looks through the windows
+
+        :param ref: the friendly name that was searched for
+        :param alias: the (find method, value, context) the ref is aliased to
+        :rtype: WebElement
+        """
+        return desktop_alias_search(self, ref, alias)
+
+    def _alias_displayed(self, alias):
+        """
+        aliased absence check override that only looks in the window that has
+        focus
+
+        :param alias: the (find method, value, context) a ref is aliased to
+        :rtype: bool
+        """
+        return desktop_alias_displayed(self, alias)
 
 
 class WebViewAppDriver(HackedWebDriver):
@@ -97,28 +105,50 @@ class WebViewAppDriver(HackedWebDriver):
         :param ref: thing to find
         :rtype: WebElement
         """
+        return desktop_simple_find(self, ref)
+
+    def _any_displayed(self, ref):
+        """
+        absence check override that only looks in the window that has focus
+
+        :param ref: thing to find
+        :rtype: bool
+        """
+        return desktop_any_displayed(self, ref)
+
+    def _alias_search(self, ref, alias):
+        """
+        aliased find override that looks through the windows
+
+        :param ref: the friendly name that was searched for
+        :param alias: the (find method, value, context) the ref is aliased to
+        :rtype: WebElement
+        """
+        return desktop_alias_search(self, ref, alias)
+
+    def _alias_displayed(self, alias):
+        """
+        aliased absence check override that only looks in the window that has
+        focus
+
+        :param alias: the (find method, value, context) a ref is aliased to
+        :rtype: bool
+        """
+        return desktop_alias_displayed(self, alias)
+
+    def get_screenshot_as_base64(self):
+        """
+        When using WebViewApp, screenshots only work in the native context.
+        """
+        log.debug(u'switching to native context')
+        self.switch_to.context(u'NATIVE_APP')
+
+        log.debug(u'calling base get_screenshot_as_base64')
         try:
-            timeout = time.time() + self.MaxSmartSearchTime_sec
-            while time.time() < timeout:
-                for handle in self.window_handles:
-                    log.debug(u'switching to window_handle {}'.format(handle))
-                    self.switch_to.window(handle)
-                    for method in self.ElementSearchOrder:
-                        try:
-                            log.debug(u'calling {}'.format(method))
-                            element = getattr(self, method)(ref)
-                            if element:
-                                return element
-                            else:
-                                log.debug(u'couldnt {}. moving on...'.format(method))
-                        except Exception:
-                            log.debug(u'couldnt {}. moving on...'.format(method))
-                log.debug(u'exhausted all search permutations, looping '
-                              u'until we timeout here')
-        except:
-            pass  # let the below assert occur
-
-        assert False, u'couldnt find {}!'.format(ref)
+            return super(WebViewAppDriver, self).get_screenshot_as_base64()
+        finally:
+            log.debug(u'switching back to webview context')
+            switch_to(self, u'WEBVIEW')
 
     def get_screenshot_as_file(self, filename):
         """
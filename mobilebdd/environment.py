@@ -11,6 +11,8 @@ from selenium.common.exceptions import WebDriverException
 
 from mobilebdd.behave_tools import gentrify_scenario_name
 from mobilebdd.drivers.drivers import webdriver_me
+from mobilebdd.reports.images import ImageSettings
+from mobilebdd.screenshots import CapturePolicy, ScenarioCapture, ScreenshotWriter
 from mobilebdd.steps.app_states import APP_PACKAGE_STEP, APP_ACTIVITY_STEP, APP_STEPS, DEVICE_STEPS
 
 
@@ -100,6 +102,31 @@ def _setup_report_dir(context, dir_name):
     context.test_report_dir = report_dir
 
 
+def _found_element_rect(driver):
+    """
+    :param driver: the webdriver
+    :return: (left, top, right, bottom) of the element the driver found last,
+        or None if it didnt find one or it's gone
+    :rtype: tuple
+    """
+    element = driver.last_found_element
+    if not element:
+        return None
+
+    try:
+        location = element.location
+        size = element.size
+    except WebDriverException:
+        return None
+
+    return (
+        int(location[u'x']),
+        int(location[u'y']),
+        int(location[u'x'] + size[u'width']),
+        int(location[u'y'] + size[u'height'])
+    )
+
+
 def __isolate_call(method, *args):
     """
     calls the given method wrapped in a try catch. this helps prevent external
@@ -127,6 +154,21 @@ def before_all(context):
         context.test_report_dir = context.config.junit_directory
         context.test_output_dirs.append(context.test_report_dir)
 
+        # screenshots are written in the background, each distinct image only
+        # once, into a folder shared by the whole run
+        context.screenshot_writer = ScreenshotWriter.from_config(
+            context.test_config,
+            store_dir=os.path.join(context.test_report_dir, u'screenshots')
+        )
+
+        # which steps get screenshots, unless a feature or scenario tag says
+        # otherwise
+        context.screenshot_policy = CapturePolicy.from_config(context.test_config)
+
+        # the report can crop the screenshots to the element each step found
+        image_settings = ImageSettings.from_config(context.test_config)
+        context.crop_screenshots = bool(image_settings and image_settings.crop_to_element)
+
     # fire listeners
     for ear in context.listeners:
         __isolate_call(ear.before_all, context)
@@ -169,7 +211,8 @@ def before_feature(context, feature):
                 app_package=context.app_package,
                 app_activity=context.app_activity,
                 webdriver_url=context.webdriver_url,
-                webdriver_processor=context.webdriver_processor
+                webdriver_processor=context.webdriver_processor,
+                test_config=context.test_config
             )
 
             # mark that we're using a feature-level driver
@@ -192,6 +235,14 @@ def before_scenario(context, scenario):
     # make a test report directory for each scenario
     _setup_report_dir(context, scenario_name)
 
+    # scenario tags win over feature tags, which win over the test config
+    if context.config.junit:
+        policy = CapturePolicy.from_tags(
+            scenario.tags,
+            CapturePolicy.from_tags(scenario.feature.tags, context.screenshot_policy)
+        )
+        context.screenshot_capture = ScenarioCapture(policy, context.screenshot_writer)
+
     # fire listeners
     for ear in context.listeners:
         __isolate_call(ear.before_scenario, scenario)
@@ -204,6 +255,11 @@ def before_step(context, step):
     """
     step.start_time_epoch_sec = time.time()
 
+    context.step_timings[u'sleep_sec'] = 0.0
+    if context.driver:
+        context.driver.last_found_element = None
+        context.driver.reset_timings()
+
     # fire listeners
     for ear in context.listeners:
         __isolate_call(ear.before_step, step)
@@ -216,10 +272,29 @@ def after_step(context, step):
     """
     step.end_time_epoch_sec = time.time()
 
-    # take screenshot after each step
+    # split the step's time up for profiling
+    step.command_sec = 0.0
+    step.sleep_sec = context.step_timings[u'sleep_sec']
+    if context.driver:
+        step.command_sec = context.driver.command_sec
+        step.sleep_sec += context.driver.sleep_sec
+
+    screenshot_start = time.time()
+
+    # take screenshot after each step the capture policy wants one for
     # but only if the output dir is given
+    # the screenshot is only fetched here, the screenshot writer decodes and
+    # saves it and sets step.screenshot_path in the background
     if context.config.junit:
-        screenshot_file_path = None
+        step.screenshot_path = None
+        capture = context.screenshot_capture
+        wanted = capture.wants(step)
+
+        # a step can ask for a screenshot no matter what the policy is
+        if hasattr(context, u'capture_screenshot'):
+            wanted = True
+            del context.capture_screenshot
+
         if context.driver:
             # check if the step has saved a custom screenshot that it wants reported
             if hasattr(context, u'step_screenshot'):
@@ -228,19 +303,24 @@ def after_step(context, step):
                     path=context.test_report_dir,
                     suffix=step.name
                 )
-                with open(screenshot_file_path, u'w') as f:
-                    f.write(context.step_screenshot)
+                capture.add(step, screenshot_file_path, context.step_screenshot, encoded=False)
 
                 # clear the step_screenshot variable
                 del context.step_screenshot
-            else:
+            elif wanted:
                 log.debug(u'taking screenshot after step: "{}"'.format(step.name))
-                screenshot_file_path = context.driver.take_screenshot(
+                screenshot_file_path = context.driver.get_screenshot_path(
                     path=context.test_report_dir,
                     suffix=step.name
                 )
-                log.debug(u'done taking screenshot, filepath: "{}"'.format(screenshot_file_path))
-        step.screenshot_path = screenshot_file_path
+                image = context.driver.fetch_screenshot()
+                if image is not None:
+                    if context.crop_screenshots:
+                        step.screenshot_rect = _found_element_rect(context.driver)
+                    capture.add(step, screenshot_file_path, image)
+                    log.debug(u'done taking screenshot, writing to: "{}"'.format(screenshot_file_path))
+
+    step.screenshot_sec = time.time() - screenshot_start
 
     # fire listeners
     for ear in context.listeners:
@@ -251,6 +331,15 @@ def after_scenario(context, scenario):
     """
     :type context: HackedContext
     """
+    if context.driver:
+        element_cache = context.driver.element_cache
+        log.debug(u'element cache for scenario "{}": {} hits, {} misses'.format(
+            scenario.name,
+            element_cache.hits,
+            element_cache.misses
+        ))
+        element_cache.reset_stats()
+
     # close the session so the next test can begin immediately
     # if using the --full-reset flag, appium will bork here. but at that point
     # the webdriver session is already closed. so no-op for exception
@@ -266,6 +355,12 @@ def after_scenario(context, scenario):
     if context.config.junit:
         context.test_output_dirs.pop()
 
+        # keep the ring buffer's screenshots only if they show a failure
+        if scenario.status == u'failed':
+            context.screenshot_capture.release()
+        else:
+            context.screenshot_capture.discard()
+
     # fire listeners
     for ear in context.listeners:
         __isolate_call(ear.after_scenario, scenario)
@@ -275,6 +370,10 @@ def after_feature(context, feature):
     if context.config.junit:
         context.test_output_dirs.pop()
 
+        # make sure the feature's screenshots are on disk before the reporters
+        # get the feature
+        context.screenshot_writer.flush()
+
     if context.driver and context.feature_driver:
         log.debug(u'feature-level driver.quit()')
         context.driver.quit()
@@ -287,5 +386,10 @@ def after_feature(context, feature):
 
 
 def after_all(context):
+    # the html report is generated after this, so everything has to be written
+    if context.screenshot_writer:
+        context.screenshot_writer.close()
+        context.screenshot_writer = None
+
     for ear in context.listeners:
         __isolate_call(ear.after_all, context)
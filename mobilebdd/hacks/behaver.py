@@ -3,13 +3,18 @@ overloaded hacks for behave stuff
 """
 
 import logging
+import time
 
+from behave import step_registry
 from behave.formatter import formatters
 from behave.runner_util import parse_features
 from behave.model import Step, FileLocation
 from behave.runner import Context, os, Runner
 
 import mobilebdd
+from mobilebdd.errors import UndefinedStepsError
+from mobilebdd.hacks.step_dispatch import StepDispatch
+from mobilebdd.parse_cache import hash_step_files
 
 
 log = logging.getLogger(u'mobilebdd')
@@ -65,6 +70,23 @@ class HackedContext(Context):
         # screenshots
         self.test_report_dir = None
 
+        # writes the screenshots taken after each step into the report dirs
+        self.screenshot_writer = None
+
+        # which steps get screenshots, from the test config
+        self.screenshot_policy = None
+
+        # applies the screenshot policy to the current scenario
+        self.screenshot_capture = None
+
+        # whether to save the rect of the element each step found, so the
+        # report can crop the screenshots to it
+        self.crop_screenshots = False
+
+        # timings for the current step, for profiling. this is changed in
+        # place rather than reassigned, so it stays on the root context
+        self.step_timings = {u'sleep_sec': 0.0}
+
         # user-specified processor for refining webdriver capabilities
         self.webdriver_processor = None
 
@@ -89,8 +111,24 @@ class HackedContext(Context):
         """
         self.execute_steps(unicode(steps))
 
+    def sleep(self, seconds):
+        """
+        time.sleep, but the time is counted as sleep for the step profiler
+
+        @seconds: how long to sleep
+        """
+        self.step_timings[u'sleep_sec'] += seconds
+        time.sleep(seconds)
+
 
 class HackedRunner(Runner):
+    # the step paths whose step files have been run in this process, and the
+    # hash of the step files (see hash_step_files) from when they were. the
+    # step registry is global, so loading them again would just do the same
+    # work for nothing, and changes to the step files after that need a new
+    # process
+    LoadedStepPaths = {}
+
     def __init__(self, config, feature_paths, step_paths, webdriver_processor=None, listeners=None, test_config=None):
         """
         :param feature_paths: list of paths to load feature files from
@@ -107,6 +145,19 @@ class HackedRunner(Runner):
         # webdriver url to hit
         self.webdriver_url = None
 
+        # queue of feature file paths to run, when running in parallel with
+        # other runners. the runner takes features from it until it gets None.
+        # if not set, all the features in feature_paths are run
+        self.feature_queue = None
+
+        # whether to check that all the steps of the features are defined
+        # before running any of them
+        self.check_steps = False
+
+        # optional ParseCache, to load unchanged features without parsing
+        # them, and skip checking their steps
+        self.parse_cache = None
+
         # setup base dir in advance so we can call load_step_definitions. this
         # is normally called by run, which we may not want to do all the time,
         # for example when just getting list of known steps
@@ -153,13 +204,19 @@ class HackedRunner(Runner):
         log.debug(u'end feature_locations')
         return locations
 
-    def load_step_definitions(self, extra_step_paths=None):
+    def step_dirs(self):
         """
-        overloading this to allow recursive step file loading and to allow step
-        file loading from multiple, unrelated paths
+        :return: all the dirs steps are loaded from, behave's steps dir in the
+            base dir as well as the step paths. each is loaded recursively
+        :rtype: list[string]
+        """
+        return [os.path.join(self.base_dir, self.config.steps_dir)] + list(self.step_paths)
 
-        :param extra_step_paths: this was never used in the behave code. we have
-            the instance var of list of steps so ignore this
+    def _step_paths(self):
+        """
+        :return: the step paths, and all the dirs under them. behave only
+            loads the step files directly in each path it's given
+        :rtype: list[string]
         """
         # pull all steps recursively
         all_paths = []
@@ -173,11 +230,107 @@ class HackedRunner(Runner):
                     log.debug(u'skipping {} because there are no subdirs'.format(current_dir))
                     continue
                 all_paths += [os.path.join(current_dir, subdir) for subdir in subdirs]
-        paths = all_paths
+        return all_paths
+
+    def _loaded_key(self, paths):
+        """
+        :return: the key of the step paths in LoadedStepPaths
+        """
+        return (os.path.join(self.base_dir, self.config.steps_dir),) + tuple(paths)
+
+    def load_step_definitions(self, extra_step_paths=None):
+        """
+        overloading this to allow recursive step file loading and to allow step
+        file loading from multiple, unrelated paths
+
+        :param extra_step_paths: this was never used in the behave code. we have
+            the instance var of list of steps so ignore this
+        """
+        paths = self._step_paths()
 
         log.debug(u'final list of step paths: {}'.format(paths))
 
+        # match steps through an index of the registry, rather than by trying
+        # every step definition
+        StepDispatch.install(step_registry.registry)
+
+        loaded = self._loaded_key(paths)
+        if loaded in HackedRunner.LoadedStepPaths:
+            log.debug(u'steps already loaded from these paths')
+            return
+
+        # hashed before they're loaded, so if they change while loading, the
+        # hash wont match them afterwards
+        steps_hash = hash_step_files(self.step_dirs())
         super(HackedRunner, self).load_step_definitions(extra_step_paths=paths)
+        HackedRunner.LoadedStepPaths[loaded] = steps_hash
+
+    def loaded_steps_hash(self):
+        """
+        :return: the hash of the step files (see hash_step_files) from when
+            they were loaded into the step registry, which may be older than
+            the files on disk. None if they haven't been loaded
+        :rtype: str
+        """
+        return HackedRunner.LoadedStepPaths.get(self._loaded_key(self._step_paths()), None)
+
+    def parse_features(self):
+        """
+        :return: the parsed features in the feature paths
+        :rtype: list[behave.model.Feature]
+        """
+        feature_locations = [filename for filename in self.feature_locations()
+                             if not self.config.exclude(filename)]
+        return self._parse(feature_locations)
+
+    def _parse(self, feature_locations):
+        """
+        :type feature_locations: list[FileLocation]
+        :rtype: list[behave.model.Feature]
+        """
+        if self.parse_cache:
+            return self.parse_cache.parse_features(
+                [location.filename for location in feature_locations],
+                language=self.config.lang
+            )
+        return parse_features(feature_locations, language=self.config.lang)
+
+    def find_undefined_steps(self, features):
+        """
+        checks the steps of the features against the loaded step definitions,
+        whatever the tags. load the step definitions first
+
+        :type features: list[behave.model.Feature]
+        :return: the steps that no step definition matches, each step text
+            only once
+        :rtype: list[behave.model.Step]
+        """
+        if self.parse_cache:
+            # the steps the features are checked against are the ones in the
+            # registry, not whatever is on disk now
+            steps_hash = self.loaded_steps_hash() or hash_step_files(self.step_dirs())
+            if steps_hash != self.parse_cache.steps_hash:
+                self.parse_cache.set_steps_hash(steps_hash)
+            unchecked = [feature for feature in features if not self.parse_cache.is_checked(feature)]
+            log.debug(u'{} features already checked for undefined steps'.format(len(features) - len(unchecked)))
+            features = unchecked
+
+        undefined_steps = []
+        checked = set()
+        for feature in features:
+            for scenario in feature.walk_scenarios():
+                for step in scenario.all_steps:
+                    key = (step.step_type, step.name)
+                    if key in checked:
+                        continue
+                    checked.add(key)
+                    if not step_registry.registry.find_match(step):
+                        undefined_steps.append(step)
+
+        if self.parse_cache and not undefined_steps:
+            self.parse_cache.add_checked(features)
+
+        return undefined_steps
 
     def run_with_paths(self):
         """
@@ -195,15 +348,54 @@ class HackedRunner(Runner):
         # self.run_hook('before_all', self.context)
 
         # -- STEP: Parse all feature files (by using their file location).
-        feature_locations = [filename for filename in self.feature_locations()
-                             if not self.config.exclude(filename)]
-        features = parse_features(feature_locations, language=self.config.lang)
-        self.features.extend(features)
+        if self.feature_queue is not None:
+            features = self._queued_features()
+        else:
+            features = self.parse_features()
+
+            # catch undefined steps before anything runs, using the features
+            # and steps that were just loaded for the run
+            if self.check_steps:
+                undefined_steps = self.find_undefined_steps(features)
+                if undefined_steps:
+                    self.undefined_steps.extend(undefined_steps)
+                    raise UndefinedStepsError(undefined_steps)
+
+            features = self._release_features(features)
 
         # -- STEP: Run all features.
         stream_openers = self.config.outputs
         self.formatters = formatters.get_formatter(self.config, stream_openers)
-        return self.run_model()
+        return self.run_model(features=features)
+
+    def _queued_features(self):
+        """
+        parses and hands over the features from the feature queue one at a
+        time, as run_model gets to them, so the runners sharing the queue each
+        take the next feature as soon as they're free
+        """
+        while True:
+            feature_path = self.feature_queue.get()
+            if feature_path is None:
+                return
+
+            log.debug(u'feature queue, running: {}'.format(feature_path))
+            for feature in self._parse([FileLocation(feature_path)]):
+                yield feature
+
+    @staticmethod
+    def _release_features(features):
+        """
+        hands the features to run_model one at a time, letting go of each one
+        as soon as it's run and reported. the reporters keep compact results,
+        so the parsed features don't have to stay around for the whole run
+
+        :param features: the parsed features. this list is emptied
+        :type features: list[behave.model.Feature]
+        """
+        features.reverse()
+        while features:
+            yield features.pop()
 
 
 class HackedStep(Step):
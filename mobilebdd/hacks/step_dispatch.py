@@ -0,0 +1,186 @@
+"""
+faster step matching for behave's step registry
+
+behave matches a step by trying every step definition's pattern in turn. with
+hundreds of broad patterns that's a lot of regexes per step. this buckets the
+patterns by the literal words they start and end with, so a step is only tried
+against the patterns that could match it, and remembers the match of each
+step text
+"""
+import collections
+import logging
+
+from behave.matchers import ParseMatcher
+
+
+log = logging.getLogger(u'mobilebdd')
+
+
+def _literal_edges(pattern):
+    """
+    :param pattern: a parse pattern, eg. u'{element} should appear'
+    :return: (first word, last word) of the pattern, lowercased. either is
+        None if the pattern starts or ends with a parameter
+    """
+    words = pattern.split()
+    if not words:
+        return None, None
+    first = None if u'{' in words[0] or u'}' in words[0] else words[0].lower()
+    last = None if u'{' in words[-1] or u'}' in words[-1] else words[-1].lower()
+    return first, last
+
+
+def _text_edges(text):
+    """
+    :return: (first word, last word) of some step text, lowercased
+    """
+    words = text.split()
+    if not words:
+        return u'', u''
+    return words[0].lower(), words[-1].lower()
+
+
+class PatternBuckets(object):
+    """
+    the numbers of a list of patterns, bucketed by the literal words they
+    start and end with
+
+    a parse pattern only matches text starting with its first word and ending
+    with its last word (case insensitively), unless that end of it is a
+    parameter, so only those patterns need trying
+    """
+
+    def __init__(self, patterns):
+        """
+        :param patterns: the parse patterns, in the order they should be
+            tried. None for a pattern that cant be bucketed (eg. a regex), which
+            is always tried
+        :type patterns: list
+        """
+        self.first = collections.defaultdict(set)
+        self.last = collections.defaultdict(set)
+        # patterns that start (or end) with a parameter, and can start (or
+        # end) with any word
+        self.any_first = set()
+        self.any_last = set()
+
+        for number, pattern in enumerate(patterns):
+            first, last = _literal_edges(pattern) if pattern is not None else (None, None)
+            if first is None:
+                self.any_first.add(number)
+            else:
+                self.first[first].add(number)
+            if last is None:
+                self.any_last.add(number)
+            else:
+                self.last[last].add(number)
+
+    def candidates(self, text):
+        """
+        :return: the numbers of the patterns that could match the text, in
+            order
+        :rtype: list[int]
+        """
+        first, last = _text_edges(text)
+        starts = self.first.get(first, set()) | self.any_first
+        ends = self.last.get(last, set()) | self.any_last
+        return sorted(starts & ends)
+
+
+class StepDispatch(object):
+    """
+    stands in for the registry's find_match and find_step_definition. the
+    results are the same as behave's linear search, definitions are tried in
+    the registry's order
+
+    the buckets are rebuilt whenever a step definition is added to the
+    registry
+    """
+
+    def __init__(self, registry):
+        """
+        :type registry: behave.step_registry.StepRegistry
+        """
+        self.registry = registry
+
+        # number of step definitions the buckets were built for
+        self.size = None
+
+        # step type -> (definitions to try, in order, PatternBuckets of them)
+        self.types = {}
+
+        # (step type, step text) -> (definition, match), or None
+        self.matches = {}
+
+    @classmethod
+    def install(cls, registry):
+        """
+        replaces the registry's linear search with a StepDispatch, unless it
+        already has one
+        """
+        if isinstance(registry.__dict__.get(u'find_match', None), StepDispatch):
+            return
+        dispatch = cls(registry)
+        registry.find_match = dispatch
+        registry.find_step_definition = dispatch.find_step_definition
+
+    def _build(self):
+        self.types = {}
+        for step_type in self.registry.steps:
+            definitions = list(self.registry.steps[step_type])
+            if step_type != u'step':
+                definitions += self.registry.steps.get(u'step', [])
+
+            patterns = [
+                definition.string if isinstance(definition, ParseMatcher) else None
+                for definition in definitions
+            ]
+            self.types[step_type] = (definitions, PatternBuckets(patterns))
+
+        self.matches = {}
+        log.debug(u'built the step dispatch for {} step definitions'.format(self.size))
+
+    def _find(self, step):
+        """
+        :return: (definition, match) of the first definition that matches the
+            step, or None
+        """
+        size = sum(len(definitions) for definitions in self.registry.steps.values())
+        if size != self.size:
+            self.size = size
+            self._build()
+
+        key = (step.step_type, step.name)
+        if key in self.matches:
+            return self.matches[key]
+
+        found = None
+        definitions, buckets = self.types[step.step_type]
+        for number in buckets.candidates(step.name):
+            match = definitions[number].match(step.name)
+            if match:
+                found = (definitions[number], match)
+                break
+
+        self.matches[key] = found
+        return found
+
+    def __call__(self, step):
+        """
+        registry.find_match
+
+        :type step: behave.model.Step
+        :rtype: behave.model.Match
+        """
+        found = self._find(step)
+        return found[1] if found else None
+
+    def find_step_definition(self, step):
+        """
+        registry.find_step_definition
+
+        :type step: behave.model.Step
+        :rtype: behave.matchers.Matcher
+        """
+        found = self._find(step)
+        return found[0] if found else None
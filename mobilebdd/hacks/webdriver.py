@@ -3,15 +3,20 @@ overloaded hacks for webdriver stuff
 """
 from __future__ import division
 
+import base64
+import collections
 import logging
 import os
 
+from appium.webdriver.mobilecommand import MobileCommand
 from appium.webdriver.webdriver import WebDriver
 from selenium.common.exceptions import WebDriverException
 from selenium.common.exceptions import NoSuchElementException
+from selenium.webdriver.remote.command import Command
 import time
 
 from mobilebdd.behave_tools import slugify
+from mobilebdd.locators import ElementCache, LocatorAliases, LocatorCache, PollingPolicy, WebLocatorScript, prune_search_order, script_find, snapshot_find_method
 from mobilebdd.steps.input import switch_to
 
 
@@ -33,6 +38,13 @@ class HackedWebDriver(WebDriver):
     # max time to allow when iterating through all the possible ways to find
     # something
     MaxSmartSearchTime_sec = 10
+    # how long to keep checking that something is gone if it's still displayed
+    # the first time. absence checks don't wait for MaxSmartSearchTime_sec,
+    # because nothing has to show up for them to pass
+    AbsenceSettleTime_sec = 2
+    # how long to wait between sweeps while a search keeps coming up empty, so
+    # a slow screen doesn't get hammered with find commands
+    SearchPollingPolicy = PollingPolicy(initial_sec=0.1, backoff=2.0, max_sec=1.0)
     # order of functions to call when searching for a 'thing'
     ElementSearchOrder = [
         u'find_element_by_id',
@@ -45,6 +57,69 @@ class HackedWebDriver(WebDriver):
         u'find_element_by_class_name',
         u'find_element_by_css_selector'
     ]
+    # in web contexts, run all the find methods inside the page with a single
+    # execute_script call rather than sending one command per find method
+    UseScriptLocator = True
+    # in native contexts, fetch the page source once and work out locally which
+    # find method matches, then only send that one. helps with deep view trees
+    UsePageSourceSnapshot = False
+    # reuse the element a ref was last found as, as long as it's not stale and
+    # the ui hasn't been changed since
+    UseElementCache = True
+    # commands that can change the list of contexts or the active context, eg.
+    # navigating, tapping, typing (enter submits a form), running scripts or
+    # relaunching the app. the client side copies are forgotten whenever one of
+    # these is sent
+    ContextResettingCommands = frozenset([
+        Command.GET,
+        Command.GO_BACK,
+        Command.GO_FORWARD,
+        Command.REFRESH,
+        Command.CLICK_ELEMENT,
+        Command.SEND_KEYS_TO_ELEMENT,
+        Command.SUBMIT_ELEMENT,
+        Command.EXECUTE_SCRIPT,
+        Command.EXECUTE_ASYNC_SCRIPT,
+        MobileCommand.TOUCH_ACTION,
+        MobileCommand.MULTI_ACTION,
+        MobileCommand.PRESS_KEYCODE,
+        MobileCommand.KEY_EVENT,
+        MobileCommand.LONG_PRESS_KEYCODE,
+        MobileCommand.START_ACTIVITY,
+        MobileCommand.BACKGROUND,
+        MobileCommand.LAUNCH_APP,
+        MobileCommand.CLOSE_APP,
+        MobileCommand.RESET
+    ])
+    # commands that can open or close windows. the client side copy of the
+    # window handles is forgotten whenever one of these is sent
+    WindowResettingCommands = frozenset([
+        Command.GET,
+        Command.CLICK_ELEMENT,
+        Command.SEND_KEYS_TO_ELEMENT,
+        Command.SUBMIT_ELEMENT,
+        Command.EXECUTE_SCRIPT,
+        Command.EXECUTE_ASYNC_SCRIPT,
+        Command.CLOSE
+    ])
+    # commands that can change the ui enough that cached elements shouldn't be
+    # trusted anymore. on top of these, every command that resets the contexts
+    # or windows clears the element cache
+    UiMutatingCommands = frozenset([
+        Command.SEND_KEYS_TO_ELEMENT,
+        Command.CLEAR_ELEMENT,
+        Command.SUBMIT_ELEMENT,
+        Command.SWITCH_TO_WINDOW,
+        MobileCommand.SWITCH_TO_CONTEXT,
+        MobileCommand.HIDE_KEYBOARD
+    ])
+    # commands that the implicit wait applies to
+    FindCommands = frozenset([
+        Command.FIND_ELEMENT,
+        Command.FIND_ELEMENTS,
+        Command.FIND_CHILD_ELEMENT,
+        Command.FIND_CHILD_ELEMENTS
+    ])
     # relative ending x,y coords for swiping gestures
     SwipeEndCoords = {
         u'left': (0.1, 0.5),
@@ -73,6 +148,7 @@ class HackedWebDriver(WebDriver):
             if not given, will assume a selenium grid is running on localhost
         :param default_capabilities: whether or not to set up some boilerplate capabilities
             defaults to True
+        :param test_config: the test config dict, for optional driver settings
         """
         device_type = kwargs.get(u'device_type', None)
         os_ver = kwargs.get(u'os_ver', None)
@@ -80,6 +156,8 @@ class HackedWebDriver(WebDriver):
         webdriver_url = kwargs.get(u'webdriver_url', None)
         webdriver_processor = kwargs.get(u'webdriver_processor', None)
         default_capabilities = kwargs.get(u'default_capabilities', True)
+        # the context defaults this to an empty list when there isn't one
+        test_config = kwargs.get(u'test_config', None) or {}
 
         caps = {}
         caps.update(self.setup_capabilities(**kwargs))
@@ -117,6 +195,62 @@ class HackedWebDriver(WebDriver):
             caps = webdriver_processor.process_capabilities(caps)
             log.debug(u'updated capabilities: {}'.format(caps))
 
+        # client side copies of session state, so that only commands that
+        # actually change something get sent. these need to exist before the
+        # session is created, because creating it goes through execute
+        self._contexts = None
+        self._current_context = None
+        # the implicit wait the server has, and the one we want it to have
+        # before the next find command
+        self._implicit_wait_sec = None
+        self._wanted_implicit_wait_sec = None
+        # same thing for browser windows
+        self._window_handles = None
+        self._current_window_handle = None
+        # the window handle each ref was last found in
+        self.ref_window_handles = {}
+        # the element each ref was last found as
+        self.element_cache = ElementCache()
+        # the last element that was found, eg. to crop screenshots to
+        self.last_found_element = None
+        # time spent on webdriver commands and sleeping between searches since
+        # the timings were last reset, for profiling steps
+        self.command_sec = 0.0
+        self.sleep_sec = 0.0
+
+        # counters about the element searches, for debugging and tuning
+        self.search_stats = collections.Counter()
+
+        # the settings from the test config are all read before the session
+        # is created, so a bad config doesnt leave a session open on the device
+
+        # remembers which context and find method resolved each ref
+        self.locator_cache = LocatorCache(
+            test_config.get(u'locator_cache_file', None),
+            app=kwargs.get(u'app_path', None) or kwargs.get(u'app_package', None),
+            platform=os_type
+        )
+
+        # exact locators for the friendly names used in the feature files
+        self.locator_aliases = LocatorAliases.from_config(
+            test_config,
+            app=kwargs.get(u'app_path', None),
+            platform=os_type,
+            package=kwargs.get(u'app_package', None)
+        )
+
+        self.absence_settle_sec = test_config.get(u'absence_settle_sec', self.AbsenceSettleTime_sec)
+
+        self.polling_policy = PollingPolicy.from_config(
+            test_config.get(u'search_polling', {}),
+            default=self.SearchPollingPolicy
+        )
+
+        # turned off for the rest of the session if the script can't be run
+        self.use_script_locator = test_config.get(u'script_locator', self.UseScriptLocator)
+        self.use_page_source_snapshot = test_config.get(u'page_source_snapshot', self.UsePageSourceSnapshot)
+        self.use_element_cache = test_config.get(u'element_cache', self.UseElementCache)
+
         # ok we now have the desired caps, lets actually create the webdriver
         log.debug(u'creating webdriver instance with capabilities: {}'.format(caps))
         super(HackedWebDriver, self).__init__(command_executor=webdriver_url, desired_capabilities=caps)
@@ -134,6 +268,125 @@ class HackedWebDriver(WebDriver):
         """
         return {}
 
+    def execute(self, driver_command, params=None):
+        """
+        overloaded to keep track of the contexts, the active context and the
+        implicit wait on the client, and to skip commands that wouldn't change
+        any of them
+
+        :param driver_command: the command to send
+        :param params: the command's parameters
+        :rtype: dict
+        """
+        if driver_command == MobileCommand.CONTEXTS and self._contexts is not None:
+            return {u'value': list(self._contexts)}
+        if driver_command == MobileCommand.GET_CURRENT_CONTEXT and self._current_context is not None:
+            return {u'value': self._current_context}
+        if driver_command == MobileCommand.SWITCH_TO_CONTEXT and params[u'name'] == self._current_context:
+            log.debug(u'already in context {}, not switching'.format(self._current_context))
+            return {u'value': None}
+        if driver_command == Command.GET_WINDOW_HANDLES and self._window_handles is not None:
+            return {u'value': list(self._window_handles)}
+        if driver_command == Command.GET_CURRENT_WINDOW_HANDLE and self._current_window_handle is not None:
+            return {u'value': self._current_window_handle}
+        if driver_command == Command.SWITCH_TO_WINDOW and self._window_param(params) == self._current_window_handle:
+            log.debug(u'already in window {}, not switching'.format(self._current_window_handle))
+            return {u'value': None}
+        if driver_command in self.FindCommands:
+            self._sync_implicit_wait()
+
+        # the script locator only reads the page, so it doesn't change anything
+        read_only = driver_command == Command.EXECUTE_SCRIPT and params.get(u'script', None) == WebLocatorScript
+
+        start = time.time()
+        try:
+            response = super(HackedWebDriver, self).execute(driver_command, params)
+        finally:
+            self.command_sec += time.time() - start
+
+            # even a failed navigation or tap may have changed things
+            if not read_only:
+                if driver_command in self.ContextResettingCommands:
+                    self.forget_contexts()
+                if driver_command in self.WindowResettingCommands:
+                    self.forget_window_handles()
+                if driver_command == Command.CLOSE:
+                    self._current_window_handle = None
+                if (driver_command in self.UiMutatingCommands or
+                        driver_command in self.ContextResettingCommands or
+                        driver_command in self.WindowResettingCommands):
+                    self.element_cache.clear()
+
+        if driver_command == MobileCommand.CONTEXTS:
+            self._contexts = list(response[u'value'])
+        elif driver_command == MobileCommand.GET_CURRENT_CONTEXT:
+            self._current_context = response[u'value']
+        elif driver_command == MobileCommand.SWITCH_TO_CONTEXT:
+            self._current_context = params[u'name']
+        elif driver_command == Command.GET_WINDOW_HANDLES:
+            self._window_handles = list(response[u'value'])
+        elif driver_command == Command.GET_CURRENT_WINDOW_HANDLE:
+            self._current_window_handle = response[u'value']
+        elif driver_command == Command.SWITCH_TO_WINDOW:
+            self._current_window_handle = self._window_param(params)
+
+        return response
+
+    @staticmethod
+    def _window_param(params):
+        """
+        :return: the window a switch_to.window command is for. older clients
+            send it as 'name', newer ones as 'handle'
+        """
+        return params.get(u'handle', params.get(u'name', None))
+
+    def reset_timings(self):
+        """
+        zeroes the command and sleep timings, eg. before each step
+        """
+        self.command_sec = 0.0
+        self.sleep_sec = 0.0
+
+    def forget_contexts(self, keep_current=False):
+        """
+        forget the client side copies of the contexts and the active context,
+        so they get fetched from the server the next time they're needed
+
+        :param keep_current: only forget the contexts, eg. when nothing has
+            switched the context but new ones may have shown up
+        """
+        self._contexts = None
+        if not keep_current:
+            self._current_context = None
+
+    def forget_window_handles(self):
+        """
+        forget the client side copy of the window handles, so they get fetched
+        from the server the next time they're needed
+        """
+        self._window_handles = None
+
+    def implicitly_wait(self, time_to_wait):
+        """
+        overloaded to only remember the wait. it's sent right before the next
+        find command, and only if the server doesn't already have it. this way
+        back to back simple_finds don't flip it back and forth.
+
+        :param time_to_wait: seconds to wait
+        """
+        self._wanted_implicit_wait_sec = time_to_wait
+
+    def _sync_implicit_wait(self):
+        """
+        sends the wanted implicit wait to the server, if it's different
+        """
+        if self._wanted_implicit_wait_sec is None or self._wanted_implicit_wait_sec == self._implicit_wait_sec:
+            return
+
+        log.debug(u'setting the implicit wait to {} sec'.format(self._wanted_implicit_wait_sec))
+        super(HackedWebDriver, self).implicitly_wait(self._wanted_implicit_wait_sec)
+        self._implicit_wait_sec = self._wanted_implicit_wait_sec
+
     def _simple_find_core(self, ref, context):
         """
         Iterates through all the possible find operations to locate an element
@@ -146,17 +399,268 @@ class HackedWebDriver(WebDriver):
         :param context: the context in which we're looking; typically WEBVIEW or NATIVE_APP
         :rtype: WebElement
         """
+        return self._simple_find_strategy(ref, context)[0]
+
+    def _simple_find_strategy(self, ref, context, snapshot=True):
+        """
+        same as _simple_find_core, but also tells which find method located
+        the element, so it can be remembered in the locator cache
+
+        :param ref: an identifier for an element; id, class name, partial link text, etc.
+        :param context: the context in which we're looking; typically WEBVIEW or NATIVE_APP
+        :param snapshot: whether to check a page source snapshot first, if
+            they're turned on
+        :return: the element and the name of the find method that found it, or
+            (None, None) if nothing was found
+        :rtype: (WebElement, str)
+        """
         log.debug(u'switching to context ' + context)
         switch_to(self, context)
 
-        for method in HackedWebDriver.ElementSearchOrder:
+        web = u'WEBVIEW' in context
+        if not web and snapshot and self.use_page_source_snapshot:
+            element, method = self._snapshot_find(ref, HackedWebDriver.ElementSearchOrder)
+            if element:
+                return element, method
+
+        return self._find_strategy(ref, HackedWebDriver.ElementSearchOrder, web=web)
+
+    def _snapshot_find(self, ref, search_order):
+        """
+        fetches the page source once, works out locally which find method
+        matches the ref, and only sends that one
+
+        :param ref: an identifier for an element; id, class name, partial link text, etc.
+        :param search_order: list of find method names, in the order to try them
+        :return: the element and the name of the find method that found it, or
+            (None, None) if the page source had no match
+        :rtype: (WebElement, str)
+        """
+        try:
+            method = snapshot_find_method(self.page_source, ref, prune_search_order(ref, search_order))
+        except WebDriverException as e:
+            log.debug(u'couldnt get the page source. {}'.format(e))
+            return None, None
+
+        if method:
             try:
                 element = getattr(self, method)(ref)
                 if element:
-                    return element
+                    self.search_stats[u'snapshot_hits'] += 1
+                    return element, method
+            except Exception:
+                log.debug(u'page source said {} would find {}, but it didnt'.format(method, ref))
+
+        self.search_stats[u'snapshot_misses'] += 1
+        return None, None
+
+    def _find_strategy(self, ref, search_order, web=False):
+        """
+        tries the find methods in search_order, in the current context or
+        window, until one of them finds the element
+
+        :param ref: an identifier for an element; id, class name, partial link text, etc.
+        :param search_order: list of find method names, in the order to try them
+        :param web: whether the current context is a web page. if so, all the
+            find methods are run in a single execute_script call
+        :return: the element and the name of the find method that found it, or
+            (None, None) if nothing was found
+        :rtype: (WebElement, str)
+        """
+        # dont bother with find methods that can never match this ref
+        search_order = prune_search_order(ref, search_order, self.search_stats)
+
+        if web and self.use_script_locator:
+            try:
+                return script_find(self, ref, search_order)
+            except WebDriverException as e:
+                log.debug(u'script locator failed, sending one command per find method from now on. {}'.format(e))
+                self.use_script_locator = False
+
+        for method in search_order:
+            try:
+                element = getattr(self, method)(ref)
+                if element:
+                    return element, method
             except Exception:
                 log.debug(u'couldnt {}. moving on...'.format(method))
 
+        return None, None
+
+    def _cached_find(self, ref, context=None):
+        """
+        tries the context and find method that last resolved the ref, if there
+        is one in the locator cache. a miss drops the ref from the cache so the
+        caller falls back to the full search.
+
+        :param ref: an identifier for an element; id, class name, partial link text, etc.
+        :param context: if given, only use the cached strategy if it was for
+            this context
+        :rtype: WebElement
+        """
+        cached = self.locator_cache.get(ref)
+        if not cached:
+            return None
+
+        cached_context, method = cached
+        if context and not self._same_context(context, cached_context):
+            return None
+
+        try:
+            # the asked for context is the more specific one, when there is one
+            switch_to(self, context or cached_context)
+            element = getattr(self, method)(ref)
+            if element:
+                log.debug(u'found {} with cached strategy {} in {}'.format(ref, method, cached_context))
+                return element
+        except Exception:
+            pass
+
+        log.debug(u'cached strategy {} in {} missed for {}, falling back to the full search'.format(method, cached_context, ref))
+        self.locator_cache.discard(ref)
+        return None
+
+    @staticmethod
+    def _same_context(context_name, other_name):
+        """
+        :return: whether the two context names can mean the same context.
+            switch_to matches context names by substring, so eg. WEBVIEW and
+            WEBVIEW_1 do
+        :rtype: bool
+        """
+        context_name = context_name.lower()
+        other_name = other_name.lower()
+        return context_name in other_name or other_name in context_name
+
+    def _alias_find(self, ref, alias):
+        """
+        finds an aliased ref with its exact locator, retrying until
+        MaxSmartSearchTime_sec runs out in case the screen is still loading
+
+        :param ref: the friendly name that was searched for
+        :param alias: the (find method, value, context) the ref is aliased to
+        :rtype: WebElement
+
+        :raise NoSuchElementException: if the element never showed up
+        """
+        method, locator, context = alias
+        log.debug(u'{} is an alias for {} {}'.format(ref, method, locator))
+
+        self.implicitly_wait(HackedWebDriver.QuickImplicitWait_sec)
+        try:
+            element = self._poll_search(ref, lambda: self._alias_search(ref, alias))
+        finally:
+            self.implicitly_wait(HackedWebDriver.ImplicitWait_sec)
+
+        if not element:
+            raise NoSuchElementException(u'couldnt find {} with {} {}!'.format(ref, method, locator))
+
+        self.cache_element(ref, element)
+        return element
+
+    def _alias_search(self, ref, alias):
+        """
+        one sweep for an aliased ref. an alias that doesn't pin a context is
+        looked for in every context, like any other ref
+
+        :param ref: the friendly name that was searched for
+        :param alias: the (find method, value, context) the ref is aliased to
+        :return: the element, or None if it wasn't found
+        :rtype: WebElement
+        """
+        method, locator, context = alias
+        for search_context in [context] if context else self._search_contexts():
+            switch_to(self, search_context)
+            try:
+                element = getattr(self, method)(locator)
+                if element:
+                    return element
+            except WebDriverException:
+                log.debug(u'couldnt find {} in {}. moving on...'.format(ref, search_context))
+
+        if not context:
+            self.forget_contexts(keep_current=True)
+        return None
+
+    def cached_element(self, ref):
+        """
+        :param ref: an identifier for an element; id, class name, partial link text, etc.
+        :return: the element the ref was last found as, if it's still usable
+        :rtype: WebElement
+        """
+        if not self.use_element_cache:
+            return None
+
+        element = self.element_cache.get(ref)
+        if element:
+            log.debug(u'reusing the cached element for {}'.format(ref))
+            self.last_found_element = element
+        return element
+
+    def cache_element(self, ref, element):
+        """
+        :param ref: an identifier for an element; id, class name, partial link text, etc.
+        :param element: the element the ref was found as
+        """
+        self.last_found_element = element
+        if self.use_element_cache:
+            self.element_cache.put(ref, element)
+
+    def _search_contexts(self):
+        """
+        :return: the contexts to search through, in order
+        :rtype: list[unicode]
+        """
+        contexts = list(self.contexts)
+
+        # cut out all the extra webviews if there are any, and we're looking at a hybrid app
+        if u'NATIVE_APP' in contexts and [webview for context in contexts if u'WEBVIEW' in contexts]:
+            log.debug(u"replacing context list {} with simplified [u'NATIVE_APP', u'WEBVIEW'] list".format(contexts))
+            contexts = [u'NATIVE_APP', u'WEBVIEW']
+
+        return contexts
+
+    def _poll_search(self, ref, sweep, timeout_sec=None):
+        """
+        runs a search sweep until it finds something or MaxSmartSearchTime_sec
+        runs out, waiting between sweeps according to the polling policy
+
+        :param ref: the ref being searched for, for logging
+        :param sweep: callable that runs through all the ways to find the ref
+            once, and returns the element or None
+        :param timeout_sec: how long to keep trying, if not MaxSmartSearchTime_sec
+        :return: the element, or None if the search timed out
+        :rtype: WebElement
+        """
+        if timeout_sec is None:
+            timeout_sec = self.MaxSmartSearchTime_sec
+        timeout = time.time() + timeout_sec
+        intervals = self.polling_policy.intervals()
+        sweeps = 0
+        waited_sec = 0.0
+
+        try:
+            while True:
+                sweeps += 1
+                element = sweep()
+                if element:
+                    return element
+
+                remaining_sec = timeout - time.time()
+                if remaining_sec <= 0:
+                    return None
+
+                wait_sec = min(next(intervals), remaining_sec)
+                log.debug(u'exhausted all search permutations, waiting {:.2f} sec before trying again'.format(wait_sec))
+                time.sleep(wait_sec)
+                waited_sec += wait_sec
+                self.sleep_sec += wait_sec
+        finally:
+            log.debug(u'search for {} ran {} sweeps and waited {:.2f} sec'.format(ref, sweeps, waited_sec))
+            self.search_stats[u'searches'] += 1
+            self.search_stats[u'sweeps'] += sweeps
+            self.search_stats[u'poll_wait_sec'] += waited_sec
+
     def simple_find(self, ref):
         """
         this simplifies the 'find' operation. from a behavioral/user pov, they
@@ -171,12 +675,13 @@ class HackedWebDriver(WebDriver):
         @param ref: an identifier for an element; id, class name, partial link text, etc.
         @rtype: WebElement
         """
-        contexts = list(self.contexts)
+        element = self.cached_element(ref)
+        if element:
+            return element
 
-        # cut out all the extra webviews if there are any, and we're looking at a hybrid app
-        if u'NATIVE_APP' in contexts and [webview for context in contexts if u'WEBVIEW' in contexts]:
-            log.debug(u"replacing context list {} with simplified [u'NATIVE_APP', u'WEBVIEW'] list".format(contexts))
-            contexts = [u'NATIVE_APP', u'WEBVIEW']
+        alias = self.locator_aliases.get(ref)
+        if alias:
+            return self._alias_find(ref, alias)
 
         # speed up the implicit wait, because with default time, this takes way
         # too long because of all the possible permutations
@@ -185,13 +690,32 @@ class HackedWebDriver(WebDriver):
         # wrap this all in a try so we can restore the default implicit wait if
         # and when this block exits
         try:
-            timeout = time.time() + self.MaxSmartSearchTime_sec
-            while time.time() < timeout:
-                for context in contexts:
-                    element = self._simple_find_core(ref, context)
+            element = self._cached_find(ref)
+            if element:
+                self.cache_element(ref, element)
+                return element
+
+            # only the first sweep checks a page source snapshot. if the
+            # element isnt there yet, fetching the page source again on every
+            # sweep would just slow the wait down
+            sweeps = []
+
+            def sweep():
+                sweeps.append(ref)
+                for context in self._search_contexts():
+                    element, method = self._simple_find_strategy(ref, context, snapshot=len(sweeps) == 1)
                     if element:
+                        self.locator_cache.put(ref, context, method)
                         return element
-                log.debug(u'exhausted all search permutations, looping until we timeout here')
+
+                # eg. a hybrid app's webview may only show up after launch, so
+                # the next sweep fetches the contexts again
+                self.forget_contexts(keep_current=True)
+
+            element = self._poll_search(ref, sweep)
+            if element:
+                self.cache_element(ref, element)
+                return element
         finally:
             # restore the default implicit wait
             self.implicitly_wait(HackedWebDriver.ImplicitWait_sec)
@@ -214,18 +738,144 @@ class HackedWebDriver(WebDriver):
         # wrap this all in a try so we can restore the default implicit wait if
         # and when this block exits
         try:
-            timeout = time.time() + self.MaxSmartSearchTime_sec
-            while time.time() < timeout:
-                element = self._simple_find_core(ref, context)
+            element = self._cached_find(ref, context)
+            if element:
+                self.last_found_element = element
+                return element
+
+            # only the first sweep checks a page source snapshot
+            sweeps = []
+
+            def sweep():
+                sweeps.append(ref)
+                element, method = self._simple_find_strategy(ref, context, snapshot=len(sweeps) == 1)
                 if element:
+                    self.locator_cache.put(ref, context, method)
                     return element
-                log.debug(u'exhausted all search methods, looping until we timeout here')
+
+            element = self._poll_search(ref, sweep)
+            if element:
+                self.last_found_element = element
+                return element
         finally:
             # restore the default implicit wait
             self.implicitly_wait(HackedWebDriver.ImplicitWait_sec)
 
         assert False, u'couldnt find {}!'.format(ref)
 
+    def quit(self):
+        """
+        overloaded to persist the locator cache before the session goes away
+        """
+        log.debug(u'search stats for this session: {}'.format(dict(self.search_stats)))
+
+        try:
+            self.locator_cache.save()
+        except (IOError, OSError) as e:
+            log.warning(u'problem saving the locator cache! {}'.format(e))
+
+        super(HackedWebDriver, self).quit()
+
+    def is_absent(self, ref, settle_sec=None):
+        """
+        checks that nothing matching the ref is displayed. this uses the
+        find_elements methods, which come back empty rather than raising, so an
+        absent element is confirmed after a single sweep instead of searching
+        for MaxSmartSearchTime_sec. if something is displayed, this keeps
+        checking for up to settle_sec in case it's on its way out.
+
+        :param ref: an identifier for an element; id, class name, partial link text, etc.
+        :param settle_sec: how long to wait for a displayed element to go away.
+            defaults to absence_settle_sec from the test config, or
+            AbsenceSettleTime_sec
+        :return: True if nothing matching the ref is displayed
+        :rtype: bool
+        """
+        if settle_sec is None:
+            settle_sec = self.absence_settle_sec
+
+        alias = self.locator_aliases.get(ref)
+        if alias:
+            any_displayed = lambda: self._alias_displayed(alias)
+        else:
+            any_displayed = lambda: self._any_displayed(ref)
+
+        self.implicitly_wait(HackedWebDriver.QuickImplicitWait_sec)
+        try:
+            return bool(self._poll_search(
+                ref,
+                lambda: not any_displayed(),
+                timeout_sec=settle_sec
+            ))
+        finally:
+            self.implicitly_wait(HackedWebDriver.ImplicitWait_sec)
+
+    def _any_displayed(self, ref):
+        """
+        :param ref: an identifier for an element; id, class name, partial link text, etc.
+        :return: whether anything matching the ref is displayed, in any context
+        :rtype: bool
+        """
+        for context in self._search_contexts():
+            switch_to(self, context)
+            if self._any_displayed_here(ref, HackedWebDriver.ElementSearchOrder):
+                return True
+        return False
+
+    def _alias_displayed(self, alias):
+        """
+        :param alias: the (find method, value, context) a ref is aliased to
+        :return: whether anything matching the alias is displayed, in its
+            context or in any context if it doesn't pin one
+        :rtype: bool
+        """
+        method, locator, context = alias
+        for search_context in [context] if context else self._search_contexts():
+            switch_to(self, search_context)
+            try:
+                elements = getattr(self, method.replace(u'find_element_', u'find_elements_', 1))(locator)
+            except WebDriverException:
+                continue
+            if self._displayed(elements):
+                return True
+        return False
+
+    @staticmethod
+    def _displayed(elements):
+        """
+        :param elements: list of elements
+        :return: whether any of the elements are displayed
+        :rtype: bool
+        """
+        for element in elements:
+            try:
+                if element.is_displayed():
+                    return True
+            except WebDriverException:
+                # it went stale, so it's gone
+                pass
+        return False
+
+    def _any_displayed_here(self, ref, search_order):
+        """
+        :param ref: an identifier for an element; id, class name, partial link text, etc.
+        :param search_order: list of find method names to check with
+        :return: whether anything matching the ref is displayed, in the current
+            context or window
+        :rtype: bool
+        """
+        for method in prune_search_order(ref, search_order, self.search_stats):
+            try:
+                elements = getattr(self, method.replace(u'find_element_', u'find_elements_', 1))(ref)
+            except WebDriverException:
+                log.debug(u'couldnt {}. moving on...'.format(method))
+                continue
+
+            if self._displayed(elements):
+                log.debug(u'{} is displayed, found with {}'.format(ref, method))
+                return True
+        return False
+
     def get_screenshot_path(self, path, suffix=''):
         """
         :param path: path to save image into
@@ -254,13 +904,31 @@ class HackedWebDriver(WebDriver):
         :return: the filepath to the screenshot
         """
         file_path = self.get_screenshot_path(path, suffix)
+        image = self.fetch_screenshot()
+        if image is None:
+            return None
+
+        try:
+            with open(file_path, u'wb') as f:
+                f.write(base64.b64decode(image.encode(u'ascii')))
+            return file_path
+        except IOError as e:
+            log.warning(u'problem writing screenshot! {}'.format(e))
+            return None
+
+    def fetch_screenshot(self):
+        """
+        fetches a screenshot from the driver without decoding or saving it, so
+        that can be done elsewhere (see ScreenshotWriter)
+
+        :return: the base64 encoded png, or None if it couldn't be taken
+        """
         # ive seen this bork hard when the driver doesn't have control of the
         # active window, causing the entire test to break
         # this can happen when you're on the home screen or in an app that you
         # cant control
         try:
-            self.get_screenshot_as_file(file_path)
-            return file_path
+            return self.get_screenshot_as_base64()
         except WebDriverException as e:
             log.warning(u'problem taking screenshot! {}'.format(e))
             return None
@@ -0,0 +1,599 @@
+"""
+tools that help the webdrivers find elements faster
+"""
+import json
+import logging
+import os
+import random
+import re
+
+from selenium.common.exceptions import WebDriverException
+
+try:
+    import xml.etree.cElementTree as ElementTree
+except ImportError:
+    import xml.etree.ElementTree as ElementTree
+
+
+log = logging.getLogger(u'mobilebdd')
+
+
+# refs that can only ever be xpath, eg. //div[@x], /html/body, (//a)[2], ./span
+XPathRef = re.compile(r'^\(*\.?/')
+# fully qualified android resource ids, eg. com.x:id/login
+PackageIdRef = re.compile(r'^[\w.]+:id/[\w.]+$')
+# css id/class selectors, attribute selectors, and combinators between parts
+CssRef = re.compile(r'^[#.][\w-]|\[[^\]]*\]|[\w\])*]\s*[>~+]\s*[\w#.\[*]')
+# refs that could be a tag name, eg. div, h1, my-widget
+TagNameRef = re.compile(r'^[A-Za-z][A-Za-z0-9-]*$')
+# refs that could be a single class name, html or native, eg. btn, android.widget.Button
+ClassNameRef = re.compile(r'^[\w.$-]+$')
+
+# the find methods that are worth trying for refs that read like text, eg.
+# "Login button", or like a css selector
+TextLikeMethods = frozenset([
+    u'find_element_by_css_selector',
+    u'find_element_by_link_text',
+    u'find_element_by_partial_link_text',
+    u'find_element_by_name',
+    u'find_element_by_accessibility_id'
+])
+
+
+def is_applicable(ref, method):
+    """
+    looks at the syntax of a ref to tell whether the find method could ever
+    match it. eg. find_element_by_id will never find "//div[@x]", and
+    find_element_by_xpath will never find "Login button".
+
+    :param ref: an identifier for an element; id, class name, partial link text, etc.
+    :param method: name of the find method
+    :rtype: bool
+    """
+    if XPathRef.match(ref):
+        return method == u'find_element_by_xpath'
+    if PackageIdRef.match(ref):
+        return method == u'find_element_by_id'
+    if CssRef.search(ref) or re.search(r'\s', ref):
+        return method in TextLikeMethods
+
+    # a single plain token could be almost anything but an xpath
+    if method == u'find_element_by_xpath':
+        return False
+    if method == u'find_element_by_tag_name':
+        return bool(TagNameRef.match(ref))
+    if method == u'find_element_by_class_name':
+        return bool(ClassNameRef.match(ref))
+    return True
+
+
+def prune_search_order(ref, search_order, stats=None):
+    """
+    drops the find methods that can't apply to the ref from the search order
+
+    :param ref: an identifier for an element; id, class name, partial link text, etc.
+    :param search_order: list of find method names, in the order to try them
+    :param stats: optional counter to record the skipped find methods in
+    :type stats: collections.Counter
+    :return: the find methods worth trying, in the same order
+    :rtype: list[str]
+    """
+    applicable = []
+    for method in search_order:
+        if is_applicable(ref, method):
+            applicable.append(method)
+        elif stats is not None:
+            stats[u'skipped_strategies'] += 1
+            stats[u'skipped:' + method] += 1
+
+    if len(applicable) < len(search_order):
+        log.debug(u'skipping {} find methods that cant match {}'.format(len(search_order) - len(applicable), ref))
+    return applicable
+
+
+class LocatorCache(object):
+    """
+    remembers which context and find method resolved each ref, so that the next
+    search for the same ref can try that pair first instead of walking every
+    context and every find method
+
+    entries are keyed by app and platform, because the same ref usually
+    resolves differently on android and ios. if a file path is given, the
+    cache is loaded from it and can be saved back to it between runs.
+    """
+
+    def __init__(self, file_path=None, app=None, platform=None):
+        """
+        :param file_path: optional path to a json file to persist the cache in
+        :param app: the app (path or url) the cache entries belong to
+        :param platform: the platform (eg. android, ios) the entries belong to
+        """
+        self.file_path = file_path
+        self.key = u'{}|{}'.format(platform or u'', app or u'')
+
+        self.entries = {}
+        '''
+        :ivar: mapping of ref to the (context, find method) that resolved it
+        :type: dict[unicode, tuple]
+        '''
+
+        # the refs put or discarded since the file was loaded, as ref -> pair,
+        # or None if it was discarded. only these are written back, so the
+        # entries that other processes saved in the meantime are kept
+        self.changes = {}
+
+        if self.file_path:
+            self.load()
+
+    def get(self, ref):
+        """
+        :param ref: the ref that was searched for
+        :return: the (context, find method) pair that last resolved the ref,
+            or None if it isn't known
+        :rtype: tuple
+        """
+        return self.entries.get(ref, None)
+
+    def put(self, ref, context, method):
+        """
+        :param ref: the ref that was searched for
+        :param context: the context the ref was found in
+        :param method: name of the find method that found the ref
+        """
+        # webview context names carry a pid or package name that can change
+        # between runs. switch_to matches on substrings, so store the generic
+        # name instead
+        if u'WEBVIEW' in context:
+            context = u'WEBVIEW'
+
+        if self.entries.get(ref, None) != (context, method):
+            self.entries[ref] = (context, method)
+            self.changes[ref] = (context, method)
+
+    def discard(self, ref):
+        """
+        forget about a ref, eg. when its cached strategy stopped working
+
+        :param ref: the ref to forget
+        """
+        if self.entries.pop(ref, None):
+            self.changes[ref] = None
+
+    def _read_file(self):
+        """
+        :return: the whole cache file, for all apps and platforms
+        :rtype: dict
+        """
+        if not os.path.isfile(self.file_path):
+            return {}
+
+        try:
+            with open(self.file_path) as f:
+                return json.load(f)
+        except (IOError, ValueError) as e:
+            log.warning(u'could not read locator cache {}, ignoring it. {}'.format(self.file_path, e))
+            return {}
+
+    def load(self):
+        """
+        loads the entries for this app and platform from the cache file
+        """
+        entries = self._read_file().get(self.key, {})
+        self.entries = dict((ref, tuple(pair)) for ref, pair in entries.items())
+        self.changes = {}
+        log.debug(u'loaded {} cached locators for {}'.format(len(self.entries), self.key))
+
+    def save(self):
+        """
+        writes the changed entries for this app and platform back to the cache
+        file, leaving everything else in it alone
+        """
+        if not self.file_path or not self.changes:
+            return
+
+        cache_dir = os.path.dirname(self.file_path)
+        if cache_dir and not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+
+        # parallel runs share the file, so their entries are read back in and
+        # merged as late as possible, and the file is replaced in one go rather
+        # than let another process read it half written
+        data = self._read_file()
+        entries = dict((ref, tuple(pair)) for ref, pair in data.get(self.key, {}).items())
+        for ref, pair in self.changes.items():
+            if pair:
+                entries[ref] = pair
+            else:
+                entries.pop(ref, None)
+        data[self.key] = dict((ref, list(pair)) for ref, pair in entries.items())
+
+        temp_path = u'{}.{}.tmp'.format(self.file_path, os.getpid())
+        with open(temp_path, u'w') as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+        os.rename(temp_path, self.file_path)
+
+        self.entries = entries
+        self.changes = {}
+        log.debug(u'saved {} cached locators for {}'.format(len(self.entries), self.key))
+
+
+class ElementCache(object):
+    """
+    remembers the element each ref resolved to, so that steps that use the
+    same element more than once don't have to search for it every time
+
+    before a cached element is handed out, it gets one cheap command to make
+    sure it's not stale. the driver clears the whole cache when the ui may have
+    changed under it, eg. navigation, context switches, taps and typing.
+    """
+
+    def __init__(self):
+        self.elements = {}
+        '''
+        :ivar: mapping of ref to the element it was last found as
+        :type: dict[unicode, WebElement]
+        '''
+
+        # how often the cache could and couldn't be used, for tuning
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, ref):
+        """
+        :param ref: the ref that is being searched for
+        :return: the cached element, if there is one and it's not stale
+        :rtype: WebElement
+        """
+        element = self.elements.get(ref, None)
+        if element is not None:
+            try:
+                # any cheap command will do, it raises if the element is stale
+                element.is_enabled()
+                self.hits += 1
+                return element
+            except WebDriverException:
+                log.debug(u'cached element for {} is stale'.format(ref))
+                del self.elements[ref]
+
+        self.misses += 1
+        return None
+
+    def put(self, ref, element):
+        """
+        :param ref: the ref that was searched for
+        :param element: the element it was found as
+        """
+        self.elements[ref] = element
+
+    def clear(self):
+        """
+        forget all the cached elements
+        """
+        self.elements.clear()
+
+    def reset_stats(self):
+        """
+        start counting hits and misses from zero, eg. for the next scenario
+        """
+        self.hits = 0
+        self.misses = 0
+
+
+# the strategy names used by WebLocatorScript for each find method. find
+# methods that don't mean anything inside a page (eg. accessibility id) are left
+# out, and get skipped when searching with the script
+ScriptStrategies = {
+    u'find_element_by_id': u'id',
+    u'find_element_by_name': u'name',
+    u'find_element_by_css_selector': u'css',
+    u'find_element_by_xpath': u'xpath',
+    u'find_element_by_link_text': u'link',
+    u'find_element_by_partial_link_text': u'partial_link',
+    u'find_element_by_tag_name': u'tag',
+    u'find_element_by_class_name': u'class'
+}
+
+# tries each of the given strategies inside the page and returns the first
+# matching element along with the strategy that matched it. sticks to es5 so it
+# works in older webviews too
+# arguments[0] is the ref, arguments[1] is the ordered list of strategies
+WebLocatorScript = u"""
+var ref = arguments[0];
+var strategies = arguments[1];
+
+function findLink(matches) {
+    var links = document.getElementsByTagName('a');
+    for (var i = 0; i < links.length; i++) {
+        var text = (links[i].innerText || links[i].textContent || '').replace(/^\\s+|\\s+$/g, '');
+        if (matches(text)) {
+            return links[i];
+        }
+    }
+    return null;
+}
+
+var finders = {
+    'id': function () { return document.getElementById(ref); },
+    'name': function () { return document.getElementsByName(ref)[0]; },
+    'css': function () { return document.querySelector(ref); },
+    'xpath': function () {
+        return document.evaluate(ref, document, null,
+            XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+    },
+    'link': function () {
+        return findLink(function (text) { return text === ref; });
+    },
+    'partial_link': function () {
+        return findLink(function (text) { return text.indexOf(ref) !== -1; });
+    },
+    'tag': function () { return document.getElementsByTagName(ref)[0]; },
+    'class': function () { return document.getElementsByClassName(ref)[0]; }
+};
+
+for (var i = 0; i < strategies.length; i++) {
+    try {
+        var element = finders[strategies[i]]();
+        if (element) {
+            return [element, strategies[i]];
+        }
+    } catch (e) {
+        // invalid css or xpath for this ref, try the next strategy
+    }
+}
+return null;
+"""
+
+
+def script_find(driver, ref, search_order):
+    """
+    searches for the ref in the current web context with a single
+    execute_script call, trying the find methods in search_order inside the page
+
+    :param driver: the webdriver to search with
+    :param ref: an identifier for an element; id, class name, partial link text, etc.
+    :param search_order: list of find method names, in the order to try them
+    :return: the element and the name of the find method that matched it, or
+        (None, None) if nothing matched
+    :rtype: (WebElement, str)
+
+    :raise WebDriverException: if the script couldn't be run at all
+    """
+    strategies = [ScriptStrategies[method] for method in search_order if method in ScriptStrategies]
+    result = driver.execute_script(WebLocatorScript, ref, strategies)
+    if not result:
+        return None, None
+
+    element, strategy = result
+    method = [method for method, name in ScriptStrategies.items() if name == strategy][0]
+    log.debug(u'script locator found {} with {}'.format(ref, method))
+    return element, method
+
+
+# the node attributes each find method compares the ref against when searching
+# a native app's page source. covers both the android and ios hierarchies
+SnapshotAttributes = {
+    u'find_element_by_id': (u'resource-id', u'name'),
+    u'find_element_by_name': (u'name', u'text', u'content-desc', u'label'),
+    u'find_element_by_accessibility_id': (u'content-desc', u'name'),
+    u'find_element_by_class_name': (u'class', u'type')
+}
+
+
+def _snapshot_node_matches(node, method, ref):
+    """
+    :param node: a node from the parsed page source
+    :param method: name of the find method
+    :param ref: the ref being searched for
+    :return: whether the find method would match the node
+    :rtype: bool
+    """
+    for attribute in SnapshotAttributes[method]:
+        value = node.get(attribute)
+        if value == ref:
+            return True
+        # android ids can be given without the package, eg. login for com.x:id/login
+        if attribute == u'resource-id' and value and value.endswith(u':id/' + ref):
+            return True
+
+    # some hierarchies use the class as the tag name
+    return method == u'find_element_by_class_name' and node.tag == ref
+
+
+def snapshot_find_method(page_source, ref, search_order):
+    """
+    parses a native app's page source once and works out locally which find
+    method would match the ref, so only that one has to be sent to the server
+
+    :param page_source: the page source xml
+    :param ref: an identifier for an element; id, class name, partial link text, etc.
+    :param search_order: list of find method names, in the order to try them
+    :return: the first find method in search_order that matches something, or
+        None if nothing matched or the page source couldn't be searched
+    :rtype: str
+    """
+    if isinstance(page_source, unicode):
+        page_source = page_source.encode(u'utf8')
+    try:
+        root = ElementTree.fromstring(page_source)
+    except (ElementTree.ParseError, SyntaxError) as e:
+        log.debug(u'could not parse the page source, {}'.format(e))
+        return None
+
+    methods = [method for method in search_order if method in SnapshotAttributes]
+    best = None
+    for node in root.iter():
+        for index, method in enumerate(methods[:best]):
+            if _snapshot_node_matches(node, method, ref):
+                best = index
+                break
+        if best == 0:
+            break
+
+    if best is not None:
+        return methods[best]
+
+    # only the simple xpaths that ElementTree understands can be checked here
+    if u'find_element_by_xpath' in search_order and ref.startswith(u'//'):
+        try:
+            if root.find(u'.' + ref) is not None:
+                return u'find_element_by_xpath'
+        except (SyntaxError, KeyError):
+            log.debug(u'xpath {} is too fancy to check in the page source'.format(ref))
+
+    return None
+
+
+class PollingPolicy(object):
+    """
+    how long to wait between sweeps when a search keeps coming up empty. the
+    wait starts at initial_sec and is multiplied by backoff after every sweep,
+    up to max_sec. jitter randomly spreads each wait by up to that fraction of
+    it, so sessions on the same grid don't all poll in lockstep.
+    """
+
+    def __init__(self, initial_sec=0.1, backoff=2.0, max_sec=1.0, jitter=0.0):
+        """
+        :param initial_sec: seconds to wait after the first sweep
+        :param backoff: what to multiply the wait by after every sweep
+        :param max_sec: the most seconds to ever wait between two sweeps
+        :param jitter: fraction (0 to 1) of each wait to randomly add or remove
+        """
+        self.initial_sec = float(initial_sec)
+        self.backoff = float(backoff)
+        self.max_sec = float(max_sec)
+        self.jitter = float(jitter)
+
+    @classmethod
+    def from_config(cls, config, default=None):
+        """
+        :param config: dict with any of the initial_sec, backoff, max_sec and
+            jitter keys, eg. from the test config
+        :param default: policy to take the missing keys from
+        :type default: PollingPolicy
+        :rtype: PollingPolicy
+        """
+        if default is None:
+            default = cls()
+        return cls(
+            initial_sec=config.get(u'initial_sec', default.initial_sec),
+            backoff=config.get(u'backoff', default.backoff),
+            max_sec=config.get(u'max_sec', default.max_sec),
+            jitter=config.get(u'jitter', default.jitter)
+        )
+
+    def intervals(self):
+        """
+        :return: generator of the seconds to wait after each sweep
+        """
+        interval = self.initial_sec
+        while True:
+            wait = min(interval, self.max_sec)
+            if self.jitter:
+                wait += wait * self.jitter * random.uniform(-1, 1)
+            yield max(wait, 0)
+            interval *= self.backoff
+
+
+# the strategies that can be used in locator aliases. each one maps to the
+# find_element_by_<strategy> method of the webdriver
+AliasStrategies = frozenset([
+    u'id',
+    u'name',
+    u'xpath',
+    u'css_selector',
+    u'link_text',
+    u'partial_link_text',
+    u'tag_name',
+    u'class_name',
+    u'accessibility_id',
+    u'android_uiautomator',
+    u'ios_uiautomation'
+])
+
+
+class LocatorAliases(object):
+    """
+    maps the friendly names used in feature files to exact locators, so those
+    refs can be found with one direct command instead of a blind search
+
+    the aliases come from the locator_aliases key of the test config, per app
+    and per platform:
+
+    "locator_aliases": {
+        "MyApp": {
+            "Login button": {
+                "android": ["id", "com.x:id/login"],
+                "ios": ["accessibility_id", "Login", "NATIVE_APP"]
+            }
+        }
+    }
+
+    the app key is either the app path/url itself, an alias from app_urls, or
+    for drivers started without an app path, the android app package.
+    each locator is a strategy, the value to find, and optionally the context
+    to find it in.
+    """
+
+    def __init__(self, aliases=None):
+        """
+        :param aliases: mapping of ref to (find method, locator, context)
+        :type aliases: dict
+        """
+        self.aliases = aliases or {}
+
+    @classmethod
+    def from_config(cls, test_config, app=None, platform=None, package=None):
+        """
+        :param test_config: the test config dict
+        :param app: the app (path or url) the driver is running
+        :param platform: the platform (eg. android, ios) the driver is running on
+        :param package: the app package the driver is running, for android
+        :rtype: LocatorAliases
+
+        :raise ValueError: if an alias has a bad locator
+        """
+        app_urls = test_config.get(u'app_urls', {})
+        platform = (platform or u'').lower()
+        apps = set(name for name in (app, package) if name)
+
+        aliases = {}
+        for app_key, refs in test_config.get(u'locator_aliases', {}).items():
+            if app_key not in apps and app_urls.get(app_key, None) not in apps:
+                continue
+
+            for ref, platforms in refs.items():
+                for platform_key, locator in platforms.items():
+                    if platform_key.lower() == platform:
+                        aliases[ref] = cls._parse_locator(ref, locator)
+
+        if test_config.get(u'locator_aliases', None) and not apps:
+            log.warning(u'locator aliases are looked up by the app path or app package, and the driver has neither. not using them')
+        log.debug(u'loaded {} locator aliases for {} on {}'.format(len(aliases), app or package, platform))
+        return cls(aliases)
+
+    @staticmethod
+    def _parse_locator(ref, locator):
+        """
+        :param ref: the friendly name the locator is for
+        :param locator: [strategy, value] or [strategy, value, context]
+        :return: (find method, value, context or None)
+        :rtype: tuple
+
+        :raise ValueError: if the locator is malformed
+        """
+        if not isinstance(locator, (list, tuple)) or len(locator) not in (2, 3):
+            raise ValueError(u'locator alias for "{}" should be [strategy, value] or [strategy, value, context], got {}'.format(ref, locator))
+        if locator[0] not in AliasStrategies:
+            raise ValueError(u'locator alias for "{}" has unknown strategy "{}", use one of {}'.format(ref, locator[0], sorted(AliasStrategies)))
+
+        context = locator[2] if len(locator) == 3 else None
+        return u'find_element_by_' + locator[0], locator[1], context
+
+    def get(self, ref):
+        """
+        :param ref: the ref that is being searched for
+        :return: the (find method, value, context) for the ref, or None if it
+            isn't aliased
+        :rtype: tuple
+        """
+        return self.aliases.get(ref, None)
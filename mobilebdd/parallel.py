@@ -0,0 +1,195 @@
+"""
+runs the features of a suite in parallel, one process per webdriver endpoint
+(eg. a device, or a node of a grid)
+
+each process is a normal run with its own runner and context, so features
+using @single_session keep their driver for the whole feature as usual. the
+processes take the next feature from a shared queue whenever they're free, and
+each writes its test artifacts to its own dir. the html reports and junit
+files are merged into the test artifact dir at the end
+"""
+import copy
+import logging
+import multiprocessing
+import os
+import Queue
+
+from behave.runner_util import FileLocationParser
+
+from mobilebdd.reports.merge import merge_runs
+from mobilebdd.runner import _behave_config, _check_steps, _config_listeners, _read_config_file, _run_behave
+
+
+log = logging.getLogger(u'mobilebdd')
+
+
+def _worker_dir(test_artifact_dir, worker_number):
+    """
+    :return: where a worker writes its test artifacts
+    """
+    return os.path.join(test_artifact_dir, u'worker-{}'.format(worker_number))
+
+
+def _worker_test_config(test_config, worker_dir):
+    """
+    :return: a copy of the test config, with the outputs that would otherwise
+        be written by every worker moved into the worker's dir
+    :rtype: dict
+    """
+    test_config = copy.deepcopy(test_config) if test_config else {}
+
+    if test_config.get(u'json_lines_report', None):
+        test_config[u'json_lines_report'] = os.path.join(worker_dir, os.path.basename(test_config[u'json_lines_report']))
+    if test_config.get(u'step_profile_dir', None):
+        test_config[u'step_profile_dir'] = os.path.join(worker_dir, u'step-profile')
+
+    return test_config
+
+
+def _run_worker(worker_number, webdriver_url, feature_queue, results, feature_dirs, step_dirs,
+                test_artifact_dir, listeners, webdriver_processor, tags, show_skipped, test_config):
+    """
+    runs features from the queue until it's empty, then puts
+    (worker number, passed) on the results queue
+    """
+    passed = False
+    try:
+        worker_dir = _worker_dir(test_artifact_dir, worker_number) if test_artifact_dir else None
+        test_config = _worker_test_config(test_config, worker_dir) if worker_dir else test_config
+
+        config = _behave_config(worker_dir, False, tags, show_skipped, test_config)
+        passed = _run_behave(
+            feature_dirs,
+            config,
+            step_dirs=step_dirs,
+            webdriver_url=webdriver_url,
+            webdriver_processor=webdriver_processor,
+            listeners=_config_listeners(listeners, test_config),
+            test_config=test_config,
+            feature_queue=feature_queue
+        )
+    except Exception as e:
+        # the other workers carry on, the run just fails
+        log.exception(u'worker {} ({}) failed: {}'.format(worker_number, webdriver_url, e))
+    finally:
+        results.put((worker_number, passed))
+
+
+def goh_behave_parallel(feature_dirs=None, step_dirs=None, test_artifact_dir=None,
+                        listeners=None, webdriver_urls=None, processes=None,
+                        webdriver_processor=None, tags=None, show_skipped=True,
+                        config_file=None, test_config=None):
+    """
+    runs behave, spreading the features across several webdriver endpoints
+
+    the parameters are the same as for goh_behave, except:
+
+    :param webdriver_urls: list of webdriver node/grid urls. one process is
+        run for each url
+    :type webdriver_urls: list
+    :param processes: optional. number of processes to run. if webdriver_urls
+        is a single url (eg. a grid), it's used by this many processes
+    :param listeners: list of Listener objects. each process gets its own copy
+
+    if the test config asks for a json lines report or a step profile, each
+    process writes its own, in its dir under the test artifact dir
+
+    :return: True if the tests passed in every process, else False
+    :rtype: bool
+
+    :raise ParserError: when a feature file couldnt be parsed
+    :raise UndefinedStepsError: if some steps were undefined
+    :raise ValueError: if there's no webdriver url to run against, or a
+        feature dir is a file:line location. the features are queued by file,
+        so a location would run the whole file
+    """
+    test_config = _read_config_file(config_file, test_config)
+
+    if test_config:
+        if u'feature_dirs' in test_config and not feature_dirs:
+            feature_dirs = test_config[u'feature_dirs']
+        if u'step_dirs' in test_config and not step_dirs:
+            step_dirs = test_config[u'step_dirs']
+        if u'test_artifact_dir' in test_config and not test_artifact_dir:
+            test_artifact_dir = test_config[u'test_artifact_dir']
+        if u'webdriver_urls' in test_config and not webdriver_urls:
+            webdriver_urls = test_config[u'webdriver_urls']
+        if u'webdriver_url' in test_config and not webdriver_urls:
+            webdriver_urls = test_config[u'webdriver_url']
+        if u'parallel_processes' in test_config and not processes:
+            processes = test_config[u'parallel_processes']
+        if u'tags' in test_config and not tags:
+            tags = test_config[u'tags']
+        if u'show_skipped' in test_config:
+            show_skipped = test_config[u'show_skipped']
+
+    if not feature_dirs:
+        feature_dirs = ["features"]
+    if isinstance(feature_dirs, basestring):
+        feature_dirs = [feature_dirs]
+    locations = [path for path in feature_dirs if FileLocationParser.parse(path).line]
+    if locations:
+        raise ValueError(u'a parallel run cant run file:line locations, only whole features: {}'.format(
+            u', '.join(locations)))
+
+    if not webdriver_urls:
+        raise ValueError(u'a parallel run needs webdriver_urls to run against')
+    if isinstance(webdriver_urls, basestring):
+        webdriver_urls = [webdriver_urls]
+    if processes:
+        # share the urls out between the processes
+        webdriver_urls = [webdriver_urls[i % len(webdriver_urls)] for i in range(processes)]
+
+    # catch any undefined steps before any of the processes start. the
+    # processes are forked after this, so they dont load the steps again
+    feature_paths = _check_steps(feature_dirs, step_dirs, test_config)
+    # no point starting processes that wont get a feature
+    webdriver_urls = webdriver_urls[:len(feature_paths)]
+    log.debug(u'running {} features on {} webdrivers'.format(len(feature_paths), len(webdriver_urls)))
+
+    feature_queue = multiprocessing.Queue()
+    for feature_path in feature_paths:
+        feature_queue.put(feature_path)
+    # one stop for each worker
+    for _ in webdriver_urls:
+        feature_queue.put(None)
+
+    results = multiprocessing.Queue()
+    workers = []
+    for worker_number, webdriver_url in enumerate(webdriver_urls):
+        worker = multiprocessing.Process(
+            target=_run_worker,
+            args=(worker_number, webdriver_url, feature_queue, results, feature_dirs, step_dirs,
+                  test_artifact_dir, listeners, webdriver_processor, tags, show_skipped, test_config),
+            name=u'mobilebdd-worker-{}'.format(worker_number)
+        )
+        worker.start()
+        workers.append(worker)
+
+    # a worker that died without reporting counts as failed
+    passed = dict((number, False) for number in range(len(workers)))
+    reported = 0
+    while reported < len(workers):
+        try:
+            worker_number, worker_passed = results.get(timeout=1)
+        except Queue.Empty:
+            if not any(worker.is_alive() for worker in workers):
+                log.error(u'{} workers exited without reporting their results'.format(len(workers) - reported))
+                break
+            continue
+        passed[worker_number] = worker_passed
+        reported += 1
+    for worker in workers:
+        worker.join()
+
+    if test_artifact_dir:
+        try:
+            merge_runs(
+                [_worker_dir(test_artifact_dir, number) for number in range(len(workers))],
+                test_artifact_dir
+            )
+        except EnvironmentError as e:
+            log.error(u'could not merge the reports of the workers. {}'.format(e))
+            return False
+
+    return all(passed.values())
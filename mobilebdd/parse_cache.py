@@ -0,0 +1,197 @@
+"""
+an on-disk cache of the parsed feature files, and of which features are known
+to only use defined steps, so runs where little has changed don't have to
+parse and check everything again
+
+everything is keyed by content hashes, so a changed feature file is parsed
+again, and a change to any step file means every feature is checked again.
+the cache dir can be deleted at any time
+"""
+import cPickle
+import hashlib
+import json
+import logging
+import os
+import sys
+
+import behave
+from behave import parser
+
+
+log = logging.getLogger(u'mobilebdd')
+
+
+def _hash_file(file_path, digest):
+    with open(file_path, u'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+
+
+def hash_step_files(step_paths):
+    """
+    :param step_paths: the dirs the step files are loaded from, searched
+        recursively
+    :return: a hash of the step files' paths and contents, which changes when
+        any step file does
+    :rtype: str
+    """
+    digest = hashlib.sha1()
+    digest.update(repr((behave.__version__, sys.version_info[:2])))
+    for step_path in sorted(set(step_paths)):
+        for current_dir, subdirs, files in os.walk(step_path):
+            subdirs.sort()
+            for name in sorted(files):
+                if name.endswith(u'.py'):
+                    file_path = os.path.join(current_dir, name)
+                    digest.update(os.path.abspath(file_path).encode(u'utf8'))
+                    _hash_file(file_path, digest)
+    return digest.hexdigest()
+
+
+def _write_atomic(file_path, data):
+    """
+    parallel runs share the cache, so files are replaced in one go rather
+    than let another process read them half written
+    """
+    temp_path = u'{}.{}.tmp'.format(file_path, os.getpid())
+    with open(temp_path, u'wb') as f:
+        f.write(data)
+    os.rename(temp_path, file_path)
+
+
+class ParseCache(object):
+    """
+    parsed features are pickled to <cache dir>/features/<key>.pickle, where
+    the key is a hash of the feature file's contents and everything else that
+    changes the parsed model (its path, the working dir, the language, and the
+    behave and python versions)
+
+    <cache dir>/checked-steps.json has the hash of the step files, and the keys
+    of the features that only use steps defined in them
+    """
+
+    def __init__(self, cache_dir):
+        """
+        :param cache_dir: where to keep the cache. made if it doesnt exist
+        """
+        self.cache_dir = cache_dir
+        self.features_dir = os.path.join(cache_dir, u'features')
+        self.checked_file = os.path.join(cache_dir, u'checked-steps.json')
+
+        # the key of each feature file parsed or loaded by this cache, by the
+        # filename of its feature. the key has the hash of the contents, so
+        # it's the key of the file as it was parsed
+        self.feature_keys = {}
+
+        # hash of the step files, and the keys of the features checked against
+        # them. loaded by set_steps_hash
+        self.steps_hash = None
+        self.checked = set()
+
+        self.hits = 0
+        self.misses = 0
+
+    def _feature_key(self, file_path, language):
+        digest = hashlib.sha1()
+        digest.update(repr((
+            os.path.abspath(file_path),
+            os.getcwd(),
+            language,
+            behave.__version__,
+            sys.version_info[:2]
+        )))
+        _hash_file(file_path, digest)
+        return digest.hexdigest()
+
+    def parse_features(self, feature_paths, language=None):
+        """
+        same as behave's parse_features for whole feature files, but only
+        parses the files that aren't already in the cache
+
+        :param feature_paths: paths to feature files
+        :param language: the default language of the feature files
+        :rtype: list[behave.model.Feature]
+        """
+        if not os.path.isdir(self.features_dir):
+            os.makedirs(self.features_dir)
+
+        features = []
+        for feature_path in feature_paths:
+            key = self._feature_key(feature_path, language)
+            cache_file = os.path.join(self.features_dir, key + u'.pickle')
+
+            feature = None
+            if os.path.isfile(cache_file):
+                try:
+                    with open(cache_file, u'rb') as f:
+                        feature = cPickle.load(f)
+                    self.hits += 1
+                except Exception as e:
+                    log.warning(u'could not read cached feature {}, parsing it again. {}'.format(cache_file, e))
+
+            if feature is None:
+                self.misses += 1
+                feature = parser.parse_file(os.path.abspath(feature_path), language=language)
+                _write_atomic(cache_file, cPickle.dumps(feature, cPickle.HIGHEST_PROTOCOL))
+
+            # skip files without a feature in them, like behave does
+            if feature:
+                self.feature_keys[feature.filename] = key
+                features.append(feature)
+
+        log.debug(u'parse cache: {} features loaded, {} parsed'.format(self.hits, self.misses))
+        return features
+
+    def set_steps_hash(self, steps_hash):
+        """
+        loads which features are known to only use the steps defined in some
+        step files
+
+        :param steps_hash: hash of the step files (see hash_step_files) the
+            step definitions were loaded from
+        """
+        self.steps_hash = steps_hash
+
+        self.checked = set()
+        if os.path.isfile(self.checked_file):
+            try:
+                with open(self.checked_file) as f:
+                    checked = json.load(f)
+                if checked.get(u'steps') == self.steps_hash:
+                    self.checked = set(checked.get(u'features', []))
+            except (IOError, ValueError) as e:
+                log.warning(u'could not read {}, checking all the steps again. {}'.format(self.checked_file, e))
+
+    def is_checked(self, feature):
+        """
+        :return: True if the feature is known to only use defined steps
+        """
+        return self.feature_keys.get(feature.filename, None) in self.checked
+
+    def add_checked(self, features):
+        """
+        records that the features only use defined steps
+
+        :type features: list[behave.model.Feature]
+        """
+        keys = set(self.feature_keys[feature.filename] for feature in features if feature.filename in self.feature_keys)
+        if not keys or keys <= self.checked:
+            return
+
+        # keep the features checked by other runs with the same steps, eg. runs
+        # of other feature dirs. a change to the steps starts the list again
+        checked = set(keys)
+        if os.path.isfile(self.checked_file):
+            try:
+                with open(self.checked_file) as f:
+                    previous = json.load(f)
+                if previous.get(u'steps') == self.steps_hash:
+                    checked.update(previous.get(u'features', []))
+            except (IOError, ValueError):
+                pass
+
+        self.checked = checked
+        _write_atomic(self.checked_file, json.dumps({
+            u'steps': self.steps_hash,
+            u'features': sorted(checked)
+        }))
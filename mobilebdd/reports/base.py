@@ -1,11 +1,13 @@
 from behave.reporter.base import Reporter
-from mobilebdd.behave_tools import gentrify_scenario_name
+from mobilebdd.reports.results import FeatureResult
 
 
 class BaseReporter(Reporter):
     """
     base reporter that will expand completed feature scenarios. this is done
     because behave doesnt expand scenario outlines into their own scenarios.
+    the features are kept as compact FeatureResult records rather than
+    behave's model, which holds on to a lot more.
     """
 
     def __init__(self, config):
@@ -20,23 +22,18 @@ class BaseReporter(Reporter):
         self.features = []
         '''
         :ivar: list of completed features, with expanded scenario outlines
-        :type: list[behave.model.Feature]
+        :type: list[FeatureResult]
         '''
 
     def feature(self, feature):
-        # if we have a scenario outline in a feature, we have to call 'walk'
-        # because it wont be expanded. weird, but whatever.
-        scenarios = []
-        steps = 0
-        for scenario in feature.walk_scenarios():
-            scenario.name = gentrify_scenario_name(scenario)
-            scenarios.append(scenario)
-            for step in scenario.steps:
-                step.id = steps
-                steps += 1
+        self.features.append(self.expand_feature(feature))
 
-        # change/update the scenarios field, because the one that was passed in
-        # just has the un-expanded scenarios
-        feature.scenarios = scenarios
-
-        self.features.append(feature)
+    def expand_feature(self, feature):
+        """
+        :param feature: a completed feature
+        :return: compact results of the feature, with its scenario outlines
+            expanded into scenarios and its steps numbered. nothing in them
+            refers back to the behave model, so it can be released
+        :rtype: FeatureResult
+        """
+        return FeatureResult(feature)
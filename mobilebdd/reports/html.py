@@ -1,64 +1,88 @@
+import json
+import multiprocessing
 import os
 
-from jinja2 import Environment
-from jinja2.loaders import DictLoader
-
 from mobilebdd.reports.base import BaseReporter
-
-
-Html = u"""
-<!DOCTYPE html>
+from mobilebdd.reports.images import process_screenshots
+
+
+# the report is a static page plus data files, so it opens quickly however big
+# the run was:
+#   index.html - this page
+#   data/summary.js - one line per feature, appended as the features finish
+#   data/feature-NNNNN.js - the scenarios and steps of one feature, only
+#       loaded when the feature is opened
+# the data files are scripts rather than json so the report still works when
+# it's opened straight from disk
+Html = u"""<!DOCTYPE html>
 <html>
 <head>
-    <title></title>
+    <meta charset="utf-8">
+    <title>test report</title>
     <style>
         * {
             font-family: "Lucida Console", Monaco, monospace;
             font-size: 11pt;
-            -webkit-transition: all 0.2s;
+            box-sizing: border-box;
         }
+        body { margin: 0; }
 
-        .feature, .scenario { color: black; }
         .untested { color: gray; }
         .skipped { color: gray; }
         .passed { color: green; }
         .failed { color: red; }
+        .undefined { color: orange; }
+        .time { color: gray; }
 
-        .accordion { margin-left: 2em; }
-        .accordion:hover { cursor: default; }
-
-        h3 {
-            margin-top: 0;
-            margin-bottom: 0;
-            padding-top: 0.5em;
-            padding-bottom: 0.5em;
-            font-weight: normal;
-        }
-        h3:hover { background-color: rgba(200,200,255,0.3); }
-        h3.step {
-            padding: 0;
-        }
-        h3.step .keyword {
-            /*font-weight: bold;*/
+        #toolbar {
+            height: 3em;
+            padding: 0.5em;
         }
+        #toolbar .active { font-weight: bold; }
+        #totals { margin-left: 1em; color: gray; }
 
-        div.feature {
-            line-height: 1.2;
-        }
-        div.scenario {
-            margin-bottom: 1em;
+        button {
+            font-family: sans-serif;
+            padding: 0.3em 0.5em;
         }
-        div.step {
-            padding-left: 2em;
+
+        #list {
+            position: absolute;
+            top: 3em;
+            bottom: 0;
+            left: 0;
+            width: 65%;
+            overflow-y: auto;
         }
-        div.step.message {
-            /*max-width: 1024px;*/
+        #rows { position: relative; }
+        .row {
+            position: absolute;
+            left: 0;
+            right: 0;
+            height: 22px;
+            line-height: 22px;
+            white-space: nowrap;
+            overflow: hidden;
+            text-overflow: ellipsis;
+            cursor: default;
         }
+        .row:hover, .row.selected { background-color: rgba(200,200,255,0.3); }
+        .row.feature { padding-left: 0.5em; color: black; }
+        .row.scenario { padding-left: 2.5em; color: black; }
+        .row.step, .row.loading { padding-left: 4.5em; }
+        .row.slow { padding-left: 0.5em; }
 
-        button {
-            font-family: sans-serif;
-            padding: 0.5em;
+        #detail {
+            position: fixed;
+            top: 3em;
+            right: 0;
+            bottom: 0;
+            width: 35%;
+            padding: 0 1em;
+            overflow-y: auto;
         }
+        #detail img { max-width: 100%; }
+        #detail img.thumbnail { cursor: zoom-in; }
 
         /*
         http://stackoverflow.com/a/248013/3075814
@@ -72,162 +96,524 @@ Html = u"""
             white-space: -o-pre-wrap;    /* Opera 7 */
             word-wrap: break-word;       /* Internet Explorer 5.5+ */
         }
-
-        .features {
-            width: 65%;
-        }
-
-        #screenshot {
-            width: 30%;
-            height: 100%;
-            position: fixed;
-            right: 0;
-            top: 0;
-        }
-
-        .show {
-            display: block !important;
-        }
-
-        #screenshot img {
-            width: auto;
-            height: 100%;
-            display: none;
-        }
     </style>
-    <script type="text/javascript"
-            src="http://code.jquery.com/jquery-2.1.0.min.js"></script>
+    <script type="text/javascript" src="data/summary.js"></script>
 </head>
 <body>
 
-<button id="only_errors">Only Errors</button>
-<button id="expand_all">Expand All</button>
-<button id="collapse_all">Collapse All</button>
-
-<div class="features accordion">
-    {% for feature in features %}
-    <h3 class="feature"><span class="{{feature.status}}">Feature:</span> {{ feature.name }}</h3>
-
-    <div class="feature">
-        <div class="scenarios accordion">
-            {% for scenario in feature.scenarios %}
-            <h3 class="scenario"><span class="{{scenario.status}}">Scenario:</span> {{ scenario.name }}</h3>
-
-            <div class="scenario accordion">
-                {% for step in scenario.steps %}
-                <h3 class="step {{ step.status }} {{ step.step_type }}" step_id="{{step.id}}"><span class="keyword">{{ step.keyword }}</span> {{ step.name }}</h3>
-
-                {% if step.error_message %}
-                <div class="step message {{ step.status }} {{ step.step_type }}">
-                    <pre>{{ step.error_message }}</pre>
-                </div>
-                {% endif %}
-                {% endfor %}
-            </div>
-            {% endfor %}
-        </div>
-    </div>
-    {% endfor %}
-</div>
-<div id="screenshot">
-    {% for feature in features %}
-    {% for scenario in feature.scenarios %}
-    {% for step in scenario.steps %}
-    {% if step.screenshot_path %}
-    <img id="{{step.id}}" src="{{step.screenshot_path}}"/>
-    {% endif %}
-    {% endfor %}
-    {% endfor %}
-    {% endfor %}
+<div id="toolbar">
+    <button id="all">All</button>
+    <button id="only_errors">Only Errors</button>
+    <button id="slowest">Slowest Steps</button>
+    <button id="collapse_all">Collapse All</button>
+    <span id="totals"></span>
 </div>
+<div id="list"><div id="rows"></div></div>
+<div id="detail"></div>
 
-</body>
 <script type="text/javascript">
-$(window).ready(function () {
-    var anim_time = 200;
+(function () {
+    var rowHeight = 22;
+    // rows drawn above and below the visible ones, so scrolling doesnt flash
+    var overscan = 20;
+    var slowestSteps = 200;
+
+    var features = window.reportFeatures || [];
+    // feature index -> its data file's contents, once loaded
+    var loaded = {};
+    // feature index -> callbacks waiting for its data file
+    var loading = {};
+    // 'f' and 'f/s' keys of the expanded features and scenarios
+    var expanded = {};
+    var mode = 'all';
+    var rows = [];
+    var selected = null;
+
+    var list = document.getElementById('list');
+    var container = document.getElementById('rows');
+    var detail = document.getElementById('detail');
+
+    function element(tag, className, text) {
+        var node = document.createElement(tag);
+        if (className) { node.className = className; }
+        if (text !== undefined) { node.textContent = text; }
+        return node;
+    }
 
-    function only_errors() {
-        $('h3').has('.passed').next('div').slideUp(anim_time);
-        $('h3').has(':not(.passed)').next('div').slideDown(anim_time);
+    function seconds(duration) {
+        return duration.toFixed(2) + 's';
     }
-    function expand_all() {
-        $('h3 + div').slideDown(anim_time);
+
+    function sameStep(a, b) {
+        return a && b && a.f === b.f && a.s === b.s && a.i === b.i;
     }
-    function collapse_all() {
-        $('h3 + div').slideUp(anim_time);
+
+    // the feature data files call this when they load
+    window.reportFeatureLoaded = function (script, data) {
+        var f = parseInt(script.getAttribute('data-feature'), 10);
+        loaded[f] = data;
+        // open the scenarios that need looking at
+        data.scenarios.forEach(function (scenario, s) {
+            if (scenario.status !== 'passed') { expanded[f + '/' + s] = true; }
+        });
+        var callbacks = loading[f] || [];
+        delete loading[f];
+        callbacks.forEach(function (callback) { callback(); });
+    };
+
+    function loadFeature(f, callback) {
+        if (loaded[f]) { callback(); return; }
+        if (loading[f]) { loading[f].push(callback); return; }
+        loading[f] = [callback];
+        var script = document.createElement('script');
+        script.setAttribute('data-feature', f);
+        script.src = features[f].base + features[f].file;
+        document.body.appendChild(script);
+    }
+
+    function buildRows() {
+        rows = [];
+        if (mode === 'slowest') {
+            features.forEach(function (feature, f) {
+                feature.slowest.forEach(function (slow) {
+                    rows.push({type: 'slow', f: f, s: slow[0], i: slow[1], duration: slow[2], name: slow[3], status: slow[4]});
+                });
+            });
+            rows.sort(function (a, b) { return b.duration - a.duration; });
+            rows = rows.slice(0, slowestSteps);
+        } else {
+            features.forEach(function (feature, f) {
+                if (mode === 'only_errors' && feature.status === 'passed') { return; }
+                rows.push({type: 'feature', f: f});
+                if (!expanded[f]) { return; }
+                if (!loaded[f]) {
+                    rows.push({type: 'loading', f: f});
+                    return;
+                }
+                loaded[f].scenarios.forEach(function (scenario, s) {
+                    if (mode === 'only_errors' && scenario.status === 'passed') { return; }
+                    rows.push({type: 'scenario', f: f, s: s});
+                    if (!expanded[f + '/' + s]) { return; }
+                    scenario.steps.forEach(function (step, i) {
+                        rows.push({type: 'step', f: f, s: s, i: i});
+                    });
+                });
+            });
+        }
+        container.style.height = (rows.length * rowHeight) + 'px';
+        render();
+    }
+
+    function renderRow(row) {
+        var feature = features[row.f];
+        var node;
+        if (row.type === 'feature') {
+            node = element('div', 'row feature');
+            node.appendChild(element('span', feature.status, 'Feature: '));
+            node.appendChild(document.createTextNode(feature.name + ' '));
+            node.appendChild(element('span', 'time', feature.scenarios + ' scenarios, ' + feature.failed + ' failed steps, ' + seconds(feature.duration)));
+        } else if (row.type === 'loading') {
+            node = element('div', 'row loading untested', 'loading...');
+        } else if (row.type === 'scenario') {
+            var scenario = loaded[row.f].scenarios[row.s];
+            node = element('div', 'row scenario');
+            node.appendChild(element('span', scenario.status, 'Scenario: '));
+            node.appendChild(document.createTextNode(scenario.name));
+        } else if (row.type === 'step') {
+            var step = loaded[row.f].scenarios[row.s].steps[row.i];
+            node = element('div', 'row step ' + step.status, step.keyword + ' ' + step.name + ' ');
+            node.appendChild(element('span', 'time', seconds(step.duration)));
+        } else {
+            node = element('div', 'row slow ' + row.status);
+            node.appendChild(element('span', 'time', seconds(row.duration) + ' '));
+            node.appendChild(document.createTextNode(feature.name + ' > ' + row.name));
+        }
+        return node;
     }
 
-    $('#only_errors').click(only_errors);
-    $('#expand_all').click(expand_all);
-    $('#collapse_all').click(collapse_all);
+    // only the rows on screen are in the page, so a huge report scrolls as
+    // quickly as a small one
+    function render() {
+        var first = Math.max(0, Math.floor(list.scrollTop / rowHeight) - overscan);
+        var last = Math.min(rows.length, Math.ceil((list.scrollTop + list.clientHeight) / rowHeight) + overscan);
+        var fragment = document.createDocumentFragment();
+        for (var r = first; r < last; r++) {
+            var node = renderRow(rows[r]);
+            node.style.top = (r * rowHeight) + 'px';
+            node.setAttribute('data-row', r);
+            if (rows[r].type === 'step' && sameStep(rows[r], selected)) {
+                node.className += ' selected';
+            }
+            fragment.appendChild(node);
+        }
+        container.innerHTML = '';
+        container.appendChild(fragment);
+    }
 
-    $('.accordion h3').click(function() {
-        $(this).find('+ div').toggle(anim_time);
-        return false;
+    var renderQueued = false;
+    list.addEventListener('scroll', function () {
+        if (renderQueued) { return; }
+        renderQueued = true;
+        window.requestAnimationFrame(function () {
+            renderQueued = false;
+            render();
+        });
     });
+    window.addEventListener('resize', render);
+
+    // a screenshot is only loaded when its step is looked at, and the full
+    // size one only when its thumbnail is clicked
+    function showStep(row) {
+        var base = features[row.f].base;
+        var data = loaded[row.f];
+        var step = data.scenarios[row.s].steps[row.i];
+        detail.innerHTML = '';
+        detail.appendChild(element('h3', step.status, step.keyword + ' ' + step.name));
+        detail.appendChild(element('div', 'time', step.status + ', ' + seconds(step.duration)));
+        if (step.error) {
+            detail.appendChild(element('pre', step.status, step.error));
+        }
+        if (step.screenshot === null) {
+            detail.appendChild(element('p', 'untested', 'no screenshot for this step'));
+            return;
+        }
+        var screenshot = data.screenshots[step.screenshot];
+        var image = element('img');
+        if (screenshot[0]) {
+            image.className = 'thumbnail';
+            image.title = 'click for the full screenshot';
+            image.addEventListener('click', function () {
+                image.src = base + screenshot[1];
+                image.className = '';
+            });
+            image.src = base + screenshot[0];
+        } else {
+            image.src = base + screenshot[1];
+        }
+        detail.appendChild(image);
+    }
 
-    $('h3.step').hover(function() {
-        $('#' + $(this).attr('step_id')).addClass('show');
-    }, function() {
-        $('#' + $(this).attr('step_id')).removeClass('show');
+    function rowAt(event) {
+        var node = event.target;
+        while (node && node !== container && !node.hasAttribute('data-row')) { node = node.parentNode; }
+        if (!node || node === container) { return null; }
+        return rows[parseInt(node.getAttribute('data-row'), 10)];
+    }
+
+    // hovering a step shows it, clicking one keeps it up after the mouse
+    // leaves, so its screenshot can be clicked on
+    container.addEventListener('mouseover', function (event) {
+        var row = rowAt(event);
+        if (row && row.type === 'step') { showStep(row); }
+    });
+    container.addEventListener('mouseleave', function () {
+        if (selected) {
+            showStep(selected);
+        } else {
+            detail.innerHTML = '';
+        }
     });
 
-    only_errors();
-});
+    function select(row) {
+        selected = row;
+        showStep(row);
+        render();
+    }
+
+    container.addEventListener('click', function (event) {
+        var row = rowAt(event);
+        if (!row) { return; }
+        if (row.type === 'feature') {
+            expanded[row.f] = !expanded[row.f];
+            if (expanded[row.f]) { loadFeature(row.f, buildRows); }
+            buildRows();
+        } else if (row.type === 'scenario') {
+            expanded[row.f + '/' + row.s] = !expanded[row.f + '/' + row.s];
+            buildRows();
+        } else if (row.type === 'step') {
+            select(row);
+        } else if (row.type === 'slow') {
+            // jump to the step in its feature
+            loadFeature(row.f, function () {
+                expanded[row.f] = true;
+                expanded[row.f + '/' + row.s] = true;
+                setMode('all');
+                for (var r = 0; r < rows.length; r++) {
+                    if (rows[r].type === 'step' && sameStep(rows[r], row)) {
+                        list.scrollTop = Math.max(0, (r - 5) * rowHeight);
+                        select(rows[r]);
+                        break;
+                    }
+                }
+            });
+        }
+    });
+
+    function setMode(newMode) {
+        mode = newMode;
+        ['all', 'only_errors', 'slowest'].forEach(function (name) {
+            document.getElementById(name).className = name === mode ? 'active' : '';
+        });
+        buildRows();
+    }
+
+    ['all', 'only_errors', 'slowest'].forEach(function (name) {
+        document.getElementById(name).addEventListener('click', function () { setMode(name); });
+    });
+    document.getElementById('collapse_all').addEventListener('click', function () {
+        expanded = {};
+        buildRows();
+    });
+
+    var failedFeatures = features.filter(function (feature) { return feature.status !== 'passed'; }).length;
+    var steps = features.reduce(function (total, feature) { return total + feature.steps; }, 0);
+    document.getElementById('totals').textContent = features.length + ' features, ' + failedFeatures + ' failed, ' + steps + ' steps';
+
+    setMode(failedFeatures ? 'only_errors' : 'all');
+})();
 </script>
+</body>
 </html>
 """
 
+# the summary is this line, then one line per feature. merging reports relies
+# on this layout
+SummaryHeader = u'window.reportFeatures = window.reportFeatures || [];\n'
+SummaryLinePrefix = u'window.reportFeatures.push('
+SummaryLineSuffix = u');\n'
+
+# how many of each feature's slowest steps go in the summary, for the slowest
+# steps view
+SlowestStepsPerFeature = 10
+
+
+def relative_screenshot_path(screenshot_path, report_dir):
+    """
+    the file paths to screenshots are absolute. make them relative to the
+    report dir, for portable output
+
+    :param screenshot_path: absolute path to a screenshot (or thumbnail)
+    :param report_dir: the dir the index.html file is in
+    :rtype: unicode
+    """
+    return os.path.relpath(screenshot_path, report_dir).replace(os.sep, u'/')
+
+
+def summary_line(summary):
+    """
+    :param summary: json-able dict summarising a feature
+    :return: the feature's line in data/summary.js
+    :rtype: unicode
+    """
+    return SummaryLinePrefix + json.dumps(summary) + SummaryLineSuffix
+
 
 class HtmlReporter(BaseReporter):
     """
     outputs a nice html report of the test run
+
+    each feature is added to the report's data as soon as it finishes, and
+    isn't kept around after that, so the report is there even if the run dies
+    part way, and memory doesn't grow with the number of features
     """
 
-    def __init__(self, config, report_base_dir):
+    def __init__(self, config, report_base_dir, image_settings=None):
         """
         overload the base init, we dont need the config, so ignore it
 
         :type config: Configuration
         :param report_base_dir: the base dir where reports will be stored. used
             to find any screenshots to include
+        :param image_settings: how to make thumbnails of the screenshots. if
+            None, the full screenshots are put in the report
+        :type image_settings: ImageSettings
         """
         super(HtmlReporter, self).__init__(config)
 
         self.report_dir = report_base_dir
 
-    def end(self):
+        self.image_settings = image_settings
+
+        # whether the page and summary have been written yet
+        self.started = False
+
+        # number of features in the report so far, to name their data files
+        self.feature_count = 0
+
+        # the process pool that makes the thumbnails, shared by all the
+        # features. it's forked now, before the run starts any threads (eg.
+        # the screenshot writers), because forking while other threads hold
+        # locks can leave the workers deadlocked
+        self.pool = None
+        if self.image_settings and self.image_settings.processes != 1:
+            self.pool = multiprocessing.Pool(self.image_settings.processes)
+
+    @property
+    def report_file(self):
+        return os.path.join(
+            self.report_dir,
+            u'index.html'
+        )
+
+    @property
+    def data_dir(self):
+        return os.path.join(self.report_dir, u'data')
+
+    @property
+    def summary_file(self):
+        return os.path.join(self.data_dir, u'summary.js')
+
+    def _start_report(self):
         """
-        all testing is complete, wrap things up
+        writes the page and an empty summary
         """
-        jinja_env = Environment(loader=DictLoader({u'html_report': Html}))
-        template = jinja_env.get_template(u'html_report')
-
-        # the file paths in the step_screenshot variables are absolute
-        # make them relative for the index.html file for portable output
-        features = self.features
-        for feature in features:
-            for scenario in feature.scenarios:
-                for step in scenario.steps:
-                    if hasattr(step, 'screenshot_path') and step.screenshot_path:
-                        # make the report_dir the basis for the relative path
-                        step.screenshot_path = os.path.relpath(
-                            step.screenshot_path,
-                            self.report_dir
-                        )
-
-        html = template.render(features=features)
-
         # make the report dir if it doesnt exist
         try:
-            os.makedirs(self.report_dir)
+            os.makedirs(self.data_dir)
         except OSError:
-            if not os.path.isdir(self.report_dir):
+            if not os.path.isdir(self.data_dir):
                 raise
 
-        report_file = os.path.join(
-            self.report_dir,
-            u'index.html'
-        )
-        with open(report_file, u'w') as f:
-            f.write(html.encode(u'utf8'))
+        with open(self.report_file, u'wb') as f:
+            f.write(Html.encode(u'utf8'))
+        with open(self.summary_file, u'wb') as f:
+            f.write(SummaryHeader.encode(u'utf8'))
+        self.started = True
+
+    def _screenshots(self, feature):
+        """
+        steps with identical screenshots share a file, and each file (or crop
+        of it) is only put in the feature once. sets each step's screenshot_id
+        to the index of its screenshot, or None if it doesnt have one
+
+        :type feature: FeatureResult
+        :return: [thumbnail or None, full image] for each of the feature's
+            screenshots, relative to the report dir
+        :rtype: list
+        """
+        screenshots = []
+        screenshot_ids = {}
+        for scenario in feature.scenarios:
+            for step in scenario.steps:
+                step.screenshot_id = None
+                if not step.screenshot_path:
+                    continue
+
+                # the capture policy may have skipped it, or writing it
+                # failed. either way dont link to an image that isnt there
+                if not os.path.isfile(step.screenshot_path):
+                    step.screenshot_path = None
+                    continue
+
+                crop = None
+                if self.image_settings and self.image_settings.crop_to_element:
+                    crop = step.screenshot_rect
+
+                key = (step.screenshot_path, crop)
+                if key not in screenshot_ids:
+                    screenshot_ids[key] = len(screenshots)
+                    screenshots.append(key)
+                step.screenshot_id = screenshot_ids[key]
+
+        if self.image_settings and screenshots:
+            images = process_screenshots(
+                screenshots,
+                os.path.join(self.report_dir, u'thumbnails'),
+                self.image_settings,
+                pool=self.pool
+            )
+        else:
+            images = [(None, path) for path, _ in screenshots]
+
+        return [
+            [
+                relative_screenshot_path(thumbnail, self.report_dir) if thumbnail else None,
+                relative_screenshot_path(full, self.report_dir)
+            ]
+            for thumbnail, full in images
+        ]
+
+    def feature(self, feature):
+        """
+        adds a completed feature to the report
+        """
+        if not self.started:
+            self._start_report()
+
+        feature = self.expand_feature(feature)
+        self.feature_count += 1
+        data_file = u'data/feature-{:05d}.js'.format(self.feature_count)
+
+        screenshots = self._screenshots(feature)
+        data = {
+            u'name': feature.name,
+            u'status': feature.status,
+            u'tags': list(feature.tags),
+            u'filename': feature.filename,
+            u'screenshots': screenshots,
+            u'scenarios': [
+                {
+                    u'name': scenario.name,
+                    u'status': scenario.status,
+                    u'steps': [
+                        {
+                            u'keyword': step.keyword,
+                            u'name': step.name,
+                            u'status': step.status,
+                            u'duration': round(step.duration, 3),
+                            u'error': step.error_message,
+                            u'screenshot': step.screenshot_id
+                        }
+                        for step in scenario.steps
+                    ]
+                }
+                for scenario in feature.scenarios
+            ]
+        }
+        with open(os.path.join(self.report_dir, data_file), u'wb') as f:
+            f.write(u'window.reportFeatureLoaded(document.currentScript, {});\n'.format(json.dumps(data)).encode(u'utf8'))
+
+        # [scenario index, step index, duration, name, status]
+        steps = [
+            [s, i, round(step.duration, 3), u'{} > {} {}'.format(scenario.name, step.keyword, step.name), step.status]
+            for s, scenario in enumerate(feature.scenarios)
+            for i, step in enumerate(scenario.steps)
+        ]
+        summary = {
+            u'name': feature.name,
+            u'status': feature.status,
+            u'file': data_file,
+            # where the report the feature is in is, relative to the page.
+            # only set when reports are merged
+            u'base': u'',
+            u'scenarios': len(feature.scenarios),
+            u'steps': len(steps),
+            u'failed': sum(1 for step in steps if step[4] == u'failed'),
+            u'duration': round(sum(step[2] for step in steps), 3),
+            u'slowest': sorted(steps, key=lambda step: step[2], reverse=True)[:SlowestStepsPerFeature]
+        }
+        with open(self.summary_file, u'ab') as f:
+            f.write(summary_line(summary).encode(u'utf8'))
+
+    def close(self):
+        """
+        lets go of the thumbnail pool without waiting on it, for when the run
+        stopped before it got to the end
+        """
+        if self.pool:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+    def end(self):
+        """
+        all testing is complete, wrap things up
+        """
+        if self.pool:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+        # there's always a report, even if nothing ran
+        if not self.started:
+            self._start_report()
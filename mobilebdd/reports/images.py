@@ -0,0 +1,210 @@
+"""
+post processing for the screenshots in the reports. shrinks them into
+thumbnails and recompresses the full images in a pool of processes, so big
+reports stay usable in a browser. needs PIL, without it the screenshots are
+used as they are
+"""
+import hashlib
+import logging
+import multiprocessing
+import os
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+log = logging.getLogger(u'mobilebdd')
+
+
+# file extensions for the formats PIL can save screenshots in
+FormatExtensions = {
+    u'png': u'.png',
+    u'jpeg': u'.jpg',
+    u'webp': u'.webp'
+}
+
+
+def _save(image, file_path, image_format, quality):
+    """
+    :param image: PIL image to save
+    :param image_format: png, jpeg or webp
+    :param quality: 1-100, for the lossy formats
+    """
+    if image_format == u'png':
+        image.save(file_path, u'PNG', optimize=True)
+        return
+
+    # the lossy formats don't do transparency or palettes
+    if image.mode not in (u'RGB', u'L'):
+        image = image.convert(u'RGB')
+    image.save(file_path, image_format.upper(), quality=quality)
+
+
+def process_screenshot(job):
+    """
+    makes the thumbnail for a screenshot, and transcodes it. this runs in the
+    worker processes, so it takes and returns plain tuples
+
+    :param job: (source path, thumbnail path, full image path or None to leave
+        the source alone, ImageSettings fields as a tuple, crop rect as
+        (left, top, right, bottom) or None)
+    :return: (thumbnail path or None, full image path)
+    :rtype: tuple
+    """
+    source, thumbnail_path, full_path, settings, crop = job
+    thumbnail_size, image_format, quality = settings
+
+    try:
+        image = Image.open(source)
+        image.load()
+
+        thumbnail = image
+        if crop:
+            # keep the crop on the screen, element rects can hang off of it
+            left, top, right, bottom = crop
+            crop = (
+                max(0, left),
+                max(0, top),
+                min(image.size[0], right),
+                min(image.size[1], bottom)
+            )
+            if crop[0] < crop[2] and crop[1] < crop[3]:
+                thumbnail = image.crop(crop)
+
+        thumbnail = thumbnail.copy()
+        thumbnail.thumbnail((thumbnail_size, thumbnail_size), Image.ANTIALIAS)
+        _save(thumbnail, thumbnail_path, image_format, quality)
+
+        if full_path and not os.path.exists(full_path):
+            _save(image, full_path, image_format, quality)
+        return thumbnail_path, full_path or source
+    except Exception as e:
+        log.warning(u'problem processing screenshot {}! {}'.format(source, e))
+        return None, source
+
+
+class ImageSettings(object):
+    """
+    how to process the report screenshots, from the report_images key of the
+    test config:
+
+    "report_images": {
+        "thumbnail_size": 320,
+        "format": "jpeg",
+        "quality": 70,
+        "transcode": true,
+        "crop_to_element": false,
+        "processes": 4
+    }
+    """
+
+    def __init__(self, thumbnail_size=320, image_format=u'jpeg', quality=70, transcode=True, crop_to_element=False, processes=None):
+        """
+        :param thumbnail_size: max width and height of the thumbnails
+        :param image_format: png (lossless), jpeg or webp (lossy), for the
+            thumbnails and the transcoded full images
+        :param quality: 1-100, for the lossy formats
+        :param transcode: whether to recompress the full images too
+        :param crop_to_element: whether to crop the thumbnails to the element
+            the step last found
+        :param processes: size of the process pool, defaults to the number of
+            cpus
+        """
+        if image_format not in FormatExtensions:
+            raise ValueError(u'unknown report image format "{}", use one of {}'.format(image_format, sorted(FormatExtensions)))
+
+        self.thumbnail_size = int(thumbnail_size)
+        self.image_format = image_format
+        self.quality = int(quality)
+        self.transcode = transcode
+        self.crop_to_element = crop_to_element
+        self.processes = processes
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        :param config: the test config
+        :return: the settings, or None if the report images shouldn't be
+            processed
+        :rtype: ImageSettings
+        """
+        settings = (config or {}).get(u'report_images', None)
+        if not settings:
+            return None
+
+        return cls(
+            thumbnail_size=settings.get(u'thumbnail_size', 320),
+            image_format=settings.get(u'format', u'jpeg'),
+            quality=settings.get(u'quality', 70),
+            transcode=settings.get(u'transcode', True),
+            crop_to_element=settings.get(u'crop_to_element', False),
+            processes=settings.get(u'processes', None)
+        )
+
+
+def process_screenshots(screenshots, thumbnail_dir, settings, pool=None):
+    """
+    makes thumbnails of the screenshots, and transcodes the full images if
+    wanted. transcoded images are written next to their pngs, which are kept
+    for everything else that links to them (eg. the json lines report, and
+    other steps sharing the screenshot)
+
+    :param screenshots: list of (screenshot path, crop rect or None). the same
+        screenshot can be in there with different crops
+    :param thumbnail_dir: where to put the thumbnails
+    :type settings: ImageSettings
+    :param pool: the process pool to use. if None, one is made just for these
+        screenshots
+    :type pool: multiprocessing.Pool
+    :return: list of (thumbnail path or None, full image path), in the same
+        order as the screenshots
+    :rtype: list[tuple]
+    """
+    if Image is None:
+        log.warning(u'PIL is not installed, using the screenshots in the report as they are')
+        return [(None, path) for path, _ in screenshots]
+
+    if not os.path.isdir(thumbnail_dir):
+        os.makedirs(thumbnail_dir)
+
+    extension = FormatExtensions[settings.image_format]
+    packed_settings = (settings.thumbnail_size, settings.image_format, settings.quality)
+
+    jobs = []
+    transcoding = set()
+    for path, crop in screenshots:
+        name = os.path.splitext(os.path.basename(path))[0]
+        # the same screenshot can be shared by steps that found different
+        # elements, so the crop is part of the thumbnail's name
+        key = hashlib.sha1(u'{}|{}'.format(path, crop).encode(u'utf8')).hexdigest()[:8]
+        thumbnail_path = os.path.join(thumbnail_dir, u'{}-{}{}'.format(name, key, extension))
+
+        # only transcode each screenshot once
+        full_path = None
+        if settings.transcode and not path.endswith(extension) and path not in transcoding:
+            transcoding.add(path)
+            full_path = os.path.splitext(path)[0] + extension
+
+        jobs.append((path, thumbnail_path, full_path, packed_settings, crop))
+
+    if settings.processes == 1 or len(jobs) < 2:
+        results = [process_screenshot(job) for job in jobs]
+    elif pool:
+        results = pool.map(process_screenshot, jobs)
+    else:
+        pool = multiprocessing.Pool(settings.processes)
+        try:
+            results = pool.map(process_screenshot, jobs)
+        finally:
+            pool.close()
+            pool.join()
+
+    # point every job for a transcoded screenshot at the new file
+    transcoded = dict(
+        (job[0], result[1])
+        for job, result in zip(jobs, results)
+        if job[2] and result[1] == job[2]
+    )
+    return [(thumbnail, transcoded.get(job[0], full)) for job, (thumbnail, full) in zip(jobs, results)]
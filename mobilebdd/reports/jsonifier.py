@@ -1,6 +1,89 @@
+import collections
 import json
+import os
+import time
 
+from mobilebdd.listener import Listener
 from mobilebdd.reports.base import BaseReporter
+from mobilebdd.reports.html import relative_screenshot_path
+
+
+def _duration(start, end):
+    if start is None or end is None:
+        return None
+    return round(end - start, 3)
+
+
+def step_record(step, report_dir=None):
+    """
+    :type step: behave.model.Step
+    :param report_dir: if given, the screenshot path is made relative to it
+    :return: json-able dict of the step's results
+    :rtype: dict
+    """
+    start = getattr(step, u'start_time_epoch_sec', None)
+    end = getattr(step, u'end_time_epoch_sec', None)
+
+    screenshot = getattr(step, u'screenshot_path', None)
+    if screenshot and report_dir:
+        screenshot = relative_screenshot_path(screenshot, report_dir)
+
+    return {
+        u'type': u'step',
+        u'keyword': step.keyword,
+        u'name': step.name,
+        u'status': step.status,
+        u'start': start,
+        u'end': end,
+        u'duration': _duration(start, end),
+        u'screenshot': screenshot,
+        u'error': step.error_message
+    }
+
+
+def scenario_record(scenario, start=None, end=None):
+    """
+    :type scenario: behave.model.Scenario
+    :param start: when the scenario started. defaults to when its first step
+        started
+    :param end: when the scenario ended. defaults to when its last step ended
+    :return: json-able dict of the scenario's results, without its steps
+    :rtype: dict
+    """
+    if start is None and scenario.steps:
+        start = getattr(scenario.steps[0], u'start_time_epoch_sec', None)
+    if end is None and scenario.steps:
+        end = getattr(scenario.steps[-1], u'end_time_epoch_sec', None)
+
+    return {
+        u'type': u'scenario',
+        u'name': scenario.name,
+        u'status': scenario.status,
+        u'tags': list(scenario.tags),
+        u'start': start,
+        u'end': end,
+        u'duration': _duration(start, end)
+    }
+
+
+def feature_record(feature, start=None, end=None):
+    """
+    :type feature: behave.model.Feature
+    :param start: when the feature started
+    :param end: when the feature ended
+    :return: json-able dict of the feature's results, without its scenarios
+    :rtype: dict
+    """
+    return {
+        u'type': u'feature',
+        u'name': feature.name,
+        u'status': feature.status,
+        u'tags': list(feature.tags),
+        u'file': feature.filename,
+        u'start': start,
+        u'end': end,
+        u'duration': _duration(start, end)
+    }
 
 
 class JsonReporter(BaseReporter):
@@ -19,4 +102,103 @@ class JsonReporter(BaseReporter):
         :return: json payload of the test results
         :rtype: str
         """
-        return json.dumps({u'features': self.features})
+        features = []
+        for feature in self.features:
+            scenarios = []
+            for scenario in feature.scenarios:
+                record = scenario_record(scenario)
+                record[u'steps'] = [step_record(step) for step in scenario.steps]
+                scenarios.append(record)
+
+            record = feature_record(feature)
+            record[u'scenarios'] = scenarios
+            features.append(record)
+
+        return json.dumps({u'features': features})
+
+
+class JsonLinesReporter(Listener):
+    """
+    writes one compact json record per line for every step, scenario and
+    feature as it finishes, so the results can be tailed while the tests run
+
+    screenshots are written in the background, so a step's record (and the
+    records after it, to keep them in order) waits until its screenshot has
+    been dealt with. nothing else is kept, so memory doesn't grow with the run
+    """
+
+    def __init__(self, file_path):
+        """
+        :param file_path: where to write the records. screenshot paths are
+            made relative to its dir
+        """
+        super(JsonLinesReporter, self).__init__()
+
+        self.file_path = os.path.abspath(file_path)
+        self.report_dir = os.path.dirname(self.file_path)
+        self.file = None
+
+        # records waiting to be written, in order. steps are kept as the step
+        # until their screenshot is ready
+        self.pending = collections.deque()
+
+        self.feature = None
+        self.feature_start = None
+        self.scenario = None
+        self.scenario_start = None
+
+    def _queue(self, record):
+        self.pending.append(record)
+        self._write_ready()
+
+    def _write_ready(self, force=False):
+        """
+        writes the pending records, up to the first step whose screenshot
+        isn't ready
+
+        :param force: write everything, ready or not
+        """
+        while self.pending:
+            record = self.pending[0]
+            if isinstance(record, tuple):
+                step, feature, scenario = record
+                if getattr(step, u'screenshot_pending', False) and not force:
+                    return
+                record = step_record(step, self.report_dir)
+                record[u'feature'] = feature
+                record[u'scenario'] = scenario
+
+            self.pending.popleft()
+            self.file.write(json.dumps(record, separators=(u',', u':')))
+            self.file.write(u'\n')
+            self.file.flush()
+
+    def before_all(self, context):
+        if not os.path.isdir(self.report_dir):
+            os.makedirs(self.report_dir)
+        self.file = open(self.file_path, u'w')
+
+    def before_feature(self, feature):
+        self.feature = feature.name
+        self.feature_start = time.time()
+
+    def before_scenario(self, scenario):
+        self.scenario = scenario.name
+        self.scenario_start = time.time()
+
+    def after_step(self, step):
+        self._queue((step, self.feature, self.scenario))
+
+    def after_scenario(self, scenario):
+        record = scenario_record(scenario, start=self.scenario_start, end=time.time())
+        record[u'feature'] = self.feature
+        self._queue(record)
+
+    def after_feature(self, feature):
+        self._queue(feature_record(feature, start=self.feature_start, end=time.time()))
+
+    def after_all(self, context):
+        # the screenshots are all written by now
+        self._write_ready(force=True)
+        self.file.close()
+        self.file = None
@@ -0,0 +1,129 @@
+"""
+merges the outputs of several runs (eg. a suite split across processes or
+machines) into one html report and one set of junit files
+
+    python -m mobilebdd.reports.merge -o merged_dir run_dir_1 run_dir_2 ...
+
+the inputs are streamed a line at a time, so merging doesn't need memory for
+the whole report. the features' data files and screenshots aren't copied, the
+report links to them where they are
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import shutil
+
+from mobilebdd.reports.html import Html, SummaryHeader, SummaryLinePrefix, SummaryLineSuffix, relative_screenshot_path, summary_line
+
+
+log = logging.getLogger(u'mobilebdd')
+
+
+def _merge_html(run_dirs, output_dir):
+    """
+    writes a report whose summary lists the features of all the runs. the
+    features' data files and screenshots aren't copied, each feature's base
+    points the page at the run it came from
+
+    :return: the path to the merged report
+    """
+    data_dir = os.path.join(output_dir, u'data')
+    try:
+        os.makedirs(data_dir)
+    except OSError:
+        if not os.path.isdir(data_dir):
+            raise
+
+    report_file = os.path.join(output_dir, u'index.html')
+    with open(report_file, u'wb') as out:
+        out.write(Html.encode(u'utf8'))
+
+    with open(os.path.join(data_dir, u'summary.js'), u'wb') as out:
+        out.write(SummaryHeader.encode(u'utf8'))
+
+        for run_dir in run_dirs:
+            run_summary = os.path.join(run_dir, u'data', u'summary.js')
+            if not os.path.isfile(run_summary):
+                log.warning(u'no html report in {}, skipping it'.format(run_dir))
+                continue
+
+            with open(run_summary, u'rb') as summary:
+                for line in summary:
+                    line = line.decode(u'utf8')
+                    if not line.startswith(SummaryLinePrefix) or not line.endswith(SummaryLineSuffix):
+                        continue
+
+                    feature = json.loads(line[len(SummaryLinePrefix):-len(SummaryLineSuffix)])
+                    # the run may itself be a merge of other runs
+                    base = os.path.normpath(os.path.join(os.path.abspath(run_dir), feature[u'base']))
+                    feature[u'base'] = relative_screenshot_path(base, output_dir) + u'/'
+                    out.write(summary_line(feature).encode(u'utf8'))
+
+    return report_file
+
+
+def _merge_junit(run_dirs, output_dir):
+    """
+    copies the junit files of all the runs into the output dir. files with the
+    same name get the run number added
+
+    :return: the paths to the merged junit files
+    :rtype: list
+    """
+    merged = []
+    for run_number, run_dir in enumerate(run_dirs):
+        for junit_file in sorted(glob.glob(os.path.join(run_dir, u'*.xml'))):
+            name = os.path.basename(junit_file)
+            target = os.path.join(output_dir, name)
+            if os.path.exists(target):
+                base, extension = os.path.splitext(name)
+                target = os.path.join(output_dir, u'{}-run{}{}'.format(base, run_number, extension))
+
+            with open(junit_file, u'rb') as source, open(target, u'wb') as out:
+                shutil.copyfileobj(source, out)
+            merged.append(target)
+
+    return merged
+
+
+def merge_runs(run_dirs, output_dir):
+    """
+    merges the test artifact dirs of several runs into one
+
+    :param run_dirs: the test_artifact_dirs of the runs to merge
+    :type run_dirs: list
+    :param output_dir: where to put the merged index.html and junit files. it
+        shouldn't be one of the run dirs
+    :return: the path to the merged html report
+    :rtype: unicode
+    """
+    output_dir = os.path.abspath(output_dir)
+    if output_dir in [os.path.abspath(run_dir) for run_dir in run_dirs]:
+        raise ValueError(u'the merge output dir {} cant be one of the runs being merged'.format(output_dir))
+
+    try:
+        os.makedirs(output_dir)
+    except OSError:
+        if not os.path.isdir(output_dir):
+            raise
+
+    junit_files = _merge_junit(run_dirs, output_dir)
+    report_file = _merge_html(run_dirs, output_dir)
+    log.debug(u'merged {} runs into {} ({} junit files)'.format(len(run_dirs), report_file, len(junit_files)))
+
+    return report_file
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=u'merges the test artifact dirs of several runs into one report')
+    parser.add_argument(u'run_dirs', nargs=u'+', help=u'test artifact dirs of the runs to merge')
+    parser.add_argument(u'-o', u'--output-dir', required=True, help=u'where to put the merged report')
+    args = parser.parse_args(args)
+
+    print(merge_runs(args.run_dirs, args.output_dir))
+
+
+if __name__ == u'__main__':
+    main()
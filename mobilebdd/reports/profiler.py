@@ -0,0 +1,183 @@
+"""
+profiles where the time goes in a test run, per step definition
+"""
+import collections
+import io
+import math
+import os
+
+from behave import step_registry
+
+from mobilebdd.listener import Listener
+
+
+def percentile(sorted_values, percent):
+    """
+    :param sorted_values: the values, sorted
+    :param percent: 0-100
+    :return: the nearest rank percentile of the values
+    """
+    if not sorted_values:
+        return 0.0
+    rank = int(math.ceil(percent / 100.0 * len(sorted_values))) - 1
+    return sorted_values[max(0, min(rank, len(sorted_values) - 1))]
+
+
+class DefinitionProfile(object):
+    """
+    the timings of every run of one step definition
+    """
+
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.durations = []
+        self.command_sec = 0.0
+        self.screenshot_sec = 0.0
+        self.sleep_sec = 0.0
+
+    @property
+    def total_sec(self):
+        return sum(self.durations)
+
+    @property
+    def other_sec(self):
+        return max(0.0, self.total_sec - self.command_sec - self.screenshot_sec - self.sleep_sec)
+
+
+class StepProfiler(Listener):
+    """
+    groups the step timings by the step definition they ran (the registered
+    step string, not the step text), and at the end of the run writes:
+
+    step-profile.txt - count, total, p50, p95 and p99 per definition, with the
+        total split into webdriver commands, screenshots, sleeping and the rest
+    step-profile.folded - feature;scenario;step;bucket stacks in milliseconds,
+        for flamegraph.pl and friends
+    """
+
+    # the parts of a step's time, as (name in the folded stacks, attribute of
+    # the DefinitionProfile)
+    Buckets = (
+        (u'webdriver commands', u'command_sec'),
+        (u'screenshot', u'screenshot_sec'),
+        (u'sleep', u'sleep_sec')
+    )
+
+    def __init__(self, output_dir):
+        """
+        :param output_dir: where to write the profile files
+        """
+        super(StepProfiler, self).__init__()
+
+        self.output_dir = output_dir
+
+        # pattern -> DefinitionProfile
+        self.definitions = {}
+        # (step type, step text) -> pattern, so each step text is only matched
+        # against the registry once
+        self.patterns = {}
+        # folded stack -> milliseconds
+        self.stacks = collections.Counter()
+
+        self.feature = None
+        self.scenario = None
+
+    def _pattern(self, step):
+        key = (step.step_type, step.name)
+        pattern = self.patterns.get(key, None)
+        if pattern is None:
+            definition = step_registry.registry.find_step_definition(step)
+            if definition:
+                # eg. @step('I wait {wait_time} seconds'), the same for every
+                # keyword the definition is used with
+                pattern = definition.describe()
+            else:
+                pattern = u'undefined {}'.format(step.name)
+            self.patterns[key] = pattern
+        return pattern
+
+    @staticmethod
+    def _frame(name):
+        # the folded format splits frames on ; and the count off on the last
+        # space
+        return name.replace(u';', u',').replace(u'\n', u' ')
+
+    def before_feature(self, feature):
+        self.feature = feature.name
+
+    def before_scenario(self, scenario):
+        self.scenario = scenario.name
+
+    def after_step(self, step):
+        start = getattr(step, u'start_time_epoch_sec', None)
+        end = getattr(step, u'end_time_epoch_sec', None)
+        if start is None or end is None:
+            return
+
+        timings = dict(
+            command_sec=getattr(step, u'command_sec', 0.0),
+            screenshot_sec=getattr(step, u'screenshot_sec', 0.0),
+            sleep_sec=getattr(step, u'sleep_sec', 0.0)
+        )
+        # the screenshot is taken after the step's end time is recorded
+        duration = end - start + timings[u'screenshot_sec']
+
+        pattern = self._pattern(step)
+        profile = self.definitions.get(pattern, None)
+        if profile is None:
+            profile = self.definitions[pattern] = DefinitionProfile(pattern)
+
+        profile.durations.append(duration)
+        for name, attribute in StepProfiler.Buckets:
+            setattr(profile, attribute, getattr(profile, attribute) + timings[attribute])
+
+        stack = u';'.join(self._frame(frame) for frame in (self.feature, self.scenario, step.keyword + u' ' + step.name))
+        accounted = 0.0
+        for name, attribute in StepProfiler.Buckets:
+            self.stacks[stack + u';' + name] += int(round(timings[attribute] * 1000))
+            accounted += timings[attribute]
+        self.stacks[stack + u';other'] += int(round(max(0.0, duration - accounted) * 1000))
+
+    def after_all(self, context):
+        try:
+            os.makedirs(self.output_dir)
+        except OSError:
+            if not os.path.isdir(self.output_dir):
+                raise
+
+        self.write_table(os.path.join(self.output_dir, u'step-profile.txt'))
+        self.write_folded(os.path.join(self.output_dir, u'step-profile.folded'))
+
+    def write_table(self, file_path):
+        """
+        writes the per definition timings, slowest total first
+        """
+        header = (u'count', u'total', u'p50', u'p95', u'p99', u'commands', u'screenshots', u'sleep', u'other')
+        row = u'{:>7} {:>10} {:>8} {:>8} {:>8} {:>10} {:>11} {:>8} {:>8}  {}\n'
+
+        with io.open(file_path, u'w', encoding=u'utf8') as f:
+            f.write(row.format(*(header + (u'step definition',))))
+            profiles = sorted(self.definitions.values(), key=lambda profile: profile.total_sec, reverse=True)
+            for profile in profiles:
+                durations = sorted(profile.durations)
+                f.write(row.format(
+                    len(durations),
+                    u'{:.2f}'.format(profile.total_sec),
+                    u'{:.2f}'.format(percentile(durations, 50)),
+                    u'{:.2f}'.format(percentile(durations, 95)),
+                    u'{:.2f}'.format(percentile(durations, 99)),
+                    u'{:.2f}'.format(profile.command_sec),
+                    u'{:.2f}'.format(profile.screenshot_sec),
+                    u'{:.2f}'.format(profile.sleep_sec),
+                    u'{:.2f}'.format(profile.other_sec),
+                    profile.pattern
+                ))
+
+    def write_folded(self, file_path):
+        """
+        writes the folded stacks, in milliseconds
+        """
+        with io.open(file_path, u'w', encoding=u'utf8') as f:
+            for stack in sorted(self.stacks):
+                if self.stacks[stack]:
+                    f.write(u'{} {}\n'.format(stack, self.stacks[stack]))
@@ -0,0 +1,113 @@
+"""
+compact records of the results of a run. the reporters keep these instead of
+behave's model objects, which hold on to the parsed feature files (tables,
+text, tags, etc), so the model can be garbage collected after each feature
+"""
+from mobilebdd.behave_tools import gentrify_scenario_name
+
+
+class StepResult(object):
+    """
+    the results of a step. the fields have the same names as on behave's step,
+    so the reporters can take either
+    """
+    __slots__ = (
+        u'id',
+        u'keyword',
+        u'step_type',
+        u'name',
+        u'status',
+        u'error_message',
+        u'start_time_epoch_sec',
+        u'end_time_epoch_sec',
+        u'command_sec',
+        u'sleep_sec',
+        u'screenshot_sec',
+        u'screenshot_path',
+        u'screenshot_rect',
+        u'screenshot_id'
+    )
+
+    def __init__(self, step, step_id):
+        """
+        :type step: behave.model.Step
+        :param step_id: the number of the step in its feature
+        """
+        self.id = step_id
+        self.keyword = step.keyword
+        self.step_type = step.step_type
+        self.name = step.name
+        self.status = step.status
+        self.error_message = step.error_message
+        self.start_time_epoch_sec = getattr(step, u'start_time_epoch_sec', None)
+        self.end_time_epoch_sec = getattr(step, u'end_time_epoch_sec', None)
+        self.command_sec = getattr(step, u'command_sec', 0.0)
+        self.sleep_sec = getattr(step, u'sleep_sec', 0.0)
+        self.screenshot_sec = getattr(step, u'screenshot_sec', 0.0)
+        self.screenshot_path = getattr(step, u'screenshot_path', None)
+        self.screenshot_rect = getattr(step, u'screenshot_rect', None)
+        # set by the html report
+        self.screenshot_id = None
+
+    @property
+    def duration(self):
+        if self.start_time_epoch_sec is None or self.end_time_epoch_sec is None:
+            return 0.0
+        return self.end_time_epoch_sec - self.start_time_epoch_sec
+
+
+class ScenarioResult(object):
+    """
+    the results of a scenario, or of one row of a scenario outline's examples
+    """
+    __slots__ = (
+        u'name',
+        u'status',
+        u'tags',
+        u'steps'
+    )
+
+    def __init__(self, scenario, first_step_id=0):
+        """
+        :type scenario: behave.model.Scenario
+        :param first_step_id: the id to number the scenario's steps from
+        """
+        self.name = gentrify_scenario_name(scenario)
+        self.status = scenario.status
+        self.tags = tuple(scenario.tags)
+        self.steps = [
+            StepResult(step, step_id)
+            for step_id, step in enumerate(scenario.steps, first_step_id)
+        ]
+
+
+class FeatureResult(object):
+    """
+    the results of a feature, with its scenario outlines expanded into
+    scenarios and its steps numbered
+    """
+    __slots__ = (
+        u'name',
+        u'status',
+        u'tags',
+        u'filename',
+        u'scenarios'
+    )
+
+    def __init__(self, feature):
+        """
+        :type feature: behave.model.Feature
+        """
+        self.name = feature.name
+        self.status = feature.status
+        self.tags = tuple(feature.tags)
+        self.filename = feature.filename
+
+        # if we have a scenario outline in a feature, we have to call 'walk'
+        # because it wont be expanded. weird, but whatever.
+        self.scenarios = []
+        steps = 0
+        for scenario in feature.walk_scenarios():
+            result = ScenarioResult(scenario, first_step_id=steps)
+            steps += len(result.steps)
+            self.scenarios.append(result)
@@ -5,7 +5,6 @@ import os
 import logging
 import json
 
-from behave import step_registry
 from behave.configuration import Configuration, ConfigError
 from behave.tag_expression import TagExpression
 from behave.parser import ParserError
@@ -14,19 +13,51 @@ from behave.runner_util import FileNotFoundError,\
 
 from hacks.behaver import HackedRunner
 from mobilebdd.errors import UndefinedStepsError
+from parse_cache import ParseCache
+# RealSteps used to be defined here, it's still imported for anyone using it
+# from the runner
+from step_index import RealSteps, StepIndex  # noqa: F401
 from reports.html import HtmlReporter
+from reports.images import ImageSettings
+from reports.jsonifier import JsonLinesReporter
+from reports.profiler import StepProfiler
 
 
 log = logging.getLogger(u'mobilebdd')
 
 
-# real steps, when behave has a 'step' step type, expand it out to these when
-# getting the list of known steps
-RealSteps = [u'Given', u'When', u'Then']
+def _with_core_steps(step_dirs):
+    """
+    :param step_dirs: list of directories to load extra steps from, or a
+        single path
+    :return: the step dirs, with the bdd core's steps added
+    :rtype: list[string]
+    """
+    # append steps from the bdd core
+    if not step_dirs:
+        step_dirs = []
+
+    if isinstance(step_dirs, str):
+        step_dirs = [step_dirs]
+    if not step_dirs.count(os.path.dirname(__file__)):
+        step_dirs.append(os.path.dirname(__file__))
+
+    return step_dirs
+
+
+def _parse_cache(test_config):
+    """
+    :return: the parse cache the test config asks for, or None
+    :rtype: ParseCache
+    """
+    if test_config and test_config.get(u'parse_cache_dir', None):
+        return ParseCache(test_config[u'parse_cache_dir'])
+    return None
 
 
 def _run_behave(feature_dirs, config, step_dirs=None, webdriver_url=None,
-                webdriver_processor=None, listeners=None, test_config=None):
+                webdriver_processor=None, listeners=None, test_config=None,
+                feature_queue=None, check_steps=False):
     """
     run behave
 
@@ -44,6 +75,12 @@ def _run_behave(feature_dirs, config, step_dirs=None, webdriver_url=None,
     :type webdriver_processor: WebDriverProcessor
     :param listeners: list of listeners
     :type listeners: list[Listener]
+    :param feature_queue: optional. queue to take the paths of the feature
+        files to run from, instead of running everything in feature_dirs
+    :type feature_queue: multiprocessing.Queue
+    :param check_steps: if True, check that all the steps are defined before
+        running any of them
+    :type check_steps: bool
 
     :return: True if the tests passed, else False
     :rtype: bool
@@ -55,14 +92,7 @@ def _run_behave(feature_dirs, config, step_dirs=None, webdriver_url=None,
     :raise InvalidFilenameError: when a feature file name was bad
     :raise UndefinedStepsError: if some steps were undefined
     """
-    # append steps from the bdd core
-    if not step_dirs:
-        step_dirs = []
-
-    if isinstance(step_dirs, str):
-        step_dirs = [step_dirs]
-    if not step_dirs.count(os.path.dirname(__file__)):
-        step_dirs.append(os.path.dirname(__file__))
+    step_dirs = _with_core_steps(step_dirs)
 
     # ensure that the webdriver url is in string format for selenium, which can't support unicode
     if isinstance(webdriver_url, unicode):
@@ -74,13 +104,22 @@ def _run_behave(feature_dirs, config, step_dirs=None, webdriver_url=None,
 
     runner = HackedRunner(config, feature_dirs, step_dirs, webdriver_processor=webdriver_processor, listeners=listeners, test_config=test_config)
     runner.webdriver_url = webdriver_url
+    runner.feature_queue = feature_queue
+    runner.check_steps = check_steps
+    runner.parse_cache = _parse_cache(test_config)
 
     try:
         failed = runner.run()
     except (ParserError, ConfigError, FileNotFoundError,
-            InvalidFileLocationError, InvalidFilenameError) as e:
+            InvalidFileLocationError, InvalidFilenameError,
+            UndefinedStepsError) as e:
         log.error(e)
         raise e
+    finally:
+        # the reporters only wrap up when the run gets to the end
+        for reporter in config.reporters:
+            if hasattr(reporter, u'close'):
+                reporter.close()
 
     if runner.undefined_steps:
         e = UndefinedStepsError(runner.undefined_steps)
@@ -90,6 +129,126 @@ def _run_behave(feature_dirs, config, step_dirs=None, webdriver_url=None,
     return not failed
 
 
+def _read_config_file(config_file, test_config):
+    """
+    :param config_file: path to a json config file, or None
+    :param test_config: the test config dict given by the caller, or None
+    :return: the test config, with the values from the config file written
+        over it
+    :rtype: dict
+    """
+    if config_file:
+        try:
+            with open(config_file) as config:
+                try:
+                    json_config = json.load(config)
+                except ValueError as e:
+                    raise ValueError(u'Could not parse {} config file as JSON. See sample.config for an example config file. {}'.format(config_file, e))
+                if test_config:
+                    test_config.update(json_config)
+                else:
+                    test_config = json_config
+        except EnvironmentError as e:
+            raise IOError(u'Could not open the {} config file. See sample.config for an example config file. {}'.format(config_file, e))
+
+    return test_config
+
+
+def _check_steps(feature_dirs, step_dirs, test_config=None):
+    """
+    loads the steps and parses the features, to catch any undefined steps
+    before anything is run. nothing is run
+
+    :return: the paths to the feature files
+    :rtype: list[string]
+
+    :raise ParserError: when a feature file couldnt be parsed
+    :raise UndefinedStepsError: if some steps were undefined
+    """
+    config = Configuration([u'--dry-run'])
+    config.format = []
+
+    runner = HackedRunner(config, feature_dirs, _with_core_steps(step_dirs))
+    runner.parse_cache = _parse_cache(test_config)
+    runner.setup_paths()
+    runner.load_step_definitions()
+    features = runner.parse_features()
+
+    undefined_steps = runner.find_undefined_steps(features)
+    if undefined_steps:
+        e = UndefinedStepsError(undefined_steps)
+        log.error(e)
+        raise e
+
+    return [feature.filename for feature in features]
+
+
+def _behave_config(test_artifact_dir, dry_run, tags, show_skipped, test_config):
+    """
+    :return: the configuration for behave's runner, with the html reporter
+        added if test artifacts are enabled
+    :rtype: Configuration
+    """
+    args = [u'']
+
+    # output test artifacts
+    if test_artifact_dir:
+        args.append(u'--junit')
+        args.append(u'--junit-directory')
+        args.append(test_artifact_dir)
+
+    if dry_run:
+        args.append(u'--dry-run')
+
+    # setup config for behave's runner
+    config = Configuration(args)
+    config.format = [
+        # outputs pretty output in to stdout while tests are running
+        u'pretty'
+    ]
+
+    # Set the tags if there are any
+    if tags:
+        log.debug(u'Running Scenarios with Tag(s): {}'.format(tags))
+        if isinstance(tags, list):
+            log.debug(u'Running Scenarios with Tag List')
+            config.tags = TagExpression(tags)
+        else:
+            config.tags = TagExpression(tags.split())
+
+    config.show_skipped = show_skipped
+    if not show_skipped:
+        log.debug(u'Not showing skipped scenarios.')
+
+    # only add html reporter if the test artifacts are enabled
+    if test_artifact_dir:
+        config.reporters.append(HtmlReporter(
+            config,
+            test_artifact_dir,
+            image_settings=ImageSettings.from_config(test_config)
+        ))
+
+    return config
+
+
+def _config_listeners(listeners, test_config):
+    """
+    :return: the listeners, plus the ones the test config asks for
+    :rtype: list[Listener]
+    """
+    # stream the results as json lines if asked to
+    if test_config and test_config.get(u'json_lines_report', None):
+        listeners = list(listeners or [])
+        listeners.append(JsonLinesReporter(test_config[u'json_lines_report']))
+
+    # profile the steps if asked to
+    if test_config and test_config.get(u'step_profile_dir', None):
+        listeners = list(listeners or [])
+        listeners.append(StepProfiler(test_config[u'step_profile_dir']))
+
+    return listeners
+
+
 def goh_behave(feature_dirs=None, step_dirs=None, test_artifact_dir=None,
                listeners=None, dry_run=False, webdriver_url=None,
                webdriver_processor=None, tags=None, show_skipped=True, config_file=None,
@@ -128,19 +287,7 @@ def goh_behave(feature_dirs=None, step_dirs=None, test_artifact_dir=None,
     :raise UndefinedStepsError: if some steps were undefined
     """
 
-    if config_file:
-        try:
-            with open(config_file) as config:
-                try:
-                    json_config = json.load(config)
-                except ValueError as e:
-                    raise ValueError(u'Could not parse {} config file as JSON. See sample.config for an example config file. {}'.format(config_file, e))
-                if test_config:
-                    test_config.update(json_config)
-                else:
-                    test_config = json_config
-        except EnvironmentError as e:
-            raise IOError(u'Could not open the {} config file. See sample.config for an example config file. {}'.format(config_file, e))
+    test_config = _read_config_file(config_file, test_config)
 
     if test_config:
         log.debug(u'Using test_config:')
@@ -166,51 +313,8 @@ def goh_behave(feature_dirs=None, step_dirs=None, test_artifact_dir=None,
     if isinstance(feature_dirs, basestring):
         feature_dirs = [feature_dirs]
 
-    args = [u'']
-
-    # first run in dry run mode to catch any undefined steps
-    # if the user specifies dry run mode, then don't do this, since it'll be
-    # done anyway
-    # but we're running it always anyway. so what's the difference? if user
-    # specifies dry run mode, they might also give listeners, etc.
-    # auto dry run mode is meant to happen silently
-    if not dry_run:
-        config = Configuration([u'--dry-run'])
-        config.format = []
-        _run_behave(feature_dirs, config, step_dirs=step_dirs)
-
-    # output test artifacts
-    if test_artifact_dir:
-        args.append(u'--junit')
-        args.append(u'--junit-directory')
-        args.append(test_artifact_dir)
-
-    if dry_run:
-        args.append(u'--dry-run')
-
-    # setup config for behave's runner
-    config = Configuration(args)
-    config.format = [
-        # outputs pretty output in to stdout while tests are running
-        u'pretty'
-    ]
-
-    # Set the tags if there are any
-    if tags:
-        log.debug(u'Running Scenarios with Tag(s): {}'.format(tags))
-        if isinstance(tags, list):
-            log.debug(u'Running Scenarios with Tag List')
-            config.tags = TagExpression(tags)
-        else:
-            config.tags = TagExpression(tags.split())
-
-    config.show_skipped = show_skipped
-    if not show_skipped:
-        log.debug(u'Not showing skipped scenarios.')
-
-    # only add html reporter if the test artifacts are enabled
-    if test_artifact_dir:
-        config.reporters.append(HtmlReporter(config, test_artifact_dir))
+    config = _behave_config(test_artifact_dir, dry_run, tags, show_skipped, test_config)
+    listeners = _config_listeners(listeners, test_config)
 
     try:
         return _run_behave(
@@ -220,7 +324,10 @@ def goh_behave(feature_dirs=None, step_dirs=None, test_artifact_dir=None,
             webdriver_url=webdriver_url,
             webdriver_processor=webdriver_processor,
             listeners=listeners,
-            test_config = test_config
+            test_config = test_config,
+            # catch any undefined steps before anything is run. in dry run
+            # mode, behave finds them anyway
+            check_steps=not dry_run
         )
     except ConfigError as e:
         # since we control the configuration file, we shouldn't expose this to
@@ -229,46 +336,19 @@ def goh_behave(feature_dirs=None, step_dirs=None, test_artifact_dir=None,
         return False
 
 
-def get_available_steps(step_dirs=None):
+def get_available_steps(step_dirs=None, cache_file=None):
     """
     gets all the steps that the core is aware of. useful for doing real-time
     'syntax' checking for uis
 
-    you dont need to call goh_behave prior
+    you dont need to call goh_behave prior. for more than the list of steps,
+    use StepIndex from mobilebdd.step_index
 
     :param step_dirs: optional. list of dirs to additionally load steps from
+    :param cache_file: optional. file to save the steps in, so they dont have
+        to be loaded again until the step files change
 
     :return: a list of found steps' text
     :rtype: list[string]
     """
-    # setup config for behave's runner
-    # use dry run so only steps are evaluated, nothing is run
-    config = Configuration([u'--dry-run'])
-    # i dont want std output about the running test, because there is no test
-    # whoa...
-    config.format = [u'null']
-
-    # append steps from the bdd core
-    if not step_dirs:
-        step_dirs = []
-
-    # no features, we just want the implemented steps
-    feature_dirs = []
-    runner = HackedRunner(config, feature_dirs, step_dirs)
-
-    # this is the key part. this will cause behave to run through all the step
-    # dirs and execute them, which will cause steps to be registered.
-    runner.load_step_definitions()
-
-    # reach into behave's step registry and serialize the known steps into a list
-    found_steps = []
-    for steps in step_registry.registry.steps.values():
-        for step in steps:
-            if step.step_type is None or u'step' == step.step_type:
-                for real_key in RealSteps:
-                    found_steps.append(u'{} {}'.format(real_key, step.string))
-            else:
-                found_steps.append(u'{} {}'.format(step.step_type, step.string))
-            found_steps.append(u'{} {}'.format(u'And', step.string))
-
-    return found_steps
+    return list(StepIndex.load(step_dirs, cache_file=cache_file).steps)
@@ -0,0 +1,387 @@
+"""
+decides which steps get screenshots, and writes them to disk off of the test
+thread
+"""
+import base64
+import collections
+import hashlib
+import io
+import logging
+import os
+import threading
+import Queue
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+log = logging.getLogger(u'mobilebdd')
+
+
+def difference_hash(png, size=8):
+    """
+    a perceptual hash of an image, so images that only differ by a few pixels
+    (eg. a blinking cursor) can be spotted. needs PIL
+
+    :param png: the image bytes
+    :param size: the hash is size * size bits
+    :return: the hash
+    :rtype: int
+    """
+    image = Image.open(io.BytesIO(png)).convert(u'L').resize((size + 1, size), Image.ANTIALIAS)
+    pixels = list(image.getdata())
+
+    bits = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            right = pixels[row * (size + 1) + col + 1]
+            bits = (bits << 1) | (left > right)
+    return bits
+
+
+class ScreenshotWriter(object):
+    """
+    decodes and writes screenshots on a pool of worker threads, so the steps
+    only have to wait for the image to be fetched from the driver
+
+    if given a store dir, screenshots are saved there by the hash of their
+    content, so identical screenshots (eg. after assertions and waits) are only
+    written once and the steps share the file. with a dedupe threshold (and
+    PIL installed), a screenshot that is perceptually within that many bits of
+    the previous one shares the previous one's file too
+
+    each step's screenshot_path is set once its file is written, and its
+    screenshot_pending flag is cleared once it's been dealt with, written or
+    not. call flush before reading the paths (eg. before the reports are
+    generated)
+    """
+
+    DefaultWorkers = 2
+    DefaultQueueSize = 16
+
+    def __init__(self, workers=DefaultWorkers, queue_size=DefaultQueueSize, store_dir=None, dedupe_threshold=0):
+        """
+        :param workers: number of threads writing screenshots
+        :param queue_size: max screenshots waiting to be written. once full,
+            submitting blocks until there's room, which keeps memory bounded
+            when the disk can't keep up
+        :param store_dir: if given, where to store screenshots by content hash
+        :param dedupe_threshold: max bits of perceptual difference from the
+            previous screenshot to still count as the same. 0 means only byte
+            identical screenshots are the same
+        """
+        self.store_dir = store_dir
+        if store_dir and not os.path.isdir(store_dir):
+            os.makedirs(store_dir)
+
+        self.dedupe_threshold = dedupe_threshold
+        if dedupe_threshold and Image is None:
+            log.warning(u'PIL is not installed, only byte identical screenshots will be deduplicated')
+            self.dedupe_threshold = 0
+
+        # content hash -> file the content is stored in
+        self.stored = {}
+        # (perceptual hash, file path) of the last screenshot stored
+        self.previous = None
+        # number of screenshots that reused a stored file
+        self.deduplicated = 0
+
+        # dedupe decisions are made in the order the screenshots were
+        # submitted, so that 'the previous screenshot' means the previous
+        # step's, no matter which worker gets to it first
+        self.submitted = 0
+        self.turn = 0
+        self.turn_lock = threading.Condition()
+
+        self.queue = Queue.Queue(maxsize=queue_size)
+        self.threads = []
+        for i in range(workers):
+            thread = threading.Thread(
+                target=self._work,
+                name=u'screenshot-writer-{}'.format(i)
+            )
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    @classmethod
+    def from_config(cls, config, store_dir=None):
+        """
+        :param config: the test config, optionally with screenshot_workers,
+            screenshot_queue_size, screenshot_dedupe and
+            screenshot_dedupe_threshold
+        :param store_dir: where to store deduplicated screenshots
+        :rtype: ScreenshotWriter
+        """
+        config = config or {}
+        if not config.get(u'screenshot_dedupe', True):
+            store_dir = None
+
+        return cls(
+            workers=max(1, int(config.get(u'screenshot_workers', cls.DefaultWorkers))),
+            queue_size=max(1, int(config.get(u'screenshot_queue_size', cls.DefaultQueueSize))),
+            store_dir=store_dir,
+            dedupe_threshold=int(config.get(u'screenshot_dedupe_threshold', 0))
+        )
+
+    def submit(self, step, file_path, data, encoded=True):
+        """
+        queues a screenshot to be written for the step
+
+        :param step: the step the screenshot belongs to. its screenshot_path is
+            set when the file is written
+        :param file_path: where to write the screenshot, if it isn't stored by
+            content hash
+        :param data: the image
+        :param encoded: whether the image is base64 encoded, as the drivers
+            return it
+        """
+        step.screenshot_path = None
+        step.screenshot_pending = True
+        self.queue.put((self.submitted, step, file_path, data, encoded))
+        self.submitted += 1
+
+    def _work(self):
+        while True:
+            job = self.queue.get()
+            try:
+                if job is None:
+                    return
+                try:
+                    self._process(*job)
+                finally:
+                    job[1].screenshot_pending = False
+            finally:
+                self.queue.task_done()
+
+    def _process(self, order, step, file_path, data, encoded):
+        image = None
+        digest = None
+        fingerprint = None
+        try:
+            image = base64.b64decode(data.encode(u'ascii')) if encoded else data
+            if self.store_dir:
+                digest = hashlib.sha1(image).hexdigest()
+                if self.dedupe_threshold:
+                    fingerprint = difference_hash(image)
+        except Exception as e:
+            log.warning(u'problem decoding screenshot {}! {}'.format(file_path, e))
+
+        write = image is not None
+        with self.turn_lock:
+            while self.turn != order:
+                self.turn_lock.wait()
+            try:
+                if digest:
+                    file_path, write = self._dedupe(digest, fingerprint)
+            finally:
+                self.turn += 1
+                self.turn_lock.notify_all()
+
+        if image is None:
+            return
+
+        if write:
+            try:
+                with open(file_path, u'wb') as f:
+                    f.write(image)
+                log.debug(u'wrote screenshot "{}"'.format(file_path))
+            except Exception as e:
+                log.warning(u'problem writing screenshot {}! {}'.format(file_path, e))
+                return
+        step.screenshot_path = file_path
+
+    def _dedupe(self, digest, fingerprint):
+        """
+        :return: the file to use for the screenshot, and whether it still
+            needs to be written
+        """
+        stored = self.stored.get(digest, None)
+        if stored:
+            self.deduplicated += 1
+            self.previous = (fingerprint, stored)
+            return stored, False
+
+        if fingerprint is not None and self.previous and self.previous[0] is not None:
+            if bin(fingerprint ^ self.previous[0]).count(u'1') <= self.dedupe_threshold:
+                self.deduplicated += 1
+                self.stored[digest] = self.previous[1]
+                return self.previous[1], False
+
+        file_path = os.path.join(self.store_dir, digest + u'.png')
+        self.stored[digest] = file_path
+        self.previous = (fingerprint, file_path)
+        return file_path, True
+
+    def flush(self):
+        """
+        blocks until every queued screenshot has been written
+        """
+        self.queue.join()
+
+    def close(self):
+        """
+        writes everything that's queued, then stops the workers
+        """
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+
+        if self.store_dir:
+            log.debug(u'{} of {} screenshots reused an identical one'.format(self.deduplicated, self.submitted))
+
+
+class CapturePolicy(object):
+    """
+    decides which steps get a screenshot
+
+    always - after every step
+    on_failure - only after the step that failed
+    every_n - after every nth step of a scenario, and after the step that failed
+    ring_buffer - after every step, but only the last few are kept (in memory),
+        and they're only written if the scenario fails
+
+    the policy comes from the screenshot_policy key of the test config, either
+    just the mode, eg. "on_failure", or an object like
+    {"mode": "every_n", "every": 5} or {"mode": "ring_buffer", "buffer_size": 3}.
+    features and scenarios can override it with tags, eg.
+    @screenshots_on_failure, @screenshots_every_5 or @screenshots_buffer_3
+    """
+
+    Always = u'always'
+    OnFailure = u'on_failure'
+    EveryN = u'every_n'
+    RingBuffer = u'ring_buffer'
+    Modes = (Always, OnFailure, EveryN, RingBuffer)
+
+    # @screenshots_always, @screenshots_on_failure, @screenshots_every_N,
+    # @screenshots_buffer_K
+    TagPrefix = u'screenshots_'
+
+    def __init__(self, mode=Always, every=1, buffer_size=5):
+        """
+        :param mode: one of Modes
+        :param every: for every_n, how many steps between screenshots
+        :param buffer_size: for ring_buffer, how many screenshots to keep
+        """
+        if mode not in CapturePolicy.Modes:
+            raise ValueError(u'unknown screenshot policy "{}", use one of {}'.format(mode, CapturePolicy.Modes))
+
+        self.mode = mode
+        self.every = max(1, int(every))
+        self.buffer_size = max(1, int(buffer_size))
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        :param config: the test config
+        :rtype: CapturePolicy
+        """
+        policy = (config or {}).get(u'screenshot_policy', None)
+        if not policy:
+            return cls()
+        if isinstance(policy, basestring):
+            return cls(policy)
+        return cls(
+            policy.get(u'mode', cls.Always),
+            every=policy.get(u'every', 1),
+            buffer_size=policy.get(u'buffer_size', 5)
+        )
+
+    @classmethod
+    def from_tags(cls, tags, default):
+        """
+        :param tags: the tags of a feature or scenario
+        :param default: the policy to use if none of the tags set one
+        :rtype: CapturePolicy
+        """
+        for tag in tags:
+            if not tag.startswith(cls.TagPrefix):
+                continue
+
+            setting = tag[len(cls.TagPrefix):]
+            if setting == cls.Always:
+                return cls(cls.Always)
+            if setting == cls.OnFailure:
+                return cls(cls.OnFailure)
+
+            mode, _, count = setting.rpartition(u'_')
+            if count.isdigit():
+                if mode == u'every':
+                    return cls(cls.EveryN, every=int(count))
+                if mode == u'buffer':
+                    return cls(cls.RingBuffer, buffer_size=int(count))
+
+            log.warning(u'ignoring unknown screenshot tag @{}'.format(tag))
+        return default
+
+
+class ScenarioCapture(object):
+    """
+    applies a capture policy to the steps of one scenario
+    """
+
+    def __init__(self, policy, writer):
+        """
+        :type policy: CapturePolicy
+        :param writer: where the screenshots that are kept get written
+        :type writer: ScreenshotWriter
+        """
+        self.policy = policy
+        self.writer = writer
+        self.steps_run = 0
+        self.buffer = collections.deque(maxlen=policy.buffer_size)
+
+    def wants(self, step):
+        """
+        counts the step, and decides whether it should get a screenshot
+
+        :param step: the step that just ran
+        :rtype: bool
+        """
+        self.steps_run += 1
+        failed = step.status == u'failed'
+
+        if self.policy.mode == CapturePolicy.OnFailure:
+            return failed
+        if self.policy.mode == CapturePolicy.EveryN:
+            return failed or self.steps_run % self.policy.every == 0
+        return True
+
+    def add(self, step, file_path, data, encoded=True):
+        """
+        keeps a screenshot of the step, writing it now or holding it in the
+        ring buffer
+
+        see ScreenshotWriter.submit for the params
+        """
+        if self.policy.mode == CapturePolicy.RingBuffer and step.status != u'failed':
+            step.screenshot_path = None
+            if len(self.buffer) == self.buffer.maxlen:
+                # the oldest screenshot falls out of the buffer
+                self.buffer.popleft()[0].screenshot_pending = False
+            step.screenshot_pending = True
+            self.buffer.append((step, file_path, data, encoded))
+            return
+
+        self.release()
+        self.writer.submit(step, file_path, data, encoded)
+
+    def release(self):
+        """
+        writes the screenshots held in the ring buffer
+        """
+        while self.buffer:
+            self.writer.submit(*self.buffer.popleft())
+
+    def discard(self):
+        """
+        drops the screenshots held in the ring buffer
+        """
+        while self.buffer:
+            self.buffer.popleft()[0].screenshot_pending = False
@@ -0,0 +1,285 @@
+"""
+an index of the known steps, for uis that check or complete step text as it's
+typed
+
+loading the steps means running every step module, so the index is saved to a
+cache file, and only rebuilt when the step files change. queries don't touch
+behave's step registry at all
+"""
+import bisect
+import collections
+import json
+import logging
+import os
+
+import parse
+from behave import step_registry
+from behave.configuration import Configuration
+from behave.matchers import ParseMatcher
+
+from mobilebdd.hacks.behaver import HackedRunner
+from mobilebdd.hacks.step_dispatch import PatternBuckets
+from mobilebdd.parse_cache import _write_atomic, hash_step_files
+
+
+log = logging.getLogger(u'mobilebdd')
+
+
+# real steps, when behave has a 'step' step type, expand it out to these when
+# getting the list of known steps
+RealSteps = [u'Given', u'When', u'Then']
+
+# the keywords a line of a feature file can start with, and the step types
+# they're for. and/but continue the previous step's type, so they could be any
+Keywords = {
+    u'given': u'given',
+    u'when': u'when',
+    u'then': u'then',
+    u'and': None,
+    u'but': None
+}
+
+# the step types, in the order a line that could be any type is tried as
+StepTypes = [u'given', u'when', u'then', u'step']
+
+
+def _trigrams(text):
+    text = u'  {} '.format(text.lower())
+    return set(text[i:i + 3] for i in range(len(text) - 2))
+
+
+class StepIndex(object):
+    """
+    the step definitions, indexed for:
+
+    complete - step lines starting with some text, from a sorted list
+    fuzzy - step lines like some text, from an index of their trigrams
+    match - which definition a line runs, and its parameters. the definitions
+        are bucketed by their first and last words, so a line is only tried
+        against the ones that could match it
+    """
+
+    # the cache file format. bump this when it changes
+    Version = 2
+
+    # max number of lines to remember the match of
+    MatchMemoSize = 4096
+
+    # (step dirs, cache file) -> the index loaded for them in this process
+    Loaded = {}
+
+    def __init__(self, definitions, steps_hash=None):
+        """
+        :param definitions: (step type, step string, whether it's a parse
+            pattern) of each step definition, in the order behave's registry
+            has them
+        :type definitions: list[tuple]
+        :param steps_hash: hash of the step files the definitions came from
+        """
+        self.definitions = [tuple(definition) for definition in definitions]
+        self.steps_hash = steps_hash
+
+        # every line a step can be written as, the same as
+        # get_available_steps always listed them. behave doesnt keep the type
+        # a definition was registered with on the definition, so each one is
+        # listed with every keyword
+        self.steps = []
+        for _, string, _ in self.definitions:
+            for real_key in RealSteps:
+                self.steps.append(u'{} {}'.format(real_key, string))
+            self.steps.append(u'{} {}'.format(u'And', string))
+
+        self._sorted = sorted((step.lower(), step) for step in self.steps)
+
+        self._trigrams = collections.defaultdict(list)
+        for number, step in enumerate(self.steps):
+            for trigram in _trigrams(step):
+                self._trigrams[trigram].append(number)
+
+        # only parse patterns can be matched. the others are None
+        self._parsers = [
+            parse.compile(string, ParseMatcher.custom_types) if is_parse else None
+            for _, string, is_parse in self.definitions
+        ]
+
+        # step type -> (numbers of the definitions to try, in the order behave
+        # tries them, PatternBuckets of them). each type also gets the generic
+        # 'step' definitions, after its own
+        self._buckets = {}
+        for step_type in StepTypes:
+            numbers = [number for number, definition in enumerate(self.definitions) if definition[0] == step_type]
+            if step_type != u'step':
+                numbers += [number for number, definition in enumerate(self.definitions) if definition[0] == u'step']
+            self._buckets[step_type] = (
+                numbers,
+                PatternBuckets([self.definitions[number][1] if self._parsers[number] else None for number in numbers])
+            )
+
+        self._matches = {}
+
+    @classmethod
+    def from_registry(cls, steps_hash=None):
+        """
+        :return: an index of the steps in behave's step registry
+        :rtype: StepIndex
+        """
+        definitions = []
+        for step_type, steps in step_registry.registry.steps.items():
+            for step in steps:
+                is_parse = isinstance(step, ParseMatcher)
+                if not is_parse:
+                    log.debug(u'step index can only match parse steps, listing {} without matching it'.format(step.describe()))
+                definitions.append((step_type, step.string, is_parse))
+        return cls(definitions, steps_hash=steps_hash)
+
+    @classmethod
+    def load(cls, step_dirs=None, cache_file=None):
+        """
+        loads the steps in the step dirs (and the bdd core), from the cache
+        file if the step files havent changed since it was written
+
+        the step registry can only load each step file once per process, so
+        changes to the step files after they're loaded need a new process
+
+        :param step_dirs: optional. list of dirs to additionally load steps from
+        :param cache_file: optional. where to save the index
+        :rtype: StepIndex
+        """
+        config = Configuration([u'--dry-run'])
+        config.format = [u'null']
+        runner = HackedRunner(config, [], step_dirs or [])
+        steps_hash = hash_step_files(runner.step_dirs())
+
+        key = (tuple(runner.step_dirs()), cache_file)
+        index = StepIndex.Loaded.get(key, None)
+        if not index or index.steps_hash != steps_hash:
+            index = cls._load(runner, steps_hash, cache_file, index)
+            StepIndex.Loaded[key] = index
+        return index
+
+    @classmethod
+    def _load(cls, runner, steps_hash, cache_file, loaded=None):
+        """
+        :param steps_hash: hash of the step files as they are now
+        :param loaded: the index loaded before in this process, if any
+        """
+        if cache_file and os.path.isfile(cache_file):
+            try:
+                with open(cache_file) as f:
+                    cached = json.load(f)
+                if cached.get(u'version') == cls.Version and cached.get(u'steps') == steps_hash:
+                    return cls(cached[u'definitions'], steps_hash=steps_hash)
+            except (IOError, ValueError, KeyError) as e:
+                # ValueError is also what parse raises for a custom type that
+                # isnt registered yet, which loading the steps fixes
+                log.warning(u'could not use the step index in {}, loading the steps. {}'.format(cache_file, e))
+
+        # this will cause behave to run through all the step dirs and execute
+        # them, which will cause steps to be registered.
+        runner.load_step_definitions()
+
+        # the registry keeps the steps from the first time they were loaded in
+        # the process, which may be older than the files
+        loaded_hash = runner.loaded_steps_hash()
+        if loaded and loaded.steps_hash == loaded_hash:
+            return loaded
+        index = cls.from_registry(steps_hash=loaded_hash)
+
+        if loaded_hash != steps_hash:
+            # saving these under either hash would hand the old steps to the
+            # next process to use the cache file
+            log.warning(u'the step files changed after they were loaded, so the step index has the old steps. it takes a new process to load the new ones')
+        elif cache_file:
+            index.save(cache_file)
+        return index
+
+    def save(self, cache_file):
+        """
+        writes the index's definitions to the cache file
+        """
+        cache_dir = os.path.dirname(cache_file)
+        if cache_dir and not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+
+        _write_atomic(cache_file, json.dumps({
+            u'version': StepIndex.Version,
+            u'steps': self.steps_hash,
+            u'definitions': self.definitions
+        }))
+
+    def complete(self, prefix, limit=20):
+        """
+        :param prefix: the start of a line, keyword and all. case doesnt
+            matter
+        :return: the step lines that start with it, in alphabetical order
+        :rtype: list[unicode]
+        """
+        prefix = prefix.lower()
+        start = bisect.bisect_left(self._sorted, (prefix,))
+        found = []
+        for lowered, step in self._sorted[start:]:
+            if not lowered.startswith(prefix) or len(found) >= limit:
+                break
+            found.append(step)
+        return found
+
+    def fuzzy(self, text, limit=20):
+        """
+        :param text: some text, eg. a misspelt or half remembered step
+        :return: the step lines most like it, best first
+        :rtype: list[unicode]
+        """
+        trigrams = _trigrams(text)
+        shared = collections.Counter()
+        for trigram in trigrams:
+            for number in self._trigrams.get(trigram, ()):
+                shared[number] += 1
+
+        def similarity(number):
+            # jaccard similarity of the trigrams
+            step_trigrams = len(_trigrams(self.steps[number]))
+            return float(shared[number]) / (len(trigrams) + step_trigrams - shared[number])
+
+        best = sorted(shared, key=lambda number: (-similarity(number), number))
+        return [self.steps[number] for number in best[:limit]]
+
+    def match(self, line):
+        """
+        :param line: a step line, with or without its keyword
+        :return: (step type, step string, parameters) of the definition that
+            runs the line, or None if nothing does. the parameters are by name,
+            or by position for unnamed ones
+        :rtype: tuple
+        """
+        line = line.strip()
+        if line in self._matches:
+            return self._matches[line]
+
+        keyword, _, text = line.partition(u' ')
+        if keyword.lower() in Keywords:
+            step_types = [Keywords[keyword.lower()]] if Keywords[keyword.lower()] else StepTypes
+        else:
+            # no keyword, so try it as any type of step
+            step_types = StepTypes
+            text = line
+        text = text.strip()
+
+        found = None
+        for step_type in step_types:
+            numbers, buckets = self._buckets[step_type]
+            for number in (numbers[candidate] for candidate in buckets.candidates(text)):
+                if not self._parsers[number]:
+                    continue
+                result = self._parsers[number].parse(text)
+                if result:
+                    parameters = dict(enumerate(result.fixed))
+                    parameters.update(result.named)
+                    found = self.definitions[number][:2] + (parameters,)
+                    break
+            if found:
+                break
+
+        if len(self._matches) >= StepIndex.MatchMemoSize:
+            self._matches.clear()
+        self._matches[line] = found
+        return found
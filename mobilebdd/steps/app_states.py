@@ -142,7 +142,8 @@ def _step(context, os_type, os_ver, device_type=None):
             window_size_x=window_size_x,
             window_size_y=window_size_y,
             webdriver_url=context.webdriver_url,
-            webdriver_processor=context.webdriver_processor
+            webdriver_processor=context.webdriver_processor,
+            test_config=context.test_config
         )
 
         # state that we shouldn't refresh the driver unless another step says otherwise
@@ -157,7 +158,6 @@ def _step(context):
     """
     :type context: HackedContext
     """
-    # we actually dont need to do anything here because screenshots are taken
-    # after every step. but this might be something that is more intuitive to
-    # users
-    pass
+    # the screenshot is taken after the step like usual, this just makes sure
+    # one is taken even if the screenshot policy would skip this step
+    context.capture_screenshot = True
@@ -4,7 +4,6 @@ steps that modify or retrieve device states
 
 # noinspection PyUnresolvedReferences
 from behave import *
-import time
 import logging
 
 
@@ -36,7 +35,7 @@ def _step(context, rotation):
 
     # wait a little bit so phone can finish rendering the new content
     # this will make sure rotated screenshots look right
-    time.sleep(2)
+    context.sleep(2)
 
     log.debug(u'rotate step done')
 
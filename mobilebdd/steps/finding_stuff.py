@@ -7,7 +7,6 @@ import logging
 import ast
 import re
 import time
-from selenium.common.exceptions import NoSuchElementException
 from mobilebdd.steps.input import switch_to
 from selenium.webdriver.support.ui import WebDriverWait
 
@@ -43,12 +42,8 @@ def _step(context, element):
     """
     :type context: HackedContext
     """
-    try:
-        item = context.driver.simple_find(element)
-        assert not item.is_displayed(),\
-            u'{} should not be present and displayed'.format(element)
-    except NoSuchElementException:
-        pass
+    assert context.driver.is_absent(element),\
+        u'{} should not be present and displayed'.format(element)
 
 
 @then(u'{element} should be selected')
@@ -6,7 +6,6 @@ from behave import *
 from selenium.webdriver.support.ui import Select
 import logging
 import json
-import time
 
 
 log = logging.getLogger(u'mobilebdd')
@@ -110,7 +109,7 @@ def _step(context, thing):
     context.driver.execute_script(u'window.scrollTo(0, {});'.format(element.location[u'y'] - SCROLL_OFFSET))
 
     # scrolling has a pretty serious delay, and we don't want to capture a screenshot until after it is over
-    time.sleep(5)
+    context.sleep(5)
 
 
 @step(u'I select {value} from drop-down {dropdown}')
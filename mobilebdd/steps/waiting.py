@@ -1,5 +1,3 @@
-import time
-
 from behave import *
 from selenium.webdriver.support.ui import WebDriverWait
 
@@ -12,7 +10,7 @@ def _step(context, wait_time):
     :param wait_time: number of seconds to wait
     """
     wait_time = float(wait_time)
-    time.sleep(wait_time)
+    context.sleep(wait_time)
 
 @then(u'{element} should appear within {wait_time} seconds')
 @then(u'{element} should appear in time')
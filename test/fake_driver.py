@@ -0,0 +1,130 @@
+"""
+a HackedWebDriver that talks to an in-memory fake of the webdriver server, so
+the driver's own logic can be tested without appium or a device
+"""
+from appium.webdriver.mobilecommand import MobileCommand
+from selenium.webdriver.remote.command import Command
+
+from mobilebdd.hacks.webdriver import HackedWebDriver
+
+
+# wire protocol status codes the fake server answers with
+Success = 0
+NoSuchElement = 7
+StaleElementReference = 10
+NoSuchWindow = 23
+UnknownError = 13
+
+
+class FakeServer(object):
+    """
+    stands in for the remote connection. records every command it's sent, and
+    answers from a small model of an app: its contexts, and the elements that
+    can be found in each one as {context: {(using, value): element id}}
+    """
+
+    def __init__(self, contexts=None, elements=None, page_source=u'<hierarchy/>'):
+        # the remote webdriver adds the appium commands to this
+        self._commands = {}
+
+        self.contexts = contexts or [u'NATIVE_APP']
+        self.context = self.contexts[0]
+        self.elements = elements or {}
+        self.page_source = page_source
+        self.windows = [u'window-1']
+        self.window = self.windows[0]
+
+        # called with (command, params) before each command is answered, to
+        # change the app part way through a test
+        self.listener = None
+
+        # ids of the elements that have gone stale
+        self.stale = set()
+
+        # what execute_script returns, or if it fails
+        self.script_result = None
+        self.script_fails = False
+
+        # number of sessions started, and (command, params) of everything
+        # sent after that
+        self.sessions = 0
+        self.sent = []
+
+    def commands(self, *names):
+        """
+        :return: the commands sent so far, only the given ones if any
+        :rtype: list[str]
+        """
+        return [command for command, _ in self.sent if not names or command in names]
+
+    def execute(self, command, params):
+        if command == Command.NEW_SESSION:
+            self.sessions += 1
+            return self._respond({})
+        self.sent.append((command, params))
+        if self.listener:
+            self.listener(command, params)
+
+        if params and params.get(u'id', None) in self.stale:
+            return {u'status': StaleElementReference, u'value': {u'message': u'stale element reference'}}
+
+        if command in (Command.FIND_ELEMENT, Command.FIND_ELEMENTS):
+            element = self.elements.get(self.context, {}).get((params[u'using'], params[u'value']), None)
+            if command == Command.FIND_ELEMENTS:
+                return self._respond([{u'ELEMENT': element}] if element else [])
+            if element is None:
+                return {u'status': NoSuchElement, u'value': {u'message': u'no such element'}}
+            return self._respond({u'ELEMENT': element})
+
+        if command == MobileCommand.CONTEXTS:
+            return self._respond(list(self.contexts))
+        if command == MobileCommand.GET_CURRENT_CONTEXT:
+            return self._respond(self.context)
+        if command == MobileCommand.SWITCH_TO_CONTEXT:
+            self.context = params[u'name']
+            return self._respond(None)
+        if command == Command.GET_WINDOW_HANDLES:
+            return self._respond(list(self.windows))
+        if command == Command.GET_CURRENT_WINDOW_HANDLE:
+            if self.window not in self.windows:
+                return {u'status': NoSuchWindow, u'value': {u'message': u'no such window'}}
+            return self._respond(self.window)
+        if command == Command.SWITCH_TO_WINDOW:
+            window = params.get(u'handle', params.get(u'name', None))
+            if window not in self.windows:
+                return {u'status': NoSuchWindow, u'value': {u'message': u'no such window'}}
+            self.window = window
+            return self._respond(None)
+        if command == Command.EXECUTE_SCRIPT:
+            if self.script_fails:
+                return {u'status': UnknownError, u'value': {u'message': u'script failed'}}
+            return self._respond(self.script_result)
+        if command == Command.GET_PAGE_SOURCE:
+            return self._respond(self.page_source)
+        if command == Command.IS_ELEMENT_DISPLAYED:
+            return self._respond(True)
+        return self._respond(None)
+
+    @staticmethod
+    def _respond(value):
+        return {u'status': Success, u'value': value, u'sessionId': u'fake-session'}
+
+
+def fake_driver(server=None, test_config=None, **kwargs):
+    """
+    :param server: the fake server for the driver to talk to
+    :type server: FakeServer
+    :param test_config: the test config for the driver
+    :param kwargs: any other HackedWebDriver args, eg. app_path
+    :rtype: HackedWebDriver
+    """
+    driver = HackedWebDriver(
+        os_type=u'android',
+        os_ver=u'5.0',
+        webdriver_url=server or FakeServer(),
+        test_config=test_config,
+        **kwargs
+    )
+    # searches shouldn't wait between sweeps, or for long, in tests
+    driver.MaxSmartSearchTime_sec = 0
+    return driver
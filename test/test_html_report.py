@@ -0,0 +1,142 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from behave.configuration import Configuration
+from behave.parser import parse_feature
+
+from mobilebdd.reports.html import HtmlReporter, SummaryHeader, SummaryLinePrefix, SummaryLineSuffix, relative_screenshot_path, summary_line
+from mobilebdd.reports.images import ImageSettings
+
+FeatureText = u'''Feature: Logging in
+  Scenario: Good password
+    Given the app is open
+    When I log in
+    Then I see the home page
+'''
+
+
+def read_data(file_path):
+    """
+    :return: the json in one of the report's data scripts
+    """
+    with open(file_path) as f:
+        text = f.read().decode(u'utf8').strip()
+    return json.loads(text[text.index(u'{'):text.rindex(u'}') + 1])
+
+
+class SummaryTest(unittest.TestCase):
+
+    def test_relative_screenshot_path(self):
+        self.assertEqual(
+            relative_screenshot_path(os.path.join(u'/run', u'screenshots', u'a.png'), u'/run/report'),
+            u'../screenshots/a.png'
+        )
+
+    def test_summary_line(self):
+        line = summary_line({u'name': u'Logging in'})
+
+        self.assertTrue(line.startswith(SummaryLinePrefix))
+        self.assertTrue(line.endswith(SummaryLineSuffix))
+        self.assertEqual(json.loads(line[len(SummaryLinePrefix):-len(SummaryLineSuffix)]), {u'name': u'Logging in'})
+
+
+class HtmlReporterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.report_dir = os.path.join(self.temp_dir, u'report')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def feature(self, durations=(1.0, 3.0, 2.0)):
+        feature = parse_feature(FeatureText, filename=u'login.feature')
+        for step, duration in zip(feature.scenarios[0].steps, durations):
+            step.status = u'passed'
+            step.start_time_epoch_sec = 0.0
+            step.end_time_epoch_sec = duration
+        return feature
+
+    def screenshot(self, name):
+        path = os.path.join(self.temp_dir, name)
+        with open(path, u'wb') as f:
+            f.write(b'png')
+        return path
+
+    def test_empty_run_still_has_a_report(self):
+        reporter = HtmlReporter(Configuration([]), self.report_dir)
+
+        reporter.end()
+
+        self.assertTrue(os.path.isfile(reporter.report_file))
+        with open(reporter.summary_file) as f:
+            self.assertEqual(f.read(), SummaryHeader)
+
+    def test_each_feature_gets_a_data_file_and_a_summary_line(self):
+        reporter = HtmlReporter(Configuration([]), self.report_dir)
+        reporter.feature(self.feature())
+        reporter.feature(self.feature())
+
+        with open(reporter.summary_file) as f:
+            lines = f.readlines()[1:]
+        summaries = [json.loads(line[len(SummaryLinePrefix):-len(SummaryLineSuffix)]) for line in lines]
+        self.assertEqual([summary[u'file'] for summary in summaries], [u'data/feature-00001.js', u'data/feature-00002.js'])
+        self.assertEqual((summaries[0][u'steps'], summaries[0][u'duration']), (3, 6.0))
+        self.assertEqual([step[2] for step in summaries[0][u'slowest']], [3.0, 2.0, 1.0])
+
+        data = read_data(os.path.join(self.report_dir, summaries[0][u'file']))
+        self.assertEqual(data[u'filename'], u'login.feature')
+        self.assertEqual([step[u'name'] for step in data[u'scenarios'][0][u'steps']], [u'the app is open', u'I log in', u'I see the home page'])
+
+    def test_shared_screenshots_are_listed_once(self):
+        feature = self.feature()
+        shared = self.screenshot(u'shared.png')
+        steps = feature.scenarios[0].steps
+        steps[0].screenshot_path = shared
+        steps[1].screenshot_path = shared
+        steps[2].screenshot_path = os.path.join(self.temp_dir, u'never_written.png')
+        reporter = HtmlReporter(Configuration([]), self.report_dir)
+
+        reporter.feature(feature)
+
+        data = read_data(os.path.join(self.report_dir, u'data', u'feature-00001.js'))
+        self.assertEqual(data[u'screenshots'], [[None, u'../shared.png']])
+        self.assertEqual([step[u'screenshot'] for step in data[u'scenarios'][0][u'steps']], [0, 0, None])
+
+
+class ThumbnailPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def reporter(self, processes):
+        return HtmlReporter(Configuration([]), self.temp_dir, image_settings=ImageSettings(processes=processes))
+
+    def test_pool_is_forked_before_the_run(self):
+        reporter = self.reporter(2)
+
+        self.assertIsNotNone(reporter.pool)
+        reporter.close()
+
+    def test_no_pool_for_one_process(self):
+        self.assertIsNone(self.reporter(1).pool)
+
+    def test_no_pool_without_image_settings(self):
+        self.assertIsNone(HtmlReporter(Configuration([]), self.temp_dir).pool)
+
+    def test_close_lets_go_of_the_pool(self):
+        reporter = self.reporter(2)
+
+        reporter.close()
+
+        self.assertIsNone(reporter.pool)
+
+
+if __name__ == u'__main__':
+    unittest.main()
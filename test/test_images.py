@@ -0,0 +1,98 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from mobilebdd.reports import images
+from mobilebdd.reports.images import Image, ImageSettings, process_screenshots
+
+
+class ImageSettingsTest(unittest.TestCase):
+
+    def test_off_without_config(self):
+        self.assertIsNone(ImageSettings.from_config({}))
+
+    def test_from_config(self):
+        settings = ImageSettings.from_config({u'report_images': {u'format': u'webp', u'thumbnail_size': u'100'}})
+
+        self.assertEqual((settings.image_format, settings.thumbnail_size, settings.transcode), (u'webp', 100, True))
+
+    def test_unknown_format(self):
+        self.assertRaises(ValueError, ImageSettings, image_format=u'gif')
+
+
+@unittest.skipIf(Image is None, u'needs PIL')
+class ProcessScreenshotsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.thumbnail_dir = os.path.join(self.temp_dir, u'thumbnails')
+        self.screenshot = os.path.join(self.temp_dir, u'screenshot.png')
+        Image.new(u'RGB', (400, 800), (255, 0, 0)).save(self.screenshot)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_thumbnails_and_transcoding(self):
+        settings = ImageSettings(thumbnail_size=100, processes=1)
+
+        (thumbnail, full), = process_screenshots([(self.screenshot, None)], self.thumbnail_dir, settings)
+
+        self.assertEqual(Image.open(thumbnail).size, (50, 100))
+        self.assertEqual(full, os.path.join(self.temp_dir, u'screenshot.jpg'))
+        self.assertEqual(Image.open(full).format, u'JPEG')
+
+    def test_original_screenshot_is_kept(self):
+        # other outputs, like the json lines report, still link to it
+        process_screenshots([(self.screenshot, None)], self.thumbnail_dir, ImageSettings(processes=1))
+
+        self.assertTrue(os.path.isfile(self.screenshot))
+
+    def test_shared_screenshot_with_different_crops(self):
+        settings = ImageSettings(thumbnail_size=100, processes=1)
+
+        results = process_screenshots(
+            [(self.screenshot, None), (self.screenshot, (0, 0, 100, 100)), (self.screenshot, (0, 0, 100, 100))],
+            self.thumbnail_dir,
+            settings
+        )
+
+        self.assertNotEqual(results[0][0], results[1][0])
+        self.assertEqual(results[1], results[2])
+        self.assertEqual(Image.open(results[1][0]).size, (100, 100))
+        self.assertEqual(len(set(full for _, full in results)), 1)
+
+    def test_pool(self):
+        settings = ImageSettings(processes=2)
+
+        results = process_screenshots(
+            [(self.screenshot, None), (self.screenshot, (0, 0, 10, 10))],
+            self.thumbnail_dir,
+            settings
+        )
+
+        self.assertTrue(all(os.path.isfile(thumbnail) for thumbnail, _ in results))
+
+    def test_without_transcoding(self):
+        settings = ImageSettings(transcode=False, processes=1)
+
+        (_, full), = process_screenshots([(self.screenshot, None)], self.thumbnail_dir, settings)
+
+        self.assertEqual(full, self.screenshot)
+
+
+class NoPilTest(unittest.TestCase):
+
+    def test_screenshots_are_used_as_they_are(self):
+        image = images.Image
+        images.Image = None
+        try:
+            results = process_screenshots([(u'a.png', None)], u'thumbnails', ImageSettings())
+        finally:
+            images.Image = image
+
+        self.assertEqual(results, [(None, u'a.png')])
+
+
+if __name__ == u'__main__':
+    unittest.main()
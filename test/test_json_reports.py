@@ -0,0 +1,119 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from behave.configuration import Configuration
+from behave.parser import parse_feature
+
+from mobilebdd.reports.jsonifier import JsonLinesReporter, JsonReporter, step_record
+
+FeatureText = u'''Feature: Logging in
+  @smoke
+  Scenario: Good password
+    Given the app is open
+    When I log in
+'''
+
+
+def run_feature(statuses=(u'passed', u'failed')):
+    """
+    :return: a parsed feature whose steps have been given the statuses
+    :rtype: behave.model.Feature
+    """
+    feature = parse_feature(FeatureText, filename=u'login.feature')
+    for number, (step, status) in enumerate(zip(feature.scenarios[0].steps, statuses)):
+        step.status = status
+        step.start_time_epoch_sec = 100.0 + number
+        step.end_time_epoch_sec = 100.5 + number
+    return feature
+
+
+class StepRecordTest(unittest.TestCase):
+
+    def test_record(self):
+        step = run_feature().scenarios[0].steps[0]
+        step.screenshot_path = os.path.join(u'/reports', u'screenshots', u'1.png')
+
+        record = step_record(step, u'/reports')
+
+        self.assertEqual(record[u'name'], u'the app is open')
+        self.assertEqual(record[u'status'], u'passed')
+        self.assertEqual(record[u'duration'], 0.5)
+        self.assertEqual(record[u'screenshot'], u'screenshots/1.png')
+
+    def test_unfinished_step_has_no_duration(self):
+        step = parse_feature(FeatureText).scenarios[0].steps[0]
+
+        self.assertIsNone(step_record(step)[u'duration'])
+
+
+class JsonReporterTest(unittest.TestCase):
+
+    def test_json(self):
+        reporter = JsonReporter(Configuration([]))
+        reporter.feature(run_feature())
+
+        feature, = json.loads(reporter.get_json())[u'features']
+
+        self.assertEqual((feature[u'name'], feature[u'status'], feature[u'file']), (u'Logging in', u'failed', u'login.feature'))
+        scenario, = feature[u'scenarios']
+        self.assertEqual(scenario[u'tags'], [u'smoke'])
+        self.assertEqual((scenario[u'start'], scenario[u'end']), (100.0, 101.5))
+        self.assertEqual([step[u'status'] for step in scenario[u'steps']], [u'passed', u'failed'])
+
+
+class JsonLinesReporterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.temp_dir, u'reports', u'results.jsonl')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def records(self):
+        with open(self.file_path) as f:
+            return [json.loads(line) for line in f]
+
+    def test_records_wait_for_pending_screenshots(self):
+        feature = run_feature()
+        scenario = feature.scenarios[0]
+        first, second = scenario.steps
+        reporter = JsonLinesReporter(self.file_path)
+        reporter.before_all(None)
+        reporter.before_feature(feature)
+        reporter.before_scenario(scenario)
+
+        first.screenshot_pending = True
+        reporter.after_step(first)
+        reporter.after_step(second)
+        self.assertEqual(self.records(), [])
+
+        first.screenshot_pending = False
+        first.screenshot_path = os.path.join(self.temp_dir, u'reports', u'first.png')
+        reporter.after_scenario(scenario)
+        reporter.after_feature(feature)
+        reporter.after_all(None)
+
+        records = self.records()
+        self.assertEqual([record[u'type'] for record in records], [u'step', u'step', u'scenario', u'feature'])
+        self.assertEqual(records[0][u'screenshot'], u'first.png')
+        self.assertEqual((records[1][u'feature'], records[1][u'scenario']), (u'Logging in', u'Good password'))
+
+    def test_everything_is_written_at_the_end(self):
+        feature = run_feature()
+        step = feature.scenarios[0].steps[0]
+        step.screenshot_pending = True
+        reporter = JsonLinesReporter(self.file_path)
+        reporter.before_all(None)
+        reporter.after_step(step)
+
+        reporter.after_all(None)
+
+        self.assertEqual(len(self.records()), 1)
+
+
+if __name__ == u'__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from mobilebdd.locators import LocatorCache
+from test.fake_driver import FakeServer, fake_driver
+
+
+class LocatorCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.temp_dir, u'locators.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_put_and_get(self):
+        cache = LocatorCache()
+        cache.put(u'login', u'NATIVE_APP', u'find_element_by_id')
+
+        self.assertEqual(cache.get(u'login'), (u'NATIVE_APP', u'find_element_by_id'))
+        self.assertIsNone(cache.get(u'logout'))
+
+    def test_webview_names_are_stored_generically(self):
+        cache = LocatorCache()
+        cache.put(u'login', u'WEBVIEW_com.example.app', u'find_element_by_css_selector')
+
+        self.assertEqual(cache.get(u'login'), (u'WEBVIEW', u'find_element_by_css_selector'))
+
+    def test_discard(self):
+        cache = LocatorCache()
+        cache.put(u'login', u'NATIVE_APP', u'find_element_by_id')
+        cache.discard(u'login')
+
+        self.assertIsNone(cache.get(u'login'))
+
+    def test_saved_per_app_and_platform(self):
+        android = LocatorCache(self.file_path, app=u'app.apk', platform=u'android')
+        android.put(u'login', u'NATIVE_APP', u'find_element_by_id')
+        android.save()
+        ios = LocatorCache(self.file_path, app=u'app.ipa', platform=u'ios')
+        ios.put(u'login', u'NATIVE_APP', u'find_element_by_accessibility_id')
+        ios.save()
+
+        self.assertEqual(
+            LocatorCache(self.file_path, app=u'app.apk', platform=u'android').get(u'login'),
+            (u'NATIVE_APP', u'find_element_by_id')
+        )
+        self.assertEqual(
+            LocatorCache(self.file_path, app=u'app.ipa', platform=u'ios').get(u'login'),
+            (u'NATIVE_APP', u'find_element_by_accessibility_id')
+        )
+
+    def test_parallel_caches_keep_each_others_entries(self):
+        first = LocatorCache(self.file_path)
+        second = LocatorCache(self.file_path)
+        first.put(u'login', u'NATIVE_APP', u'find_element_by_id')
+        second.put(u'logout', u'NATIVE_APP', u'find_element_by_name')
+
+        first.save()
+        second.save()
+
+        self.assertEqual(
+            LocatorCache(self.file_path).entries,
+            {u'login': (u'NATIVE_APP', u'find_element_by_id'), u'logout': (u'NATIVE_APP', u'find_element_by_name')}
+        )
+        self.assertEqual(second.get(u'login'), (u'NATIVE_APP', u'find_element_by_id'))
+
+    def test_discarded_entries_are_removed_from_the_file(self):
+        cache = LocatorCache(self.file_path)
+        cache.put(u'login', u'NATIVE_APP', u'find_element_by_id')
+        cache.put(u'logout', u'NATIVE_APP', u'find_element_by_name')
+        cache.save()
+        other = LocatorCache(self.file_path)
+
+        other.discard(u'login')
+        other.save()
+
+        self.assertEqual(LocatorCache(self.file_path).entries, {u'logout': (u'NATIVE_APP', u'find_element_by_name')})
+
+    def test_bad_file_is_ignored(self):
+        with open(self.file_path, u'w') as f:
+            f.write(u'{not json')
+
+        cache = LocatorCache(self.file_path)
+
+        self.assertEqual(cache.entries, {})
+
+    def test_only_saved_when_changed(self):
+        cache = LocatorCache(self.file_path)
+        cache.save()
+
+        self.assertFalse(os.path.exists(self.file_path))
+
+        cache.put(u'login', u'NATIVE_APP', u'find_element_by_id')
+        cache.save()
+
+        with open(self.file_path) as f:
+            self.assertIn(u'|', list(json.load(f))[0])
+
+
+class CachedFindTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeServer(
+            contexts=[u'NATIVE_APP', u'WEBVIEW_1'],
+            elements={u'WEBVIEW_1': {(u'css selector', u'#login'): u'login-element'}}
+        )
+        self.driver = fake_driver(self.server)
+        self.driver.locator_cache.put(u'#login', u'WEBVIEW_1', u'find_element_by_css_selector')
+
+    def test_generic_cached_context_used_for_specific_one(self):
+        element = self.driver._cached_find(u'#login', u'WEBVIEW_1')
+
+        self.assertEqual(element.id, u'login-element')
+        self.assertEqual(self.server.context, u'WEBVIEW_1')
+
+    def test_specific_cached_context_used_for_generic_one(self):
+        self.driver.locator_cache.entries[u'#login'] = (u'WEBVIEW_1', u'find_element_by_css_selector')
+
+        element = self.driver._cached_find(u'#login', u'webview')
+
+        self.assertEqual(element.id, u'login-element')
+
+    def test_other_context_is_not_used(self):
+        self.assertIsNone(self.driver._cached_find(u'#login', u'NATIVE_APP'))
+        self.assertEqual(self.server.commands(u'findElement'), [])
+        self.assertIsNotNone(self.driver.locator_cache.get(u'#login'))
+
+    def test_miss_drops_the_entry(self):
+        del self.server.elements[u'WEBVIEW_1']
+
+        self.assertIsNone(self.driver._cached_find(u'#login'))
+        self.assertIsNone(self.driver.locator_cache.get(u'#login'))
+
+
+if __name__ == u'__main__':
+    unittest.main()
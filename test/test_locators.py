@@ -0,0 +1,181 @@
+import collections
+import itertools
+import unittest
+
+from mobilebdd.hacks.webdriver import HackedWebDriver
+from mobilebdd.locators import LocatorAliases, PollingPolicy, is_applicable, prune_search_order, snapshot_find_method
+
+
+class IsApplicableTest(unittest.TestCase):
+
+    def test_xpaths_only_use_xpath(self):
+        for ref in (u'//div[@id="x"]', u'/html/body', u'(//a)[2]', u'./span'):
+            self.assertEqual(prune_search_order(ref, HackedWebDriver.ElementSearchOrder), [u'find_element_by_xpath'], ref)
+
+    def test_android_resource_ids_only_use_id(self):
+        self.assertEqual(
+            prune_search_order(u'com.example:id/login', HackedWebDriver.ElementSearchOrder),
+            [u'find_element_by_id']
+        )
+
+    def test_text_and_css_only_use_text_like_methods(self):
+        for ref in (u'Login button', u'#login', u'.btn', u'input[name=q]', u'ul > li'):
+            self.assertFalse(is_applicable(ref, u'find_element_by_id'), ref)
+            self.assertFalse(is_applicable(ref, u'find_element_by_xpath'), ref)
+            self.assertFalse(is_applicable(ref, u'find_element_by_tag_name'), ref)
+            self.assertTrue(is_applicable(ref, u'find_element_by_css_selector'), ref)
+            self.assertTrue(is_applicable(ref, u'find_element_by_accessibility_id'), ref)
+
+    def test_plain_tokens_use_everything_but_xpath(self):
+        self.assertEqual(
+            prune_search_order(u'login', HackedWebDriver.ElementSearchOrder),
+            [method for method in HackedWebDriver.ElementSearchOrder if method != u'find_element_by_xpath']
+        )
+
+    def test_tag_and_class_names_need_the_right_shape(self):
+        self.assertFalse(is_applicable(u'1st', u'find_element_by_tag_name'))
+        self.assertTrue(is_applicable(u'my-widget', u'find_element_by_tag_name'))
+        self.assertTrue(is_applicable(u'android.widget.Button', u'find_element_by_class_name'))
+        self.assertFalse(is_applicable(u'android.widget.Button', u'find_element_by_tag_name'))
+
+    def test_order_is_kept(self):
+        order = [u'find_element_by_name', u'find_element_by_id', u'find_element_by_xpath']
+
+        self.assertEqual(prune_search_order(u'login', order), [u'find_element_by_name', u'find_element_by_id'])
+
+    def test_skipped_methods_are_counted(self):
+        stats = collections.Counter()
+
+        prune_search_order(u'//a', HackedWebDriver.ElementSearchOrder, stats)
+
+        self.assertEqual(stats[u'skipped_strategies'], len(HackedWebDriver.ElementSearchOrder) - 1)
+        self.assertEqual(stats[u'skipped:find_element_by_id'], 1)
+        self.assertEqual(stats[u'skipped:find_element_by_xpath'], 0)
+
+
+class PollingPolicyTest(unittest.TestCase):
+
+    def test_backs_off_up_to_the_max(self):
+        policy = PollingPolicy(initial_sec=0.1, backoff=2.0, max_sec=0.5)
+
+        waits = list(itertools.islice(policy.intervals(), 5))
+
+        for wait, expected in zip(waits, [0.1, 0.2, 0.4, 0.5, 0.5]):
+            self.assertAlmostEqual(wait, expected)
+
+    def test_no_backoff_waits_the_same(self):
+        policy = PollingPolicy(initial_sec=0.25, backoff=1.0, max_sec=1.0)
+
+        self.assertEqual(list(itertools.islice(policy.intervals(), 3)), [0.25, 0.25, 0.25])
+
+    def test_jitter_stays_within_its_fraction(self):
+        policy = PollingPolicy(initial_sec=1.0, backoff=1.0, max_sec=1.0, jitter=0.2)
+
+        for wait in itertools.islice(policy.intervals(), 200):
+            self.assertTrue(0.8 <= wait <= 1.2, wait)
+
+    def test_from_config_fills_in_from_the_default(self):
+        default = PollingPolicy(initial_sec=0.3, backoff=3.0, max_sec=2.0, jitter=0.1)
+
+        policy = PollingPolicy.from_config({u'max_sec': 5}, default=default)
+
+        self.assertEqual(
+            (policy.initial_sec, policy.backoff, policy.max_sec, policy.jitter),
+            (0.3, 3.0, 5.0, 0.1)
+        )
+
+
+AndroidSource = u'''<?xml version="1.0" encoding="UTF-8"?>
+<hierarchy>
+  <android.widget.FrameLayout class="android.widget.FrameLayout">
+    <android.widget.Button class="android.widget.Button" resource-id="com.example:id/login" text="Log in" content-desc="login button"/>
+    <android.widget.TextView class="android.widget.TextView" text="Welcome"/>
+  </android.widget.FrameLayout>
+</hierarchy>'''
+
+
+class SnapshotFindMethodTest(unittest.TestCase):
+
+    def test_id_without_the_package(self):
+        self.assertEqual(
+            snapshot_find_method(AndroidSource, u'login', HackedWebDriver.ElementSearchOrder),
+            u'find_element_by_id'
+        )
+
+    def test_first_matching_method_in_the_search_order(self):
+        order = [u'find_element_by_accessibility_id', u'find_element_by_name']
+
+        self.assertEqual(snapshot_find_method(AndroidSource, u'Welcome', order), u'find_element_by_name')
+        self.assertEqual(snapshot_find_method(AndroidSource, u'login button', order), u'find_element_by_accessibility_id')
+
+    def test_class_names(self):
+        self.assertEqual(
+            snapshot_find_method(AndroidSource, u'android.widget.TextView', [u'find_element_by_class_name']),
+            u'find_element_by_class_name'
+        )
+
+    def test_simple_xpaths(self):
+        self.assertEqual(
+            snapshot_find_method(AndroidSource, u'//android.widget.Button', [u'find_element_by_xpath']),
+            u'find_element_by_xpath'
+        )
+
+    def test_no_match(self):
+        self.assertIsNone(snapshot_find_method(AndroidSource, u'logout', HackedWebDriver.ElementSearchOrder))
+
+    def test_unparseable_source(self):
+        self.assertIsNone(snapshot_find_method(u'<hierarchy', u'login', HackedWebDriver.ElementSearchOrder))
+
+
+class LocatorAliasesTest(unittest.TestCase):
+
+    Config = {
+        u'app_urls': {u'MyApp': u'http://example.com/my.apk'},
+        u'locator_aliases': {
+            u'MyApp': {
+                u'Login button': {
+                    u'android': [u'id', u'com.example:id/login'],
+                    u'iOS': [u'accessibility_id', u'Login', u'NATIVE_APP']
+                }
+            },
+            u'OtherApp': {
+                u'Login button': {u'android': [u'id', u'other']}
+            }
+        }
+    }
+
+    def test_by_app_alias_and_platform(self):
+        aliases = LocatorAliases.from_config(self.Config, app=u'http://example.com/my.apk', platform=u'android')
+
+        self.assertEqual(aliases.get(u'Login button'), (u'find_element_by_id', u'com.example:id/login', None))
+
+    def test_platform_is_case_insensitive_and_can_pin_a_context(self):
+        aliases = LocatorAliases.from_config(self.Config, app=u'MyApp', platform=u'IOS')
+
+        self.assertEqual(aliases.get(u'Login button'), (u'find_element_by_accessibility_id', u'Login', u'NATIVE_APP'))
+
+    def test_by_app_package(self):
+        config = {u'locator_aliases': {u'com.example': {u'Login button': {u'android': [u'id', u'login']}}}}
+
+        aliases = LocatorAliases.from_config(config, platform=u'android', package=u'com.example')
+
+        self.assertEqual(aliases.get(u'Login button'), (u'find_element_by_id', u'login', None))
+
+    def test_driver_without_an_app_gets_none(self):
+        aliases = LocatorAliases.from_config(self.Config, platform=u'android')
+
+        self.assertIsNone(aliases.get(u'Login button'))
+
+    def test_other_apps_are_left_out(self):
+        aliases = LocatorAliases.from_config(self.Config, app=u'ThirdApp', platform=u'android')
+
+        self.assertIsNone(aliases.get(u'Login button'))
+
+    def test_bad_locators(self):
+        for locator in ([u'id'], u'id', [u'id', u'x', u'NATIVE_APP', u'extra'], [u'idd', u'x']):
+            config = {u'locator_aliases': {u'MyApp': {u'Login button': {u'android': locator}}}}
+            self.assertRaises(ValueError, LocatorAliases.from_config, config, app=u'MyApp', platform=u'android')
+
+
+if __name__ == u'__main__':
+    unittest.main()
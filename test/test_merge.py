@@ -0,0 +1,108 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from behave.configuration import Configuration
+from behave.parser import parse_feature
+
+from mobilebdd.reports.html import HtmlReporter, SummaryLinePrefix, SummaryLineSuffix
+from mobilebdd.reports.merge import merge_runs
+
+FeatureText = u'''Feature: {}
+  Scenario: Opening the app
+    Given the app is open
+'''
+
+
+def summary(report_dir):
+    """
+    :return: the features in a report's summary
+    :rtype: list[dict]
+    """
+    with open(os.path.join(report_dir, u'data', u'summary.js')) as f:
+        return [
+            json.loads(line[len(SummaryLinePrefix):-len(SummaryLineSuffix)])
+            for line in f
+            if line.startswith(SummaryLinePrefix)
+        ]
+
+
+class MergeRunsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def run_dir(self, name, *features):
+        """
+        :return: a test artifact dir with an html report of the features, and
+            a junit file
+        """
+        run_dir = os.path.join(self.temp_dir, name)
+        reporter = HtmlReporter(Configuration([]), run_dir)
+        for feature_name in features:
+            feature = parse_feature(FeatureText.format(feature_name), filename=u'{}.feature'.format(feature_name))
+            feature.scenarios[0].steps[0].status = u'passed'
+            reporter.feature(feature)
+        reporter.end()
+
+        with open(os.path.join(run_dir, u'TESTS-results.xml'), u'w') as f:
+            f.write(u'<testsuite name="{}"/>'.format(name))
+        return run_dir
+
+    def test_features_point_at_their_run(self):
+        first = self.run_dir(u'first', u'Login', u'Logout')
+        second = self.run_dir(u'second', u'Search')
+        merged = os.path.join(self.temp_dir, u'merged')
+
+        report_file = merge_runs([first, second], merged)
+
+        self.assertEqual(report_file, os.path.join(merged, u'index.html'))
+        features = summary(merged)
+        self.assertEqual([feature[u'name'] for feature in features], [u'Login', u'Logout', u'Search'])
+        self.assertEqual([feature[u'base'] for feature in features], [u'../first/', u'../first/', u'../second/'])
+        for feature in features:
+            self.assertTrue(os.path.isfile(os.path.join(merged, feature[u'base'], feature[u'file'])))
+
+    def test_merged_reports_can_be_merged(self):
+        nested = os.path.join(self.temp_dir, u'nested')
+        merge_runs([self.run_dir(u'first', u'Login')], nested)
+        merged = os.path.join(self.temp_dir, u'merged')
+
+        merge_runs([nested, self.run_dir(u'second', u'Search')], merged)
+
+        self.assertEqual([feature[u'base'] for feature in summary(merged)], [u'../first/', u'../second/'])
+
+    def test_junit_files_with_the_same_name_are_kept(self):
+        merged = os.path.join(self.temp_dir, u'merged')
+
+        merge_runs([self.run_dir(u'first'), self.run_dir(u'second')], merged)
+
+        self.assertEqual(
+            sorted(name for name in os.listdir(merged) if name.endswith(u'.xml')),
+            [u'TESTS-results-run1.xml', u'TESTS-results.xml']
+        )
+        with open(os.path.join(merged, u'TESTS-results-run1.xml')) as f:
+            self.assertIn(u'second', f.read())
+
+    def test_runs_without_a_report_are_skipped(self):
+        empty = os.path.join(self.temp_dir, u'empty')
+        os.makedirs(empty)
+        merged = os.path.join(self.temp_dir, u'merged')
+
+        merge_runs([empty, self.run_dir(u'first', u'Login')], merged)
+
+        self.assertEqual([feature[u'name'] for feature in summary(merged)], [u'Login'])
+
+    def test_output_cant_be_a_run(self):
+        run_dir = self.run_dir(u'first', u'Login')
+
+        self.assertRaises(ValueError, merge_runs, [run_dir], run_dir + os.sep)
+
+
+if __name__ == u'__main__':
+    unittest.main()
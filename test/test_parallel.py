@@ -0,0 +1,35 @@
+import os
+import unittest
+
+from mobilebdd.parallel import _worker_dir, _worker_test_config, goh_behave_parallel
+
+
+class WorkerTestConfigTest(unittest.TestCase):
+
+    def test_outputs_go_in_the_worker_dir(self):
+        test_config = {u'json_lines_report': u'/artifacts/results.jsonl', u'step_profile_dir': u'/artifacts/profile'}
+        worker_dir = _worker_dir(u'/artifacts', 2)
+
+        worker_config = _worker_test_config(test_config, worker_dir)
+
+        self.assertEqual(worker_config[u'json_lines_report'], os.path.join(u'/artifacts', u'worker-2', u'results.jsonl'))
+        self.assertEqual(worker_config[u'step_profile_dir'], os.path.join(u'/artifacts', u'worker-2', u'step-profile'))
+        self.assertEqual(test_config[u'json_lines_report'], u'/artifacts/results.jsonl')
+
+    def test_no_config(self):
+        self.assertEqual(_worker_test_config(None, u'/artifacts/worker-0'), {})
+
+
+class GohBehaveParallelTest(unittest.TestCase):
+
+    def test_needs_webdriver_urls(self):
+        self.assertRaises(ValueError, goh_behave_parallel, feature_dirs=[u'features'])
+
+    def test_rejects_feature_locations(self):
+        with self.assertRaises(ValueError) as raised:
+            goh_behave_parallel(feature_dirs=[u'features', u'features/login.feature:12'], webdriver_urls=[u'http://node'])
+        self.assertIn(u'features/login.feature:12', unicode(raised.exception))
+
+
+if __name__ == u'__main__':
+    unittest.main()
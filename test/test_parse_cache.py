@@ -0,0 +1,139 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from behave.configuration import Configuration
+
+from mobilebdd.hacks.behaver import HackedRunner
+from mobilebdd.parse_cache import ParseCache, hash_step_files
+
+FeatureText = u'''Feature: {}
+  Scenario: S
+    Given {}
+'''
+
+
+class ParseCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.temp_dir, u'cache')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def write_feature(self, name, step=u'I wait 1 seconds'):
+        path = os.path.join(self.temp_dir, name + u'.feature')
+        with open(path, u'w') as f:
+            f.write(FeatureText.format(name, step))
+        return path
+
+    def test_unchanged_features_are_loaded(self):
+        paths = [self.write_feature(u'first'), self.write_feature(u'second')]
+        ParseCache(self.cache_dir).parse_features(paths)
+        cache = ParseCache(self.cache_dir)
+
+        features = cache.parse_features(paths)
+
+        self.assertEqual((cache.hits, cache.misses), (2, 0))
+        self.assertEqual([feature.name for feature in features], [u'first', u'second'])
+        self.assertEqual(features[0].scenarios[0].steps[0].name, u'I wait 1 seconds')
+
+    def test_changed_features_are_parsed_again(self):
+        path = self.write_feature(u'first')
+        ParseCache(self.cache_dir).parse_features([path])
+        self.write_feature(u'first', step=u'I wait 2 seconds')
+        cache = ParseCache(self.cache_dir)
+
+        feature, = cache.parse_features([path])
+
+        self.assertEqual((cache.hits, cache.misses), (0, 1))
+        self.assertEqual(feature.scenarios[0].steps[0].name, u'I wait 2 seconds')
+
+    def test_bad_cache_file_is_parsed_again(self):
+        path = self.write_feature(u'first')
+        cache = ParseCache(self.cache_dir)
+        cache.parse_features([path])
+        for name in os.listdir(cache.features_dir):
+            with open(os.path.join(cache.features_dir, name), u'wb') as f:
+                f.write(b'not a pickle')
+
+        feature, = ParseCache(self.cache_dir).parse_features([path])
+
+        self.assertEqual(feature.name, u'first')
+
+    def test_checked_features_with_the_same_steps(self):
+        path = self.write_feature(u'first')
+        cache = ParseCache(self.cache_dir)
+        cache.set_steps_hash(u'steps-1')
+        cache.add_checked(cache.parse_features([path]))
+
+        same_steps = ParseCache(self.cache_dir)
+        same_steps.set_steps_hash(u'steps-1')
+        other_steps = ParseCache(self.cache_dir)
+        other_steps.set_steps_hash(u'steps-2')
+
+        self.assertTrue(same_steps.is_checked(same_steps.parse_features([path])[0]))
+        self.assertFalse(other_steps.is_checked(other_steps.parse_features([path])[0]))
+
+    def test_changed_feature_isnt_checked(self):
+        path = self.write_feature(u'first')
+        cache = ParseCache(self.cache_dir)
+        cache.set_steps_hash(u'steps-1')
+        cache.add_checked(cache.parse_features([path]))
+
+        self.write_feature(u'first', step=u'I do something new')
+        feature, = cache.parse_features([path])
+
+        self.assertFalse(cache.is_checked(feature))
+
+    def test_features_are_known_by_filename(self):
+        path = self.write_feature(u'first')
+        cache = ParseCache(self.cache_dir)
+        cache.set_steps_hash(u'steps-1')
+        cache.add_checked(cache.parse_features([path]))
+
+        # a new model of the same file
+        feature, = cache.parse_features([path])
+
+        self.assertTrue(cache.is_checked(feature))
+        self.assertEqual(list(cache.feature_keys), [feature.filename])
+
+
+class LoadedStepsHashTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.step_dir = os.path.join(self.temp_dir, u'steps')
+        os.makedirs(self.step_dir)
+        self.step_file = os.path.join(self.step_dir, u'parse_cache_steps.py')
+        self.write_steps(u'a step only the parse cache test has')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def write_steps(self, pattern):
+        with open(self.step_file, u'w') as f:
+            f.write(u'from behave import step\n\n\n@step(u"{}")\ndef _step(context):\n    pass\n'.format(pattern))
+
+    def test_checked_against_the_steps_that_were_loaded(self):
+        runner = HackedRunner(Configuration([u'--dry-run']), [self.temp_dir], [self.step_dir])
+        runner.parse_cache = ParseCache(os.path.join(self.temp_dir, u'cache'))
+        feature_path = os.path.join(self.temp_dir, u'first.feature')
+        with open(feature_path, u'w') as f:
+            f.write(FeatureText.format(u'first', u'a step only the parse cache test has'))
+
+        runner.load_step_definitions()
+        loaded_hash = runner.loaded_steps_hash()
+        # the registry still has the old step after this
+        self.write_steps(u'a step only the parse cache test has, changed')
+        features = runner.parse_cache.parse_features([feature_path])
+
+        self.assertEqual(runner.find_undefined_steps(features), [])
+        self.assertNotEqual(loaded_hash, hash_step_files(runner.step_dirs()))
+        self.assertEqual(runner.parse_cache.steps_hash, loaded_hash)
+
+
+if __name__ == u'__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from behave import step_registry
+from behave.parser import parse_feature
+
+from mobilebdd.reports.profiler import StepProfiler, percentile
+
+FeatureText = u'''Feature: Waiting
+  Scenario: Waiting around
+    Given I wait 1 seconds
+    When I wait 2 seconds
+    And I tap on login
+    Then I see nothing
+'''
+
+
+class PercentileTest(unittest.TestCase):
+
+    def test_nearest_rank(self):
+        values = [1, 2, 3, 4]
+
+        self.assertEqual(percentile(values, 25), 1)
+        self.assertEqual(percentile(values, 50), 2)
+        self.assertEqual(percentile(values, 51), 3)
+        self.assertEqual(percentile(values, 75), 3)
+        self.assertEqual(percentile(values, 100), 4)
+
+    def test_ends(self):
+        values = list(range(1, 101))
+
+        self.assertEqual(percentile(values, 0), 1)
+        self.assertEqual(percentile(values, 95), 95)
+        self.assertEqual(percentile(values, 99), 99)
+
+    def test_one_value(self):
+        self.assertEqual(percentile([3.5], 50), 3.5)
+        self.assertEqual(percentile([3.5], 99), 3.5)
+
+    def test_no_values(self):
+        self.assertEqual(percentile([], 50), 0.0)
+
+
+class StepProfilerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.registry = step_registry.registry
+        step_registry.registry = step_registry.StepRegistry()
+        step_registry.registry.add_step_definition(u'step', u'I wait {seconds} seconds', lambda context, seconds: None)
+        step_registry.registry.add_step_definition(u'when', u'I tap on {name}', lambda context, name: None)
+
+    def tearDown(self):
+        step_registry.registry = self.registry
+        shutil.rmtree(self.temp_dir)
+
+    def profile(self, timings):
+        """
+        runs the feature's steps through the profiler
+
+        :param timings: (duration, command_sec, screenshot_sec, sleep_sec) for
+            each step
+        """
+        profiler = StepProfiler(self.temp_dir)
+        feature = parse_feature(FeatureText)
+        scenario = feature.scenarios[0]
+        profiler.before_feature(feature)
+        profiler.before_scenario(scenario)
+        for step, (duration, command_sec, screenshot_sec, sleep_sec) in zip(scenario.steps, timings):
+            step.start_time_epoch_sec = 10.0
+            step.end_time_epoch_sec = 10.0 + duration
+            step.command_sec = command_sec
+            step.screenshot_sec = screenshot_sec
+            step.sleep_sec = sleep_sec
+            profiler.after_step(step)
+        return profiler
+
+    def test_grouped_by_definition(self):
+        profiler = self.profile([(1.0, 0.0, 0.0, 1.0), (2.0, 0.0, 0.0, 2.0), (0.5, 0.25, 0.0, 0.0), (0.1, 0.0, 0.0, 0.0)])
+
+        self.assertEqual(
+            sorted((pattern, len(profile.durations)) for pattern, profile in profiler.definitions.items()),
+            [
+                (u"@step('I tap on {name}')", 1),
+                (u"@step('I wait {seconds} seconds')", 2),
+                (u'undefined I see nothing', 1)
+            ]
+        )
+        waits = profiler.definitions[u"@step('I wait {seconds} seconds')"]
+        self.assertEqual((waits.total_sec, waits.sleep_sec, waits.other_sec), (3.0, 3.0, 0.0))
+
+    def test_screenshot_time_is_added_to_the_step(self):
+        profiler = self.profile([(1.0, 0.5, 0.25, 0.0)])
+
+        profile, = profiler.definitions.values()
+        self.assertEqual((profile.total_sec, profile.other_sec), (1.25, 0.5))
+        stack = u'Waiting;Waiting around;Given I wait 1 seconds;'
+        self.assertEqual(profiler.stacks[stack + u'webdriver commands'], 500)
+        self.assertEqual(profiler.stacks[stack + u'screenshot'], 250)
+        self.assertEqual(profiler.stacks[stack + u'other'], 500)
+
+    def test_files(self):
+        profiler = self.profile([(1.0, 0.0, 0.0, 1.0)])
+
+        profiler.after_all(None)
+
+        with open(os.path.join(self.temp_dir, u'step-profile.txt')) as f:
+            lines = f.readlines()
+        self.assertEqual(len(lines), 2)
+        self.assertIn(u"@step('I wait {seconds} seconds')", lines[1])
+        with open(os.path.join(self.temp_dir, u'step-profile.folded')) as f:
+            self.assertEqual(f.read(), u'Waiting;Waiting around;Given I wait 1 seconds;sleep 1000\n')
+
+
+if __name__ == u'__main__':
+    unittest.main()
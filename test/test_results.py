@@ -0,0 +1,96 @@
+import gc
+import unittest
+import weakref
+
+from behave.parser import parse_feature
+
+from mobilebdd.hacks.behaver import HackedRunner
+from mobilebdd.reports.results import FeatureResult
+
+FeatureText = u'''Feature: Logging in
+  @smoke
+  Scenario: Opening the app
+    Given the app is open
+
+  Scenario Outline: Logging in as <user>
+    When I log in as <user>
+    Then I see <page>
+
+    Examples:
+      | user  | page  |
+      | admin | admin |
+      | guest | home  |
+'''
+
+
+class FeatureResultTest(unittest.TestCase):
+
+    def setUp(self):
+        self.feature = parse_feature(FeatureText, filename=u'login.feature')
+        for scenario in self.feature.walk_scenarios():
+            for step in scenario.steps:
+                step.status = u'passed'
+        self.feature.scenarios[1].scenarios[1].steps[1].status = u'failed'
+
+    def test_outlines_are_expanded(self):
+        result = FeatureResult(self.feature)
+
+        self.assertEqual(len(result.scenarios), 3)
+        self.assertEqual([scenario.status for scenario in result.scenarios], [u'passed', u'passed', u'failed'])
+        self.assertEqual(result.scenarios[2].steps[0].name, u'I log in as guest')
+        self.assertEqual(result.status, u'failed')
+
+    def test_steps_are_numbered_through_the_feature(self):
+        result = FeatureResult(self.feature)
+
+        self.assertEqual(
+            [[step.id for step in scenario.steps] for scenario in result.scenarios],
+            [[0], [1, 2], [3, 4]]
+        )
+
+    def test_keeps_what_the_reporters_use(self):
+        step = self.feature.scenarios[0].steps[0]
+        step.start_time_epoch_sec = 1.0
+        step.end_time_epoch_sec = 3.5
+        step.screenshot_path = u'/screenshots/1.png'
+
+        result = FeatureResult(self.feature)
+
+        self.assertEqual((result.name, result.filename, result.tags), (u'Logging in', u'login.feature', ()))
+        self.assertEqual(result.scenarios[0].tags, (u'smoke',))
+        first = result.scenarios[0].steps[0]
+        self.assertEqual((first.keyword, first.duration, first.screenshot_path), (u'Given', 2.5, u'/screenshots/1.png'))
+        self.assertEqual(result.scenarios[1].steps[0].duration, 0.0)
+
+    def test_scenarios_arent_renamed(self):
+        FeatureResult(self.feature)
+
+        self.assertEqual(self.feature.scenarios[0].name, u'Opening the app')
+
+    def test_doesnt_refer_back_to_the_model(self):
+        result = FeatureResult(self.feature)
+        feature = weakref.ref(self.feature)
+
+        del self.feature
+        gc.collect()
+
+        self.assertIsNone(feature())
+        self.assertEqual(len(result.scenarios), 3)
+
+
+class ReleaseFeaturesTest(unittest.TestCase):
+
+    def test_features_are_handed_over_in_order_and_let_go(self):
+        features = [u'first', u'second', u'third']
+
+        released = []
+        for feature in HackedRunner._release_features(features):
+            released.append(feature)
+            self.assertNotIn(feature, features)
+
+        self.assertEqual(released, [u'first', u'second', u'third'])
+        self.assertEqual(features, [])
+
+
+if __name__ == u'__main__':
+    unittest.main()
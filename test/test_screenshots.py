@@ -0,0 +1,198 @@
+import base64
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from mobilebdd.screenshots import CapturePolicy, Image, ScenarioCapture, ScreenshotWriter
+
+
+class Step(object):
+    """
+    just the parts of a step the screenshot code uses
+    """
+
+    def __init__(self, status=u'passed'):
+        self.status = status
+        self.screenshot_path = None
+        self.screenshot_pending = False
+
+
+class ScreenshotWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_writes_in_the_background(self):
+        writer = ScreenshotWriter(workers=2)
+        steps = [Step() for _ in range(20)]
+        for number, step in enumerate(steps):
+            writer.submit(step, os.path.join(self.temp_dir, u'{}.png'.format(number)), base64.b64encode(b'image %d' % number))
+        writer.close()
+
+        for number, step in enumerate(steps):
+            self.assertFalse(step.screenshot_pending)
+            with open(step.screenshot_path, u'rb') as f:
+                self.assertEqual(f.read(), b'image %d' % number)
+
+    def test_raw_images(self):
+        writer = ScreenshotWriter(workers=1)
+        step = Step()
+        writer.submit(step, os.path.join(self.temp_dir, u'raw.png'), b'raw image', encoded=False)
+        writer.flush()
+
+        with open(step.screenshot_path, u'rb') as f:
+            self.assertEqual(f.read(), b'raw image')
+        writer.close()
+
+    def test_bad_image_isnt_linked(self):
+        writer = ScreenshotWriter(workers=1)
+        step = Step()
+        writer.submit(step, os.path.join(self.temp_dir, u'bad.png'), u'not base64!')
+        writer.close()
+
+        self.assertIsNone(step.screenshot_path)
+        self.assertFalse(step.screenshot_pending)
+
+
+class ScreenshotStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.store_dir = os.path.join(self.temp_dir, u'screenshots')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def write(self, writer, images):
+        """
+        :return: the steps the images were written for
+        """
+        steps = [Step() for _ in images]
+        for step, image in zip(steps, images):
+            writer.submit(step, os.path.join(self.temp_dir, u'unused.png'), image, encoded=False)
+        writer.close()
+        return steps
+
+    def test_identical_screenshots_share_a_file(self):
+        writer = ScreenshotWriter(workers=3, store_dir=self.store_dir)
+
+        steps = self.write(writer, [b'a', b'b', b'a', b'a'])
+
+        self.assertEqual(steps[0].screenshot_path, steps[2].screenshot_path)
+        self.assertEqual(steps[0].screenshot_path, steps[3].screenshot_path)
+        self.assertNotEqual(steps[0].screenshot_path, steps[1].screenshot_path)
+        self.assertEqual(sorted(os.listdir(self.store_dir)), sorted(set(os.path.basename(step.screenshot_path) for step in steps)))
+        self.assertEqual(writer.deduplicated, 2)
+
+    def test_dedupe_turned_off(self):
+        writer = ScreenshotWriter.from_config({u'screenshot_dedupe': False}, store_dir=self.store_dir)
+
+        self.assertIsNone(writer.store_dir)
+        writer.close()
+
+    @unittest.skipIf(Image is None, u'needs PIL')
+    def test_nearly_identical_screenshots_share_a_file(self):
+        def png(cursor):
+            image = Image.new(u'L', (64, 64), 255)
+            image.paste(0, (0, 0, 32, 64))
+            if cursor:
+                image.putpixel((40, 40), 0)
+            data = io.BytesIO()
+            image.save(data, u'PNG')
+            return data.getvalue()
+
+        writer = ScreenshotWriter(workers=2, store_dir=self.store_dir, dedupe_threshold=2)
+
+        steps = self.write(writer, [png(False), png(True)])
+
+        self.assertEqual(steps[0].screenshot_path, steps[1].screenshot_path)
+        self.assertEqual(len(os.listdir(self.store_dir)), 1)
+
+
+class RecordingWriter(object):
+    """
+    a writer that just remembers what it was given
+    """
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, step, file_path, data, encoded=True):
+        self.submitted.append(file_path)
+
+
+class CapturePolicyTest(unittest.TestCase):
+
+    def test_from_config(self):
+        self.assertEqual(CapturePolicy.from_config({}).mode, CapturePolicy.Always)
+        self.assertEqual(CapturePolicy.from_config({u'screenshot_policy': u'on_failure'}).mode, CapturePolicy.OnFailure)
+
+        policy = CapturePolicy.from_config({u'screenshot_policy': {u'mode': u'every_n', u'every': 3}})
+        self.assertEqual((policy.mode, policy.every), (CapturePolicy.EveryN, 3))
+
+    def test_unknown_mode(self):
+        self.assertRaises(ValueError, CapturePolicy.from_config, {u'screenshot_policy': u'sometimes'})
+
+    def test_from_tags(self):
+        default = CapturePolicy()
+
+        self.assertEqual(CapturePolicy.from_tags([u'smoke', u'screenshots_on_failure'], default).mode, CapturePolicy.OnFailure)
+        self.assertEqual(CapturePolicy.from_tags([u'screenshots_every_5'], default).every, 5)
+        self.assertEqual(CapturePolicy.from_tags([u'screenshots_buffer_3'], default).buffer_size, 3)
+        self.assertIs(CapturePolicy.from_tags([u'smoke'], default), default)
+        self.assertIs(CapturePolicy.from_tags([u'screenshots_sometimes'], default), default)
+
+
+class ScenarioCaptureTest(unittest.TestCase):
+
+    def run_steps(self, policy, statuses):
+        """
+        :return: the screenshots written for steps with the statuses, by step
+            number
+        """
+        writer = RecordingWriter()
+        capture = ScenarioCapture(policy, writer)
+        for number, status in enumerate(statuses):
+            step = Step(status)
+            if capture.wants(step):
+                capture.add(step, number, u'image')
+        if u'failed' in statuses:
+            capture.release()
+        else:
+            capture.discard()
+        return writer.submitted
+
+    def test_always(self):
+        self.assertEqual(self.run_steps(CapturePolicy(), [u'passed'] * 3), [0, 1, 2])
+
+    def test_on_failure(self):
+        self.assertEqual(self.run_steps(CapturePolicy(CapturePolicy.OnFailure), [u'passed', u'failed']), [1])
+
+    def test_every_n_and_the_failure(self):
+        policy = CapturePolicy(CapturePolicy.EveryN, every=2)
+
+        self.assertEqual(self.run_steps(policy, [u'passed'] * 4 + [u'failed']), [1, 3, 4])
+
+    def test_ring_buffer_only_keeps_the_last_steps_of_a_failure(self):
+        policy = CapturePolicy(CapturePolicy.RingBuffer, buffer_size=2)
+
+        self.assertEqual(self.run_steps(policy, [u'passed'] * 4 + [u'failed']), [2, 3, 4])
+        self.assertEqual(self.run_steps(policy, [u'passed'] * 4), [])
+
+    def test_dropped_screenshots_arent_pending(self):
+        step = Step()
+        capture = ScenarioCapture(CapturePolicy(CapturePolicy.RingBuffer, buffer_size=1), RecordingWriter())
+        capture.add(step, 0, u'image')
+        capture.discard()
+
+        self.assertFalse(step.screenshot_pending)
+        self.assertIsNone(step.screenshot_path)
+
+
+if __name__ == u'__main__':
+    unittest.main()
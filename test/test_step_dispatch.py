@@ -0,0 +1,122 @@
+import collections
+import random
+import re
+import unittest
+
+from behave import step_registry
+from behave.configuration import Configuration
+
+from mobilebdd.hacks.behaver import HackedRunner
+from mobilebdd.hacks.step_dispatch import PatternBuckets, StepDispatch
+
+# just the parts of a step that matching uses
+Step = collections.namedtuple(u'Step', [u'step_type', u'name'])
+
+
+class PatternBucketsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.buckets = PatternBuckets([
+            u'I tap on {element}',
+            u'{element} should appear',
+            u'I wait {wait_time} seconds',
+            None,
+            u'{anything}'
+        ])
+
+    def test_only_patterns_with_the_same_edges(self):
+        self.assertEqual(self.buckets.candidates(u'I wait 3 seconds'), [0, 2, 3, 4])
+        self.assertEqual(self.buckets.candidates(u'I tap on login'), [0, 3, 4])
+        self.assertEqual(self.buckets.candidates(u'the login button should appear'), [1, 3, 4])
+
+    def test_case_doesnt_matter(self):
+        self.assertEqual(self.buckets.candidates(u'i WAIT 3 Seconds'), [0, 2, 3, 4])
+
+    def test_a_parameter_at_both_ends_can_match_anything(self):
+        self.assertEqual(self.buckets.candidates(u'something else entirely'), [3, 4])
+        self.assertEqual(self.buckets.candidates(u''), [3, 4])
+
+
+def linear_search(registry, step):
+    """
+    :return: the step definition behave's own search would pick
+    """
+    for definition in registry.steps[step.step_type] + registry.steps[u'step']:
+        if definition.match(step.name):
+            return definition
+    return None
+
+
+class StepDispatchTest(unittest.TestCase):
+    """
+    the dispatch has to pick the same step definition as behave's linear
+    search for any step text
+    """
+
+    Values = [u'x', u'3', u'the login button', u'"quoted text"', u'seconds', u'I', u'should appear']
+
+    @classmethod
+    def setUpClass(cls):
+        runner = HackedRunner(Configuration([u'--dry-run']), [], [])
+        runner.load_step_definitions()
+        cls.registry = step_registry.registry
+
+    def step_texts(self):
+        """
+        :return: step texts made from the registered patterns, their words
+            and some noise
+        """
+        generator = random.Random(4)
+        strings = [definition.string for definitions in self.registry.steps.values() for definition in definitions]
+        words = sorted(set(word for string in strings for word in re.sub(u'{[^{}]*}', u' ', string).split()))
+
+        texts = []
+        for string in strings:
+            for _ in range(3):
+                text = re.sub(u'{[^{}]*}', lambda field: generator.choice(self.Values), string)
+                texts.append(text)
+                texts.append(text.upper())
+                # a word short of the pattern
+                texts.append(text.rsplit(None, 1)[0])
+        for _ in range(500):
+            texts.append(u' '.join(generator.choice(words + self.Values) for _ in range(generator.randint(1, 8))))
+        return texts
+
+    def test_same_as_the_linear_search(self):
+        dispatch = StepDispatch(self.registry)
+
+        matched = 0
+        for text in self.step_texts():
+            for step_type in (u'given', u'when', u'then', u'step'):
+                step = Step(step_type, text)
+                expected = linear_search(self.registry, step)
+                self.assertIs(dispatch.find_step_definition(step), expected, (step_type, text))
+                matched += expected is not None
+
+        # the texts made from the patterns should mostly match
+        self.assertGreater(matched, 1000)
+
+    def test_rebuilt_when_steps_are_added(self):
+        registry = step_registry.StepRegistry()
+        registry.add_step_definition(u'step', u'I tap on {element}', lambda context, element: None)
+        dispatch = StepDispatch(registry)
+        step = Step(u'when', u'I tap on the back button')
+        self.assertEqual(dispatch.find_step_definition(step).string, u'I tap on {element}')
+
+        registry.add_step_definition(u'when', u'I tap on the back button', lambda context: None)
+
+        self.assertEqual(dispatch.find_step_definition(step).string, u'I tap on the back button')
+
+    def test_match_arguments(self):
+        registry = step_registry.StepRegistry()
+        registry.add_step_definition(u'step', u'I wait {wait_time} seconds', lambda context, wait_time: None)
+        StepDispatch.install(registry)
+
+        match = registry.find_match(Step(u'given', u'I wait 3 seconds'))
+
+        self.assertEqual([argument.value for argument in match.arguments], [u'3'])
+        self.assertIsNone(registry.find_match(Step(u'given', u'I wait for it')))
+
+
+if __name__ == u'__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from behave import step_registry
+
+from mobilebdd.runner import get_available_steps
+from mobilebdd.step_index import StepIndex
+
+Definitions = [
+    (u'then', u'I see {element}', True),
+    (u'given', u'I am on the {page} page', True),
+    (u'when', u'I tap on {element}', True),
+    (u'step', u'I wait {wait_time:d} seconds', True),
+    (u'step', u'I tap on the back button', True),
+    (u'step', u'I log in as (?P<user>\\w+)', False)
+]
+
+
+def baseline_steps():
+    """
+    :return: the steps in the registry, listed the way get_available_steps
+        always listed them
+    """
+    found_steps = []
+    for steps in step_registry.registry.steps.values():
+        for step in steps:
+            if step.step_type is None or u'step' == step.step_type:
+                for real_key in [u'Given', u'When', u'Then']:
+                    found_steps.append(u'{} {}'.format(real_key, step.string))
+            else:
+                found_steps.append(u'{} {}'.format(step.step_type, step.string))
+            found_steps.append(u'{} {}'.format(u'And', step.string))
+    return found_steps
+
+
+class AvailableStepsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_same_as_before_the_index(self):
+        steps = get_available_steps()
+
+        self.assertEqual(steps, baseline_steps())
+
+    def test_same_from_the_cache_file(self):
+        cache_file = os.path.join(self.temp_dir, u'steps.json')
+        StepIndex.Loaded.clear()
+        get_available_steps(cache_file=cache_file)
+        StepIndex.Loaded.clear()
+
+        self.assertEqual(get_available_steps(cache_file=cache_file), baseline_steps())
+
+
+class StepIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index = StepIndex(Definitions)
+
+    def test_every_definition_with_every_keyword(self):
+        self.assertEqual(len(self.index.steps), len(Definitions) * 4)
+        self.assertEqual(
+            self.index.steps[:4],
+            [u'Given I see {element}', u'When I see {element}', u'Then I see {element}', u'And I see {element}']
+        )
+
+    def test_complete(self):
+        self.assertEqual(
+            self.index.complete(u'when i tap'),
+            [u'When I tap on the back button', u'When I tap on {element}']
+        )
+        self.assertEqual(self.index.complete(u'given i', limit=2), [u'Given I am on the {page} page', u'Given I log in as (?P<user>\\w+)'])
+        self.assertEqual(self.index.complete(u'Whenever'), [])
+
+    def test_fuzzy(self):
+        self.assertEqual(self.index.fuzzy(u'When I wiat 3 secnds', limit=1), [u'When I wait {wait_time:d} seconds'])
+
+    def test_match_with_and_without_a_keyword(self):
+        self.assertEqual(self.index.match(u'And I wait 3 seconds'), (u'step', u'I wait {wait_time:d} seconds', {u'wait_time': 3}))
+        self.assertEqual(self.index.match(u'I am on the home page'), (u'given', u'I am on the {page} page', {u'page': u'home'}))
+        self.assertIsNone(self.index.match(u'Then I am on the home page'))
+
+    def test_match_tries_the_step_type_before_generic_steps(self):
+        self.assertEqual(self.index.match(u'When I tap on the back button')[1], u'I tap on {element}')
+        self.assertEqual(self.index.match(u'Then I tap on the back button')[1], u'I tap on the back button')
+
+    def test_only_parse_patterns_are_matched(self):
+        self.assertIsNone(self.index.match(u'Given I log in as admin'))
+        self.assertIn(u'Given I log in as (?P<user>\\w+)', self.index.steps)
+
+
+class StaleStepsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.step_dir = os.path.join(self.temp_dir, u'steps')
+        os.makedirs(self.step_dir)
+        self.step_file = os.path.join(self.step_dir, u'step_index_steps.py')
+        self.cache_file = os.path.join(self.temp_dir, u'steps.json')
+        self.write_steps(u'a step only the step index test has')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def write_steps(self, pattern):
+        with open(self.step_file, u'w') as f:
+            f.write(u'from behave import step\n\n\n@step(u"{}")\ndef _step(context):\n    pass\n'.format(pattern))
+
+    def test_old_steps_arent_saved_as_the_new_ones(self):
+        index = StepIndex.load([self.step_dir], cache_file=self.cache_file)
+        with open(self.cache_file) as f:
+            self.assertEqual(json.load(f)[u'steps'], index.steps_hash)
+        self.write_steps(u'a step only the step index test has, changed')
+        os.remove(self.cache_file)
+
+        stale = StepIndex.load([self.step_dir], cache_file=self.cache_file)
+
+        self.assertIs(stale, index)
+        self.assertIn(u'Given a step only the step index test has', stale.steps)
+        self.assertFalse(os.path.exists(self.cache_file))
+
+
+if __name__ == u'__main__':
+    unittest.main()
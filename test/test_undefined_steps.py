@@ -0,0 +1,89 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from behave import step_registry
+from behave.configuration import Configuration
+from behave.parser import parse_feature
+
+from mobilebdd.errors import UndefinedStepsError
+from mobilebdd.hacks.behaver import HackedRunner
+from mobilebdd.runner import _check_steps
+
+FeatureText = u'''Feature: Logging in
+  @not_run
+  Scenario: Good password
+    Given the app is open
+    When I log in as admin
+    And I do something nobody wrote
+
+  Scenario Outline: Others
+    When I log in as <user>
+    Then I do something nobody wrote
+
+    Examples:
+      | user  |
+      | guest |
+'''
+
+
+class FindUndefinedStepsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = step_registry.registry
+        step_registry.registry = step_registry.StepRegistry()
+        step_registry.registry.add_step_definition(u'given', u'the app is open', lambda context: None)
+        step_registry.registry.add_step_definition(u'step', u'I log in as {user}', lambda context, user: None)
+
+    def tearDown(self):
+        step_registry.registry = self.registry
+
+    def test_each_undefined_step_text_once(self):
+        runner = HackedRunner(Configuration([u'--dry-run', u'--tags=-not_run']), [], [])
+
+        undefined = runner.find_undefined_steps([parse_feature(FeatureText)])
+
+        self.assertEqual(
+            [(step.step_type, step.name) for step in undefined],
+            [(u'when', u'I do something nobody wrote'), (u'then', u'I do something nobody wrote')]
+        )
+
+    def test_all_defined(self):
+        runner = HackedRunner(Configuration([u'--dry-run']), [], [])
+        feature = parse_feature(u'Feature: F\n  Scenario: S\n    Given the app is open\n')
+
+        self.assertEqual(runner.find_undefined_steps([feature]), [])
+
+
+class CheckStepsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.feature_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.feature_dir)
+
+    def write_feature(self, name, steps):
+        with open(os.path.join(self.feature_dir, name), u'w') as f:
+            f.write(u'Feature: {}\n  Scenario: S\n    {}\n'.format(name, u'\n    '.join(steps)))
+
+    def test_returns_the_feature_files(self):
+        self.write_feature(u'b.feature', [u'Given I wait 1 seconds'])
+        self.write_feature(u'a.feature', [u'Given I wait 2 seconds'])
+
+        paths = _check_steps([self.feature_dir], None)
+
+        self.assertEqual([os.path.basename(path) for path in paths], [u'a.feature', u'b.feature'])
+
+    def test_undefined_steps(self):
+        self.write_feature(u'a.feature', [u'Given I wait 1 seconds', u'When I do something nobody wrote'])
+
+        with self.assertRaises(UndefinedStepsError) as raised:
+            _check_steps([self.feature_dir], None)
+
+        self.assertIn(u'I do something nobody wrote', unicode(raised.exception))
+
+
+if __name__ == u'__main__':
+    unittest.main()
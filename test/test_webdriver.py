@@ -0,0 +1,398 @@
+import unittest
+
+from appium.webdriver.mobilecommand import MobileCommand
+from selenium.common.exceptions import NoSuchElementException
+from selenium.webdriver.remote.command import Command
+
+from mobilebdd.drivers.desktop import DesktopChromeWebDriver, _window_search_order
+from mobilebdd.locators import PollingPolicy
+from mobilebdd.steps.input import switch_to
+from test.fake_driver import FakeServer, fake_driver
+
+
+class ClientStateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeServer(
+            contexts=[u'NATIVE_APP', u'WEBVIEW_1'],
+            elements={u'NATIVE_APP': {(u'id', u'login'): u'login-element'}}
+        )
+        self.driver = fake_driver(self.server)
+
+    def test_contexts_are_only_fetched_once(self):
+        switch_to(self.driver, u'NATIVE_APP')
+        switch_to(self.driver, u'WEBVIEW')
+        switch_to(self.driver, u'NATIVE_APP')
+
+        self.assertEqual(self.server.commands(MobileCommand.CONTEXTS), [MobileCommand.CONTEXTS])
+        self.assertEqual(self.driver.current_context, u'NATIVE_APP')
+
+    def test_switching_to_the_current_context_sends_nothing(self):
+        switch_to(self.driver, u'NATIVE_APP')
+        switch_to(self.driver, u'NATIVE_APP')
+
+        self.assertEqual(self.server.commands(MobileCommand.SWITCH_TO_CONTEXT), [MobileCommand.SWITCH_TO_CONTEXT])
+
+    def test_implicit_wait_is_only_sent_when_it_changes(self):
+        self.driver.use_element_cache = False
+        self.driver.simple_find(u'login')
+        self.driver.simple_find(u'login')
+
+        # the default wait is never needed by a find, so only the quick one
+        # the searches use is sent
+        self.assertEqual(len(self.server.commands(Command.IMPLICIT_WAIT)), 1)
+
+    def test_commands_that_can_change_the_contexts_forget_them(self):
+        element = self.driver.find_element_by_id(u'login')
+        for send in (
+            lambda: element.send_keys(u'\n'),
+            lambda: element.submit(),
+            lambda: self.driver.execute_script(u'window.open()'),
+            lambda: self.driver.execute_async_script(u'arguments[0]()')
+        ):
+            self.driver.contexts
+            self.driver.window_handles
+            send()
+            self.driver.contexts
+            self.driver.window_handles
+
+        self.assertEqual(len(self.server.commands(MobileCommand.CONTEXTS)), 5)
+        self.assertEqual(len(self.server.commands(Command.GET_WINDOW_HANDLES)), 5)
+
+    def test_contexts_that_show_up_later_are_searched(self):
+        self.driver.MaxSmartSearchTime_sec = 5
+        self.driver.polling_policy = PollingPolicy(initial_sec=0.001, backoff=1.0, max_sec=0.001)
+        self.driver.use_script_locator = False
+        self.server.contexts = [u'NATIVE_APP']
+        self.server.elements[u'WEBVIEW_1'] = {(u'css selector', u'#web'): u'web-element'}
+
+        def load_webview(command, params):
+            if command == MobileCommand.CONTEXTS and len(self.server.commands(MobileCommand.CONTEXTS)) > 1:
+                self.server.contexts = [u'NATIVE_APP', u'WEBVIEW_1']
+        self.server.listener = load_webview
+
+        element = self.driver.simple_find(u'#web')
+
+        self.assertEqual(element.id, u'web-element')
+        self.assertEqual(len(self.server.commands(MobileCommand.CONTEXTS)), 2)
+
+    def test_the_locator_script_keeps_the_contexts(self):
+        self.server.script_result = [{u'ELEMENT': u'login-element'}, u'id']
+        self.driver.contexts
+
+        self.driver.simple_find_in_context(u'login', u'WEBVIEW')
+        self.driver.simple_find_in_context(u'login', u'WEBVIEW')
+
+        self.assertEqual(self.server.commands(MobileCommand.CONTEXTS), [MobileCommand.CONTEXTS])
+
+
+class WindowSearchOrderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeServer()
+        self.server.windows = [u'window-1', u'window-2', u'window-3']
+        self.server.window = u'window-2'
+        self.driver = fake_driver(self.server)
+
+    def test_focused_window_first(self):
+        self.assertEqual(_window_search_order(self.driver, u'login'), [u'window-2', u'window-1', u'window-3'])
+
+    def test_last_window_the_ref_was_found_in_first(self):
+        self.driver.ref_window_handles[u'login'] = u'window-3'
+
+        self.assertEqual(_window_search_order(self.driver, u'login'), [u'window-3', u'window-2', u'window-1'])
+
+    def test_closed_windows_are_left_out(self):
+        self.driver.ref_window_handles[u'login'] = u'window-4'
+
+        self.assertEqual(_window_search_order(self.driver, u'login'), [u'window-2', u'window-1', u'window-3'])
+
+    def test_closed_focused_window_is_left_out(self):
+        self.server.windows = [u'window-1', u'window-3']
+
+        self.assertEqual(_window_search_order(self.driver, u'login'), [u'window-1', u'window-3'])
+
+    def test_switching_to_the_focused_window_sends_nothing(self):
+        self.driver.current_window_handle
+        self.driver.switch_to.window(u'window-2')
+
+        self.assertEqual(self.server.commands(Command.SWITCH_TO_WINDOW), [])
+
+
+class PollSearchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.driver = fake_driver()
+        self.driver.polling_policy = PollingPolicy(initial_sec=0.001, backoff=2.0, max_sec=0.004)
+        self.driver.MaxSmartSearchTime_sec = 5
+
+    def test_sweeps_until_found(self):
+        results = [None, None, u'element']
+
+        element = self.driver._poll_search(u'login', lambda: results.pop(0))
+
+        self.assertEqual(element, u'element')
+        self.assertEqual(self.driver.search_stats[u'sweeps'], 3)
+        self.assertAlmostEqual(self.driver.sleep_sec, 0.003)
+
+    def test_gives_up_after_the_timeout(self):
+        self.assertIsNone(self.driver._poll_search(u'login', lambda: None, timeout_sec=0.02))
+        self.assertTrue(self.driver.search_stats[u'sweeps'] > 1)
+        self.assertTrue(self.driver.sleep_sec <= 0.02)
+
+
+class PageSourceSnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeServer(
+            page_source=u'<hierarchy><node resource-id="com.example:id/login"/></hierarchy>',
+            elements={u'NATIVE_APP': {(u'id', u'login'): u'login-element'}}
+        )
+        self.driver = fake_driver(self.server, test_config={u'page_source_snapshot': True})
+        self.driver.polling_policy = PollingPolicy(initial_sec=0.001, backoff=1.0, max_sec=0.001)
+
+    def test_only_the_matching_find_method_is_sent(self):
+        element = self.driver.simple_find(u'login')
+
+        self.assertEqual(element.id, u'login-element')
+        self.assertEqual(self.server.commands(Command.FIND_ELEMENT), [Command.FIND_ELEMENT])
+        self.assertEqual(self.driver.search_stats[u'snapshot_hits'], 1)
+
+    def test_only_the_first_sweep_takes_a_snapshot(self):
+        self.driver.MaxSmartSearchTime_sec = 0.05
+
+        self.assertRaises(NoSuchElementException, self.driver.simple_find, u'logout')
+
+        self.assertTrue(self.driver.search_stats[u'sweeps'] > 1)
+        self.assertEqual(self.server.commands(Command.GET_PAGE_SOURCE), [Command.GET_PAGE_SOURCE])
+
+
+class ElementCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeServer(elements={u'NATIVE_APP': {(u'id', u'login'): u'login-element'}})
+        self.driver = fake_driver(self.server)
+        self.driver.simple_find(u'login')
+        self.finds = len(self.server.commands(Command.FIND_ELEMENT))
+
+    def test_found_element_is_reused(self):
+        element = self.driver.simple_find(u'login')
+
+        self.assertEqual(element.id, u'login-element')
+        self.assertEqual(len(self.server.commands(Command.FIND_ELEMENT)), self.finds)
+        self.assertEqual(self.driver.element_cache.hits, 1)
+
+    def test_stale_element_is_found_again(self):
+        self.server.stale.add(u'login-element')
+
+        self.driver.simple_find(u'login')
+
+        self.assertEqual(self.driver.element_cache.hits, 0)
+        self.assertTrue(len(self.server.commands(Command.FIND_ELEMENT)) > self.finds)
+
+    def test_ui_changes_clear_the_cache(self):
+        self.driver.find_element_by_id(u'login').click()
+        self.driver.simple_find(u'login')
+
+        self.assertEqual(self.driver.element_cache.hits, 0)
+        self.assertEqual(len(self.server.commands(Command.FIND_ELEMENT)), self.finds + 2)
+
+    def test_turned_off(self):
+        self.driver.use_element_cache = False
+        self.driver.simple_find(u'login')
+
+        self.assertEqual(len(self.server.commands(Command.FIND_ELEMENT)), self.finds + 1)
+
+
+class AbsenceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeServer(elements={u'NATIVE_APP': {(u'id', u'spinner'): u'spinner-element'}})
+        self.driver = fake_driver(self.server)
+        self.driver.polling_policy = PollingPolicy(initial_sec=0.001, backoff=1.0, max_sec=0.001)
+
+    def test_absent_after_one_sweep(self):
+        self.assertTrue(self.driver.is_absent(u'logout', settle_sec=5))
+        self.assertEqual(self.driver.search_stats[u'sweeps'], 1)
+        self.assertEqual(self.server.commands(Command.FIND_ELEMENT), [])
+
+    def test_displayed_element_is_given_time_to_go(self):
+        self.assertFalse(self.driver.is_absent(u'spinner', settle_sec=0.02))
+        self.assertTrue(self.driver.search_stats[u'sweeps'] > 1)
+
+    def test_element_that_goes_away(self):
+        sweeps = []
+
+        def vanish(command, params):
+            if command == Command.FIND_ELEMENTS:
+                sweeps.append(command)
+                if len(sweeps) == 2:
+                    del self.server.elements[u'NATIVE_APP']
+
+        self.server.listener = vanish
+
+        self.assertTrue(self.driver.is_absent(u'spinner', settle_sec=5))
+
+
+class AliasTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeServer(
+            contexts=[u'NATIVE_APP', u'WEBVIEW_1'],
+            elements={u'WEBVIEW_1': {(u'css selector', u'#login'): u'login-element'}}
+        )
+        self.server.script_fails = True
+
+    def driver(self, locator):
+        return fake_driver(self.server, app_path=u'my.apk', test_config={
+            u'locator_aliases': {u'my.apk': {u'Login button': {u'android': locator}}}
+        })
+
+    def test_alias_is_found_with_its_locator(self):
+        driver = self.driver([u'css_selector', u'#login', u'WEBVIEW'])
+
+        element = driver.simple_find(u'Login button')
+
+        self.assertEqual(element.id, u'login-element')
+        self.assertEqual(self.server.commands(Command.FIND_ELEMENT), [Command.FIND_ELEMENT])
+
+    def test_bad_alias_doesnt_start_a_session(self):
+        self.assertRaises(ValueError, self.driver, [u'css_selector'])
+        self.assertEqual(self.server.sessions, 0)
+
+    def test_alias_for_an_app_package(self):
+        driver = fake_driver(self.server, app_package=u'com.example', test_config={
+            u'locator_aliases': {u'com.example': {u'Login button': {u'android': [u'css_selector', u'#login', u'WEBVIEW']}}}
+        })
+
+        self.assertEqual(driver.simple_find(u'Login button').id, u'login-element')
+
+    def test_alias_without_a_context_is_looked_for_in_every_context(self):
+        driver = self.driver([u'css_selector', u'#login'])
+
+        element = driver.simple_find(u'Login button')
+
+        self.assertEqual(element.id, u'login-element')
+        self.assertEqual(self.server.context, u'WEBVIEW_1')
+
+    def test_alias_without_a_context_is_checked_for_in_every_context(self):
+        driver = self.driver([u'css_selector', u'#login'])
+
+        self.assertFalse(driver.is_absent(u'Login button', settle_sec=0))
+
+    def test_alias_that_never_shows_up(self):
+        driver = self.driver([u'css_selector', u'#logout'])
+
+        self.assertRaises(NoSuchElementException, driver.simple_find, u'Login button')
+
+
+class DesktopAliasTest(unittest.TestCase):
+
+    def setUp(self):
+        # the fake server looks elements up by context, so use the windows as
+        # the contexts
+        self.server = FakeServer(
+            contexts=[u'window-1'],
+            elements={u'window-2': {(u'css selector', u'#login'): u'login-element'}}
+        )
+        self.server.windows = [u'window-1', u'window-2']
+
+        def follow_window(command, params):
+            if command == Command.SWITCH_TO_WINDOW:
+                self.server.context = params[u'name']
+
+        self.server.listener = follow_window
+        self.driver = DesktopChromeWebDriver(
+            os_type=u'desktop',
+            os_ver=u'1',
+            app_path=u'site',
+            webdriver_url=self.server,
+            test_config={u'locator_aliases': {u'site': {u'Login button': {u'desktop': [u'css_selector', u'#login']}}}}
+        )
+        self.driver.MaxSmartSearchTime_sec = 0
+
+    def test_alias_is_looked_for_in_every_window(self):
+        element = self.driver.simple_find(u'Login button')
+
+        self.assertEqual(element.id, u'login-element')
+        self.assertEqual(self.driver.ref_window_handles[u'Login button'], u'window-2')
+        self.assertEqual(self.server.commands(MobileCommand.CONTEXTS), [])
+
+    def test_alias_absence_only_checks_the_focused_window(self):
+        self.assertTrue(self.driver.is_absent(u'Login button', settle_sec=0))
+        self.assertEqual(self.server.commands(MobileCommand.CONTEXTS), [])
+
+
+class DesktopFindTest(unittest.TestCase):
+
+    def setUp(self):
+        # the windows are the fake server's contexts, like DesktopAliasTest
+        self.server = FakeServer(
+            contexts=[u'window-1'],
+            elements={u'window-3': {(u'id', u'login'): u'login-element'}}
+        )
+        self.server.windows = [u'window-1', u'window-2', u'window-3']
+
+        def follow_window(command, params):
+            if command == Command.SWITCH_TO_WINDOW and params[u'name'] in self.server.windows:
+                self.server.context = params[u'name']
+
+        self.server.listener = follow_window
+        self.driver = DesktopChromeWebDriver(os_type=u'desktop', os_ver=u'1', webdriver_url=self.server)
+        self.driver.MaxSmartSearchTime_sec = 0
+        self.driver.use_script_locator = False
+
+    def test_focused_window_closed(self):
+        self.server.window = u'window-2'
+        self.server.windows.remove(u'window-2')
+
+        self.assertEqual(self.driver.simple_find(u'login').id, u'login-element')
+
+    def test_window_closed_during_the_search(self):
+        self.driver.window_handles
+        self.server.windows.remove(u'window-2')
+
+        self.assertEqual(self.driver.simple_find(u'login').id, u'login-element')
+
+    def test_not_found(self):
+        self.assertRaises(AssertionError, self.driver.simple_find, u'logout')
+
+
+class ScriptLocatorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeServer(
+            contexts=[u'NATIVE_APP', u'WEBVIEW_1'],
+            elements={u'WEBVIEW_1': {(u'css selector', u'#login'): u'login-element'}}
+        )
+        self.driver = fake_driver(self.server)
+
+    def test_one_command_per_sweep(self):
+        self.server.script_result = [{u'ELEMENT': u'login-element'}, u'css']
+
+        element = self.driver.simple_find_in_context(u'#login', u'WEBVIEW')
+
+        self.assertEqual(element.id, u'login-element')
+        self.assertEqual(self.server.commands(Command.EXECUTE_SCRIPT, Command.FIND_ELEMENT), [Command.EXECUTE_SCRIPT])
+        self.assertEqual(self.driver.locator_cache.get(u'#login'), (u'WEBVIEW', u'find_element_by_css_selector'))
+
+    def test_script_only_tries_the_applicable_strategies(self):
+        self.server.script_result = [{u'ELEMENT': u'login-element'}, u'css']
+
+        self.driver.simple_find_in_context(u'#login', u'WEBVIEW')
+
+        params = [params for command, params in self.server.sent if command == Command.EXECUTE_SCRIPT][0]
+        self.assertEqual(params[u'args'], [u'#login', [u'link', u'partial_link', u'name', u'css']])
+
+    def test_falls_back_to_find_commands_when_the_script_fails(self):
+        self.server.script_fails = True
+
+        element = self.driver.simple_find_in_context(u'#login', u'WEBVIEW')
+
+        self.assertEqual(element.id, u'login-element')
+        self.assertFalse(self.driver.use_script_locator)
+        self.assertIn(Command.FIND_ELEMENT, self.server.commands())
+
+
+if __name__ == u'__main__':
+    unittest.main()